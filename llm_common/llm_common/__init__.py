@@ -0,0 +1,5 @@
+"""
+mitre_ttp_reasoner 와 techpost_rfc 가 함께 쓰는 공용 모듈
+- client: 공유 커넥션 풀 + 적응형 동시성 제한 + 429/5xx 재시도를 거치는 ChatOpenAI 팩토리
+- metrics: LangGraph 노드별 지연/토큰/캐시 적중 히스토그램과 span 기록
+"""
@@ -0,0 +1,327 @@
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+import weakref
+import threading
+from functools import lru_cache
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "http://localhost:8000/v1"
+# vLLM --max-num-seqs 와 맞춤
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 응답 본문(일반 JSON / 스트리밍 마지막 usage 청크) 끝부분의 완료 토큰 수
+COMPLETION_TOKENS_PATTERN = re.compile(rb'"completion_tokens"\s*:\s*(\d+)')
+USAGE_TAIL_BYTES = 4096
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    프로세스 전역 LLM 동시 요청 제한기 (AIMD)
+    - 지표: 응답 본문을 끝까지 받을 때까지의 지연을 완료 토큰 수로 나눈 출력 토큰당 지연
+      (비스트리밍 응답은 헤더가 생성이 끝나야 오므로 전체 지연을 그대로 쓰면 짧은 재작성 호출과
+      긴 분석 호출이 섞일 때 출력 길이 차이를 큐잉으로 오인함)
+    - 토큰당 지연이 관측된 최소값의 tolerance 배를 넘으면 서버 큐잉으로 보고 한도를 줄임
+    - 그렇지 않으면 max_limit(vLLM --max-num-seqs)까지 천천히 늘림
+    - 동기(스레드)와 비동기(이벤트 루프) 호출자가 같은 한도를 공유
+    """
+
+    def __init__(self, max_limit=DEFAULT_MAX_CONCURRENCY, min_limit=1, tolerance=2.0, backoff=0.9):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.min_token_latency = None
+        self._cond = threading.Condition()
+        self._async_waiters = set()
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        while not self.try_acquire():
+            waiter = (loop, asyncio.Event())
+            with self._cond:
+                self._async_waiters.add(waiter)
+            try:
+                # 등록 직후 release 가 일어났을 수 있으므로 한 번 더 확인
+                if self.try_acquire():
+                    return
+                await waiter[1].wait()
+            finally:
+                with self._cond:
+                    self._async_waiters.discard(waiter)
+
+    def release(self, latency=None, completion_tokens=None):
+        """슬롯 반납 (지연과 완료 토큰 수를 모두 알 때만 한도를 조정)"""
+        with self._cond:
+            self.in_flight -= 1
+            if latency is not None and completion_tokens:
+                self._observe(latency / completion_tokens)
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _observe(self, token_latency):
+        # 기준 지연은 서서히 위로도 움직이게 하여 부하 패턴 변화에 적응
+        if self.min_token_latency is None or token_latency < self.min_token_latency:
+            self.min_token_latency = token_latency
+        else:
+            self.min_token_latency *= 1.01
+
+        if token_latency > self.min_token_latency * self.tolerance:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def stats(self):
+        return {"limit": int(self.limit), "in_flight": self.in_flight, "min_token_latency": self.min_token_latency}
+
+
+LLM_LIMITER = AdaptiveConcurrencyLimiter()
+
+
+def backoff_delay(attempt, response=None, base=0.5, cap=20.0):
+    """Retry-After 가 있으면 따르고, 없으면 full jitter 지수 백오프"""
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class _UsageTracker:
+    """
+    응답 본문 끝부분에서 완료 토큰 수를 읽어 슬롯을 한 번만 반납
+    - 본문을 끝까지 받은 경우에만 (지연, 완료 토큰 수)로 한도를 조정하고,
+      중간에 끊긴 스트림(구조화 출력 조기 종료, 취소)은 슬롯만 반납
+    """
+
+    def __init__(self, limiter, started):
+        self._limiter = limiter
+        self._started = started
+        self._tail = b""
+        self._complete = False
+        self._released = threading.Event()
+
+    def feed(self, chunk):
+        self._tail = (self._tail + chunk)[-USAGE_TAIL_BYTES:]
+
+    def finish(self):
+        self._complete = True
+
+    def release(self):
+        if self._released.is_set():
+            return
+        self._released.set()
+        tokens = None
+        if self._complete:
+            matches = COMPLETION_TOKENS_PATTERN.findall(self._tail)
+            tokens = int(matches[-1]) if matches else None
+        self._limiter.release(time.perf_counter() - self._started, tokens)
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """응답 본문(스트리밍 포함)을 끝까지 읽거나 닫을 때 동시성 슬롯을 반납"""
+
+    def __init__(self, stream, tracker):
+        self._stream = stream
+        self._tracker = tracker
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._tracker.feed(chunk)
+            yield chunk
+        self._tracker.finish()
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._tracker.release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, tracker):
+        self._stream = stream
+        self._tracker = tracker
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._tracker.feed(chunk)
+            yield chunk
+        self._tracker.finish()
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._tracker.release()
+
+
+class LimitedTransport(httpx.HTTPTransport):
+    """keep-alive 풀 위에서 동시성 제한과 429/5xx 재시도를 적용하는 동기 transport"""
+
+    def __init__(self, limiter=LLM_LIMITER, max_retries=4, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def handle_request(self, request):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = super().handle_request(request)
+            except httpx.TransportError:
+                self.limiter.release()
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            except BaseException:
+                # 그 밖의 예외/인터럽트에도 슬롯을 돌려주지 않으면 한도가 영구히 줄어 교착됨
+                self.limiter.release()
+                raise
+
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                try:
+                    response.close()
+                finally:
+                    self.limiter.release()
+                delay = backoff_delay(attempt, response)
+                logger.warning(f"LLM server returned {response.status_code}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            response.stream = _ReleasingStream(response.stream, _UsageTracker(self.limiter, started))
+            return response
+
+
+class AsyncLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    keep-alive 풀 위에서 동시성 제한과 429/5xx 재시도를 적용하는 비동기 transport
+    - 비동기 커넥션은 연결을 연 이벤트 루프에 묶이므로 풀은 실행 중인 루프마다 따로 둠
+      (같은 프로세스에서 asyncio.run 을 다시 호출해도 닫힌 루프의 커넥션을 재사용하지 않음)
+    - 동시성 제한기는 루프와 무관하게 프로세스 전역으로 공유
+    """
+
+    def __init__(self, limiter=LLM_LIMITER, max_retries=4, **kwargs):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self._pool_kwargs = kwargs
+        self._pools = weakref.WeakKeyDictionary()
+        self._pools_lock = threading.Lock()
+
+    def _pool(self):
+        loop = asyncio.get_running_loop()
+        with self._pools_lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                # 커넥션이 루프를 참조해 약한 참조만으로는 정리되지 않으므로 닫힌 루프의 풀은 여기서 버림
+                for closed in [l for l in self._pools if l.is_closed()]:
+                    del self._pools[closed]
+                pool = self._pools[loop] = httpx.AsyncHTTPTransport(**self._pool_kwargs)
+        return pool
+
+    async def aclose(self):
+        with self._pools_lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.aclose()
+
+    async def handle_async_request(self, request):
+        pool = self._pool()
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.aacquire()
+            started = time.perf_counter()
+            try:
+                response = await pool.handle_async_request(request)
+            except httpx.TransportError:
+                self.limiter.release()
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            except BaseException:
+                # asyncio.wait_for 타임아웃 등으로 취소(CancelledError)되어도 슬롯을 반납
+                self.limiter.release()
+                raise
+
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                try:
+                    await response.aclose()
+                finally:
+                    self.limiter.release()
+                delay = backoff_delay(attempt, response)
+                logger.warning(f"LLM server returned {response.status_code}, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            response.stream = _AsyncReleasingStream(response.stream, _UsageTracker(self.limiter, started))
+            return response
+
+
+POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=DEFAULT_MAX_CONCURRENCY, keepalive_expiry=60)
+
+
+@lru_cache(maxsize=None)
+def get_http_clients(base_url, timeout):
+    """
+    base_url 별로 재사용되는 (동기, 비동기) httpx 클라이언트
+    - 비동기 클라이언트의 커넥션 풀은 AsyncLimitedTransport 가 이벤트 루프마다 따로 관리
+    """
+    return (
+        httpx.Client(transport=LimitedTransport(limits=POOL_LIMITS), timeout=timeout),
+        httpx.AsyncClient(transport=AsyncLimitedTransport(limits=POOL_LIMITS), timeout=timeout)
+    )
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model, base_url=DEFAULT_BASE_URL, temperature=0, timeout=120, api_key="dummy", max_tokens=None):
+    """
+    같은 설정의 ChatOpenAI 를 재사용하고, 모든 인스턴스가 공유 커넥션 풀과 동시성 제한기를 거치도록 구성
+    - 재시도는 transport 에서 처리하므로 openai SDK 자체 재시도는 끔
+    - 스트리밍 응답에도 토큰 사용량을 받아 노드별 토큰 지표에 합산
+    - max_tokens: 응답 생성 상한 (None 이면 서버가 남은 컨텍스트까지 생성)
+    """
+    from langchain_openai import ChatOpenAI
+    from .metrics import graph_metrics
+
+    http_client, http_async_client = get_http_clients(base_url, timeout)
+    return ChatOpenAI(
+        model=model,
+        base_url=base_url,
+        api_key=api_key,
+        temperature=temperature,
+        timeout=timeout,
+        max_tokens=max_tokens,
+        max_retries=0,
+        stream_usage=True,
+        callbacks=[graph_metrics.callback],
+        http_client=http_client,
+        http_async_client=http_async_client
+    )
@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import bisect
+import inspect
+import secrets
+import logging
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192)
+ITERATION_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+# 현재 실행 중인 노드 호출 / 트레이스 (비동기 태스크와 스레드 풀 실행 모두 컨텍스트를 복사해 전달됨)
+_current_call = contextvars.ContextVar("graph_metrics_call", default=None)
+_current_trace = contextvars.ContextVar("graph_metrics_trace", default=None)
+
+
+class Histogram:
+    """Prometheus 누적 버킷 히스토그램 (라벨 조합별)"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            label_text = _format_labels(labels)
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._series = {}
+
+    def inc(self, labels, value=1):
+        self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{{{_format_labels(labels)}}} {value}")
+        return lines
+
+
+def _format_labels(labels):
+    graph, node = labels
+    return f'graph="{graph}",node="{node}"'
+
+
+class _NodeCall:
+    __slots__ = ("graph", "node", "prompt_tokens", "completion_tokens", "llm_calls")
+
+    def __init__(self, graph, node):
+        self.graph = graph
+        self.node = node
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """LLM 호출의 토큰 사용량을 현재 실행 중인 노드 호출에 합산"""
+
+    # 호출한 태스크의 컨텍스트에서 바로 실행되어야 현재 노드를 알 수 있음
+    run_inline = True
+
+    def on_llm_end(self, response, **kwargs):
+        call = _current_call.get()
+        if call is None:
+            return
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for gen in generations:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        call.prompt_tokens += prompt_tokens
+        call.completion_tokens += completion_tokens
+        call.llm_calls += 1
+
+
+class SpanWriter:
+    """OpenTelemetry span 형태의 JSON Lines 파일 기록기 (버퍼링 후 일괄 기록)"""
+
+    def __init__(self, path, flush_every=64):
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer = []
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def write(self, span):
+        with self._lock:
+            self._buffer.append(json.dumps(span, ensure_ascii=False))
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+
+
+class GraphMetrics:
+    """
+    LangGraph 노드 계측 (운영 중에도 켜둘 수 있도록 노드당 타이머 2회 + 잠금 1회 수준의 비용)
+    - 노드별 실행 시간, 프롬프트/완료 토큰, 캐시 적중, 루프 반복 횟수(iteration 등)를 히스토그램으로 집계
+    - render() 는 Prometheus 텍스트 형식, enable_spans() 시 노드/트레이스 span 을 JSON Lines 로 기록
+    """
+
+    def __init__(self):
+        self.duration = Histogram("langgraph_node_duration_seconds", "Wall time of a graph node call.",
+                                  LATENCY_BUCKETS)
+        self.prompt_tokens = Histogram("langgraph_node_prompt_tokens", "Prompt tokens sent by a node call.",
+                                       TOKEN_BUCKETS)
+        self.completion_tokens = Histogram("langgraph_node_completion_tokens",
+                                           "Completion tokens received by a node call.", TOKEN_BUCKETS)
+        self.iteration = Histogram("langgraph_node_iteration", "Loop iteration counter seen by a node call.",
+                                   ITERATION_BUCKETS)
+        self.cache_hits = Counter("langgraph_node_cache_hits_total", "Node calls answered from a cache.")
+        self.errors = Counter("langgraph_node_errors_total", "Node calls that raised an exception.")
+        self.callback = TokenUsageCallback()
+        self.spans = None
+        self._lock = threading.Lock()
+
+    def enable_spans(self, path):
+        self.spans = SpanWriter(path)
+
+    def wrap(self, graph, node, fn, hit_keys=(), iteration_key=None):
+        """
+        노드 함수를 계측 래퍼로 감쌈 (동기/비동기 모두 지원)
+        - hit_keys: 반환 업데이트에서 참이면 캐시 적중으로 집계할 키
+        - iteration_key: 루프 반복 횟수로 기록할 상태 키 (반환값 우선, 없으면 입력 상태)
+        """
+        def finish(call, started, state, update, error):
+            elapsed = time.perf_counter() - started
+            labels = (graph, node)
+            iteration = None
+            if iteration_key is not None:
+                source = update if isinstance(update, dict) and iteration_key in update else state
+                iteration = source.get(iteration_key) if isinstance(source, dict) else None
+            hit = isinstance(update, dict) and any(update.get(k) for k in hit_keys)
+
+            with self._lock:
+                self.duration.observe(labels, elapsed)
+                if call.llm_calls:
+                    self.prompt_tokens.observe(labels, call.prompt_tokens)
+                    self.completion_tokens.observe(labels, call.completion_tokens)
+                if iteration is not None:
+                    self.iteration.observe(labels, iteration)
+                if hit:
+                    self.cache_hits.inc(labels)
+                if error is not None:
+                    self.errors.inc(labels)
+
+            if self.spans is not None:
+                attributes = {"graph": graph, "node": node, "llm.calls": call.llm_calls,
+                              "llm.prompt_tokens": call.prompt_tokens,
+                              "llm.completion_tokens": call.completion_tokens, "cache_hit": hit}
+                if iteration is not None:
+                    attributes[iteration_key] = iteration
+                self._write_span(node, started, elapsed, attributes, error)
+
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(state):
+                call = _NodeCall(graph, node)
+                token = _current_call.set(call)
+                started = time.perf_counter()
+                update = error = None
+                try:
+                    update = await fn(state)
+                    return update
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    _current_call.reset(token)
+                    finish(call, started, state, update, error)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(state):
+            call = _NodeCall(graph, node)
+            token = _current_call.set(call)
+            started = time.perf_counter()
+            update = error = None
+            try:
+                update = fn(state)
+                return update
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _current_call.reset(token)
+                finish(call, started, state, update, error)
+        return wrapper
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """그래프 1회 실행을 감싸는 루트 span (이 안에서 실행된 노드 span 이 같은 trace 로 묶임)"""
+        if self.spans is None:
+            yield
+            return
+        trace = (secrets.token_hex(16), secrets.token_hex(8))
+        token = _current_trace.set(trace)
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _current_trace.reset(token)
+            self._write_span(name, started, time.perf_counter() - started, attributes, error,
+                             trace_id=trace[0], span_id=trace[1], parent_id=None)
+
+    def _write_span(self, name, started, elapsed, attributes, error, trace_id=None, span_id=None, parent_id=None):
+        if trace_id is None:
+            trace = _current_trace.get()
+            trace_id, parent_id = trace if trace else (secrets.token_hex(16), None)
+        # perf_counter 기준 시작 시각을 벽시계 시각으로 환산
+        start_ns = time.time_ns() - int((time.perf_counter() - started) * 1e9)
+        self.spans.write({
+            "trace_id": trace_id,
+            "span_id": span_id or secrets.token_hex(8),
+            "parent_span_id": parent_id,
+            "name": name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "start_time_unix_nano": start_ns,
+            "end_time_unix_nano": start_ns + int(elapsed * 1e9),
+            "attributes": attributes,
+            "status": {"code": "STATUS_CODE_ERROR", "message": str(error)} if error is not None
+            else {"code": "STATUS_CODE_OK"}
+        })
+
+    def render(self):
+        """Prometheus 텍스트 노출 형식"""
+        with self._lock:
+            lines = []
+            for metric in (self.duration, self.prompt_tokens, self.completion_tokens, self.iteration,
+                           self.cache_hits, self.errors):
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        if self.spans is not None:
+            self.spans.flush()
+
+
+graph_metrics = GraphMetrics()
@@ -0,0 +1,124 @@
+"""
+임베딩 백엔드(torch / onnx / onnx-int8) 검증 및 비용 비교
+
+    cd mitre_ttp_reasoner
+    python -m benchmarks.bench_embeddings --backends onnx onnx-int8 --min-recall 0.95
+
+- recall: ATT&CK 카탈로그 문서를 torch 임베딩으로 색인한 뒤, 같은 쿼리를 각 백엔드로 임베딩했을 때의
+  top-k 결과가 torch 쿼리의 top-k 와 얼마나 겹치는지 (query_only: 기존 DB 를 그대로 쓰는 경우,
+  reindexed: 문서까지 해당 백엔드로 다시 임베딩한 경우)
+- 비용: 백엔드별로 별도 프로세스에서 임포트+로드 시간, 단일 쿼리 지연(p50/p95), 최대 RSS 측정
+- 어느 백엔드든 recall 이 --min-recall 미만이면 종료 코드 1
+"""
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import numpy as np
+from core.mitre_loader import MitreLoader
+from core.vector_engine import VectorEngine
+from test_evaluator import percentile
+
+
+def load_corpus(limit=None):
+    """카탈로그 문서와 쿼리(기법 이름 + 테스트 페이로드) 구성"""
+    techniques = MitreLoader.load_catalog(source_hash=MitreLoader.source_hash())["techniques"][:limit]
+    docs = [VectorEngine.to_document(t).page_content for t in techniques]
+    queries = [f"{t['name']}" for t in techniques]
+    try:
+        with open("tests/test_cases.json", "r", encoding="utf-8") as f:
+            queries += [case['payload'] for case in json.load(f)]
+    except FileNotFoundError:
+        pass
+    return docs, queries
+
+
+def top_k(matrix, vectors, k):
+    scores = np.asarray(vectors) @ np.asarray(matrix).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_at_k(reference, candidate):
+    k = reference.shape[1]
+    return float(np.mean([len(set(r) & set(c)) / k for r, c in zip(reference, candidate)]))
+
+
+def probe(backend, n_queries):
+    """별도 프로세스에서 실행: 로드 시간/쿼리 지연/최대 RSS 를 JSON 으로 출력"""
+    started = time.perf_counter()
+    embeddings = VectorEngine.load_embeddings(backend)
+    embeddings.embed_query("warmup")
+    load_s = time.perf_counter() - started
+
+    latencies = []
+    for i in range(n_queries):
+        started = time.perf_counter()
+        embeddings.embed_query(f"GET /index.php?id={i}' UNION SELECT NULL, user(), database()-- HTTP/1.1")
+        latencies.append(time.perf_counter() - started)
+    print(json.dumps({
+        "load_s": load_s,
+        "query_p50_ms": 1000 * percentile(latencies, 50),
+        "query_p95_ms": 1000 * percentile(latencies, 95),
+        # Linux 기준 KB
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+
+def measure_cost(backend, n_queries):
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_embeddings", "--probe", backend,
+                             "--queries", str(n_queries)], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(args):
+    docs, queries = load_corpus(args.limit)
+    print(f"[*] {len(docs)} documents, {len(queries)} queries")
+
+    reference = VectorEngine.load_embeddings("torch")
+    ref_docs = reference.embed_documents(docs)
+    ref_queries = reference.embed_documents(queries)
+    ref_top = top_k(ref_docs, ref_queries, args.k)
+
+    report = {"torch": {"cost": measure_cost("torch", args.queries)}}
+    passed = True
+    for backend in args.backends:
+        candidate = VectorEngine.load_embeddings(backend)
+        cand_queries = candidate.embed_documents(queries)
+        cand_docs = candidate.embed_documents(docs)
+        cosine = np.sum(np.asarray(ref_queries) * np.asarray(cand_queries), axis=1)
+
+        result = {
+            "recall_query_only": recall_at_k(ref_top, top_k(ref_docs, cand_queries, args.k)),
+            "recall_reindexed": recall_at_k(ref_top, top_k(cand_docs, cand_queries, args.k)),
+            "query_cosine_mean": float(cosine.mean()),
+            "query_cosine_min": float(cosine.min()),
+            "cost": measure_cost(backend, args.queries)
+        }
+        passed &= min(result["recall_query_only"], result["recall_reindexed"]) >= args.min_recall
+        report[backend] = result
+
+    print(json.dumps(report, indent=2))
+    print(f"[{'PASS' if passed else 'FAIL'}] recall@{args.k} threshold {args.min_recall}")
+    return 0 if passed else 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embedding backend recall and cost check")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"],
+                        choices=[b for b in VectorEngine.EMBEDDING_BACKENDS if b != "torch"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--limit", type=int, default=None, help="카탈로그 문서 수 제한")
+    parser.add_argument("--queries", type=int, default=100, help="지연 측정용 단일 쿼리 수")
+    parser.add_argument("--probe", choices=VectorEngine.EMBEDDING_BACKENDS, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.probe:
+        probe(args.probe, args.queries)
+    else:
+        sys.exit(main(args))
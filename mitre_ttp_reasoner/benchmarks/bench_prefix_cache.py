@@ -0,0 +1,142 @@
+"""
+analyze/verify 재시도 루프의 프롬프트 배치별 TTFT 비교 벤치마크
+
+    cd mitre_ttp_reasoner
+    python -m benchmarks.bench_prefix_cache --payloads 20
+
+- legacy: 규칙/형식 지침/후보/페이로드/피드백을 하나의 human 메시지로 매번 다시 구성 (피드백이 끝 직전에 삽입)
+- prefix: system(규칙+형식 지침) → human(후보+페이로드) → 재시도 시 이전 응답과 피드백을 후속 턴으로 추가
+"""
+import json
+import time
+import yaml
+import random
+import asyncio
+import argparse
+from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from core.analyzer import load_prompt, load_prompt_config
+from core.state import AnalysisResult
+from benchmarks.fake_server import FakeLLMServer
+
+LEGACY_TEMPLATE = """당신은 JSON 데이터만 생성하는 보안 분석 엔진입니다.
+대화나 서명을 생략하고 오직 [형식 지침]에 따른 JSON 객체 하나만 출력하세요.
+
+[분석 규칙]
+1. 반드시 [참조 지식 베이스] 내의 ID만 매핑하세요.
+2. 서브 기법(Sub-technique, 예: T1190.001)이 지식 베이스에 있다면 우선적으로 선택하세요.
+3. 만약 지식 베이스에서 일치하는 항목을 찾을 수 없다면 "tid": "T1190" (기본 웹 공격)으로 매핑하고 "reasoning"에 그 이유를 적으세요.
+
+[형식 지침]
+{format_instructions}
+
+[참조 지식 베이스]
+{candidates}
+
+[분석 대상]
+{payload}
+
+[이전 피드백]
+{feedback}
+"""
+
+RETRY_FEEDBACK = "더 구체적인 서브 기법(.xxx)이 후보군에 있습니다. 다시 확인하세요."
+
+
+def synthetic_cases(n, seed=0):
+    """페이로드마다 다른 후보 10개를 가진 케이스 생성"""
+    rng = random.Random(seed)
+    pool = [
+        f"Technique Name: Technique {i}\nID: T{1000 + i}\nTactics: initial-access\n"
+        f"Description: {'adversaries may abuse this behavior. ' * 12}...\n"
+        f"Detection Guide: {'monitor web server logs for anomalies. ' * 8}"
+        for i in range(40)
+    ]
+    return [
+        {"payload": f"GET /item.php?id={i}' UNION SELECT NULL, user(), database()-- HTTP/1.1",
+         "candidates": "\n".join(rng.sample(pool, 10))}
+        for i in range(n)
+    ]
+
+
+def legacy_messages(case, format_instructions, feedback):
+    # 기존 analyze 처럼 호출마다 YAML 을 읽고 템플릿을 새로 컴파일
+    with open("prompts/ttp_analyzer.yaml", "r", encoding="utf-8") as f:
+        yaml.safe_load(f)
+    prompt = ChatPromptTemplate.from_template(LEGACY_TEMPLATE)
+    return prompt.format_messages(format_instructions=format_instructions, candidates=case['candidates'],
+                                  payload=case['payload'], feedback=feedback)
+
+
+def prefix_messages(case, format_instructions, feedback, last_response):
+    prompt = load_prompt("ttp_analyzer").partial(format_instructions=format_instructions)
+    messages = prompt.format_messages(candidates=case['candidates'], payload=case['payload'])
+    if last_response is None:
+        return messages
+    retry = load_prompt_config("ttp_analyzer")['retry'].format(feedback=feedback)
+    return messages + [AIMessage(content=last_response), HumanMessage(content=retry)]
+
+
+async def time_to_first_token(llm, messages):
+    started = time.perf_counter()
+    first = None
+    content = ""
+    async for chunk in llm.astream(messages):
+        if first is None and chunk.content:
+            first = time.perf_counter() - started
+        content += chunk.content
+    return first, content
+
+
+async def run_layout(layout, cases, args):
+    format_instructions = JsonOutputParser(pydantic_object=AnalysisResult).get_format_instructions()
+    with FakeLLMServer(ttft=args.ttft, prefill_per_token=args.prefill_per_token,
+                       per_token=args.per_token) as server:
+        llm = ChatOpenAI(model="stand-in", base_url=server.base_url, api_key="dummy", temperature=0, streaming=True)
+        first_ttft, retry_ttft, build_times = [], [], []
+
+        def build(*build_args):
+            started = time.perf_counter()
+            messages = (legacy_messages if layout == "legacy" else prefix_messages)(*build_args)
+            build_times.append(time.perf_counter() - started)
+            return messages
+
+        for case in cases:
+            if layout == "legacy":
+                ttft, response = await time_to_first_token(llm, build(case, format_instructions, "None"))
+                first_ttft.append(ttft)
+                ttft, _ = await time_to_first_token(llm, build(case, format_instructions, RETRY_FEEDBACK))
+            else:
+                ttft, response = await time_to_first_token(llm, build(case, format_instructions, None, None))
+                first_ttft.append(ttft)
+                ttft, _ = await time_to_first_token(llm, build(case, format_instructions, RETRY_FEEDBACK, response))
+            retry_ttft.append(ttft)
+
+        return {
+            "layout": layout,
+            "first_attempt_ttft_ms": 1000 * sum(first_ttft) / len(first_ttft),
+            "retry_ttft_ms": 1000 * sum(retry_ttft) / len(retry_ttft),
+            "prompt_build_ms": 1000 * sum(build_times) / len(build_times),
+            "server": server.stats()
+        }
+
+
+async def main(args):
+    cases = synthetic_cases(args.payloads)
+    results = [await run_layout(layout, cases, args) for layout in ("legacy", "prefix")]
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prefix-cache prompt layout TTFT benchmark")
+    parser.add_argument("--payloads", type=int, default=20)
+    parser.add_argument("--ttft", type=float, default=0.02, help="기본 첫 토큰 지연(초)")
+    parser.add_argument("--prefill-per-token", type=float, default=0.0002, help="캐시 미스 토큰당 prefill 지연(초)")
+    parser.add_argument("--per-token", type=float, default=0.001, help="생성 토큰당 지연(초)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
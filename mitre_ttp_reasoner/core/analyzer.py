@@ -1,129 +1,411 @@
 import yaml
 import re
 import json
+import hashlib
 import logging
+import threading
+from contextlib import aclosing
+from functools import lru_cache
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
+from llm_common.metrics import graph_metrics
 from .state import AgentState, AnalysisResult
+from .query_cache import QueryCache
+from .fingerprint import fingerprint, VerdictCache
+from .signatures import SignatureMatcher
+from .embedding_batcher import EmbeddingBatcher
+from .startup import startup_profile
+from .context_packer import ContextPacker
+from .json_stream import JsonObjectScanner
+from .bm25_index import reciprocal_rank_fusion
 
 logger = logging.getLogger("TTPAnalyzer")
 
+MODEL_NAME = "Qwen/Qwen2.5-14B-Instruct-AWQ"
 
-def load_prompt(name: str):
+SEARCH_QUERY_PROMPT = (
+    "다음 HTTP 페이로드를 분석하여 관련된 MITRE ATT&CK 기술을 찾기 위한 "
+    "보안 키워드와 공격 설명을 한 문장으로 요약하세요.\n"
+    "대상: {payload}"
+)
+
+# 2단계 검색에서 원문 페이로드를 그대로 임베딩할 때 사용할 최대 길이 (임베딩 모델 입력 한도 근사)
+DIRECT_QUERY_CHARS = 512
+
+
+def top_scores(db, embedding, k=2):
+    """
+    쿼리 벡터와 가장 가까운 k 개 문서의 코사인 유사도 (내림차순)
+    - NumpyVectorStore 는 코사인 유사도를, Chroma(l2) 는 제곱 거리를 반환하므로 단위 벡터 기준으로 환산
+    """
+    if hasattr(db, "similarity_search_by_vector_with_score"):
+        return [score for _, score in db.similarity_search_by_vector_with_score(embedding, k=k)]
+    results = db.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+    return [1 - distance / 2 for _, distance in results]
+
+
+def extract_json(raw_text: str):
+    """응답 전체에서 중괄호 구간을 찾아 JSON 파싱 (자유 생성 모드의 기존 방식)"""
+    json_match = re.search(r"\{.*\}", raw_text, re.DOTALL)
+    if not json_match:
+        raise ValueError("No JSON found in response")
+    return json.loads(json_match.group())
+
+
+@lru_cache(maxsize=None)
+def load_prompt_config(name: str):
+    """프롬프트 YAML 은 프로세스당 한 번만 읽고 파싱"""
     with open(f"prompts/{name}.yaml", "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
-    return ChatPromptTemplate.from_template(config['ttp_analysis']['template'])
+        return yaml.safe_load(f)['ttp_analysis']
+
+
+@lru_cache(maxsize=None)
+def load_prompt(name: str):
+    """
+    정적 규칙/형식 지침(system) → 페이로드별 후보/대상(human) 순서의 컴파일된 템플릿
+    - system 메시지가 모든 요청에서 동일하므로 vLLM prefix 캐시의 KV 블록을 재사용할 수 있음
+    """
+    config = load_prompt_config(name)
+    return ChatPromptTemplate.from_messages([
+        ("system", config['system']),
+        ("human", config['human'])
+    ])
 
 
 class TTPAnalyzer:
-    def __init__(self, vector_db):
-        self.db = vector_db
-        self.llm = ChatOpenAI(
-            model="Qwen/Qwen2.5-14B-Instruct-AWQ",
-            base_url="http://localhost:8000/v1",
-            api_key="dummy",
-            temperature=0,
-            # 서버 응답 대기 시간 설정
-            timeout=120
-        )
+    def __init__(self, vector_db=None, query_cache=None, verdict_cache=None, signature_matcher=None,
+                 embedding_batcher=None, db_factory=None, technique_index=None, context_packer=None,
+                 structured_output=False, llm=None, adaptive_retrieval=False, direct_min_score=0.5,
+                 direct_min_margin=0.05, lexical_index=None):
+        # 벡터 DB, 임베딩 배처, LLM 클라이언트는 최초 사용 시 생성
+        # - 시그니처/캐시로 끝나는 요청은 모델 로드 비용을 치르지 않음
+        if vector_db is None and db_factory is None:
+            raise ValueError("vector_db or db_factory is required")
+        self._db = vector_db
+        self._db_factory = db_factory
+        # 지정하지 않으면 기본 vLLM 서버용 공유 클라이언트를 사용 (벤치마크 등에서 다른 서버 주입 가능)
+        self._llm = llm
+        self._embedding_batcher = embedding_batcher
+        # warmup 스레드와 이벤트 루프가 동시에 지연 생성하지 않도록 보호
+        self._init_lock = threading.RLock()
         self.parser = JsonOutputParser(pydantic_object=AnalysisResult)
+        # 프롬프트 문구가 바뀌면 버전 해시도 바뀌어 이전 캐시 항목을 쓰지 않음
+        prompt_version = hashlib.sha256(SEARCH_QUERY_PROMPT.encode("utf-8")).hexdigest()[:12]
+        self.query_cache = query_cache or QueryCache(MODEL_NAME, prompt_version)
+        self.verdict_cache = verdict_cache or VerdictCache()
+        self.signature_matcher = signature_matcher or SignatureMatcher()
+        # TID 조회/부모-자식 관계/폐기 여부 확인용 (없으면 후보 ID 집합만으로 검증)
+        self.technique_index = technique_index
+        # vLLM --max-model-len 2048 에 맞춰 후보 컨텍스트를 토큰 예산 내로 압축
+        self.context_packer = context_packer or ContextPacker(MODEL_NAME)
+        # 형식 지침은 고정값이므로 system 메시지에 미리 채워 요청 간 prefix 를 동일하게 유지
+        self.prompt = load_prompt("ttp_analyzer").partial(
+            format_instructions=self.parser.get_format_instructions()
+        )
+        # 서버의 structured output(JSON schema) 제약 디코딩 + 스트리밍 증분 파싱 사용 여부
+        self.structured_output = structured_output
+        # 2단계 검색: 원문 임베딩의 top-1 유사도와 top-1/top-2 차이가 임계값 이상이면 LLM 쿼리 재작성 생략
+        # - 임계값은 평가 리포트의 retrieval_tier / direct_score / direct_margin 으로 조정
+        self.adaptive_retrieval = adaptive_retrieval
+        self.direct_min_score = direct_min_score
+        self.direct_min_margin = direct_min_margin
+        # 페이로드의 정확한 토큰(UNION, system(, /etc/shadow 등)을 잡는 BM25 결과를 벡터 결과와 RRF 로 결합
+        self.lexical_index = lexical_index
         self.workflow = self._create_graph()
 
+    @property
+    def db(self):
+        with self._init_lock:
+            if self._db is None:
+                self._db = self._db_factory()
+        return self._db
+
+    @property
+    def llm(self):
+        with self._init_lock:
+            if self._llm is not None:
+                return self._llm
+            with startup_profile.phase("llm_client"):
+                # 공유 커넥션 풀 + 프로세스 전역 적응형 동시성 제한 + 429/5xx 재시도
+                from llm_common.client import get_chat_model
+                # 서버 응답 대기 시간 설정
+                # 생성 상한을 패커의 출력 예약분과 맞춰 --max-model-len 을 넘지 않게 함
+                self._llm = get_chat_model(MODEL_NAME, timeout=120, max_tokens=self.context_packer.max_output_tokens)
+        return self._llm
+
+    @property
+    def embedding_batcher(self):
+        # 동시 실행되는 retrieve 들의 쿼리 임베딩을 한 배치로 묶음
+        with self._init_lock:
+            if self._embedding_batcher is None:
+                self._embedding_batcher = EmbeddingBatcher(self.db.embeddings)
+        return self._embedding_batcher
+
+    def stats(self):
+        """캐시/배처 지표 (아직 생성되지 않은 구성 요소는 로드하지 않음)"""
+        stats = {
+            "query_cache": self.query_cache.stats(),
+            "verdict_cache": self.verdict_cache.stats(),
+            "context_packer": self.context_packer.stats()
+        }
+        if self._embedding_batcher is not None:
+            stats["embedding_batcher"] = self._embedding_batcher.stats()
+        return stats
+
+    def config(self):
+        """분석 결과에 영향을 주는 설정 (평가 체크포인트 키로 사용)"""
+        analysis_prompt = json.dumps(load_prompt_config("ttp_analyzer"), sort_keys=True, ensure_ascii=False)
+        return {
+            "model": MODEL_NAME,
+            "query_prompt_version": self.query_cache.prompt_version,
+            "analysis_prompt_version": hashlib.sha256(analysis_prompt.encode("utf-8")).hexdigest()[:12],
+            "structured_output": self.structured_output,
+            "adaptive_retrieval": self.adaptive_retrieval,
+            "direct_min_score": self.direct_min_score,
+            "direct_min_margin": self.direct_min_margin,
+            "hybrid_retrieval": self.lexical_index is not None
+        }
+
+    def warmup(self):
+        """벡터 DB, 임베딩 모델, LLM 클라이언트를 미리 로드 (백그라운드 스레드에서 호출)"""
+        with startup_profile.phase("warmup"):
+            self.db.embeddings.embed_query("warmup")
+            _ = self.llm
+
+    async def signature(self, state: AgentState):
+        """교과서적인 페이로드는 시그니처 규칙으로 즉시 판정 (LLM/MMR 검색 생략)"""
+        res = self.signature_matcher.match(state['payload'])
+        if res is not None:
+            return {"analysis": res, "signature_hit": True, "is_final": True}
+        return {"signature_hit": False}
+
+    async def lookup(self, state: AgentState):
+        """리터럴만 다른 페이로드가 이미 검증된 적이 있으면 저장된 판정을 그대로 반환"""
+        key = fingerprint(state['payload'])
+        cached = self.verdict_cache.get(key)
+        if cached is not None:
+            return {"fingerprint": key, "analysis": cached, "cache_hit": True, "is_final": True}
+        return {"fingerprint": key, "cache_hit": False}
+
+    async def store(self, state: AgentState):
+        """검증을 통과한 판정만 템플릿 캐시에 저장 (재시도 소진 후 종료된 결과는 제외)"""
+        if state.get('verified') and state.get('fingerprint'):
+            self.verdict_cache.put(state['fingerprint'], state['analysis'])
+        return {}
+
     async def retrieve(self, state: AgentState):
         try:
-            search_gen_prompt = (
-                f"다음 HTTP 페이로드를 분석하여 관련된 MITRE ATT&CK 기술을 찾기 위한 "
-                f"보안 키워드와 공격 설명을 한 문장으로 요약하세요.\n"
-                f"대상: {state['payload'][:200]}"
-            )
+            update = {}
+            if self.adaptive_retrieval:
+                # 1단계: 원문 페이로드를 바로 임베딩해 검색하고, 결과가 확실하면 재작성 없이 사용
+                direct_embedding = await self.embedding_batcher.aembed_query(state['payload'][:DIRECT_QUERY_CHARS])
+                scores = top_scores(self.db, direct_embedding, k=2)
+                top_score = scores[0] if scores else 0.0
+                margin = top_score - scores[1] if len(scores) > 1 else top_score
+                update = {"direct_score": top_score, "direct_margin": margin}
+                if top_score >= self.direct_min_score and margin >= self.direct_min_margin:
+                    return {**self._search(direct_embedding, state['payload']), **update,
+                            "retrieval_tier": "direct", "query_cache_hit": False,
+                            "iteration": state.get('iteration', 0) + 1}
 
-            # [수정] StrOutputParser()를 붙여 무조건 문자열로 받음
-            optimized_query = await (self.llm | StrOutputParser()).ainvoke(search_gen_prompt)
+            # 2단계: LLM 으로 검색 쿼리를 재작성하여 검색
+            payload_prefix = state['payload'][:200]
 
-            docs = self.db.max_marginal_relevance_search(
-                optimized_query,
-                k=10,
-                fetch_k=20,
-                lambda_mult=0.5
-            )
+            # 동일 페이로드의 쿼리 재작성은 캐시에서 재사용 (LLM 왕복 생략)
+            optimized_query = self.query_cache.get(payload_prefix)
+            query_cache_hit = optimized_query is not None
+            if not query_cache_hit:
+                search_gen_prompt = SEARCH_QUERY_PROMPT.format(payload=payload_prefix)
 
-            refined_candidates = [d.page_content for d in docs]
-            return {"candidates": refined_candidates, "iteration": state.get('iteration', 0) + 1}
+                # [수정] StrOutputParser()를 붙여 무조건 문자열로 받음
+                optimized_query = await (self.llm | StrOutputParser()).ainvoke(search_gen_prompt)
+                self.query_cache.put(payload_prefix, optimized_query)
+
+            query_embedding = await self.embedding_batcher.aembed_query(optimized_query)
+            return {**self._search(query_embedding, state['payload']), **update, "retrieval_tier": "rewrite",
+                    "query_cache_hit": query_cache_hit, "iteration": state.get('iteration', 0) + 1}
 
         except Exception as e:
             logger.error(f"Retrieval Error: {str(e)}")
-            return {"candidates": [], "iteration": state.get('iteration', 0) + 1}
-
-    async def analyze(self, state: AgentState):
-        format_instructions = self.parser.get_format_instructions()
-        prompt = load_prompt("ttp_analyzer")
+            return {"candidates": [], "candidate_ids": [], "iteration": state.get('iteration', 0) + 1}
 
-        chain = prompt | self.llm | StrOutputParser()
+    def _search(self, embedding, payload):
+        """MMR 로 다양성을 반영한 후보 10개 검색 (BM25 인덱스가 있으면 원문 페이로드의 어휘 검색 결과와 융합)"""
+        docs = self.db.max_marginal_relevance_search_by_vector(
+            embedding,
+            k=10,
+            fetch_k=20,
+            lambda_mult=0.5
+        )
+        contents = {d.metadata['tid']: d.page_content for d in docs}
+        ranked = list(contents)
+        if self.lexical_index is not None:
+            lexical = self.lexical_index.search(payload, k=20)
+            for tid, text, _ in lexical:
+                contents.setdefault(tid, text)
+            ranked = reciprocal_rank_fusion(ranked, [tid for tid, _, _ in lexical])[:10]
+        return {"candidates": [contents[tid] for tid in ranked], "candidate_ids": ranked}
 
+    async def analyze(self, state: AgentState):
         try:
-            raw_res_text = await chain.ainvoke({
-                "payload": state['payload'],
-                "candidates": "\n".join(state['candidates']),
-                "feedback": state.get('feedback', 'None'),
-                "format_instructions": format_instructions
-            })
-
-            json_match = re.search(r"\{.*\}", raw_res_text, re.DOTALL)
-            if json_match:
-                res_dict = json.loads(json_match.group())
-                return {"analysis": AnalysisResult(**res_dict)}
+            if state.get('prompt_messages') and state.get('last_response') is not None:
+                # 재시도: 첫 시도의 메시지를 그대로 두고 이전 응답과 피드백을 후속 턴으로 덧붙임
+                # - 공통 prefix(system + 후보 + 페이로드 + 이전 응답)는 서버 KV 캐시에서 재사용됨
+                base_messages = state['prompt_messages']
+                retry_prompt = load_prompt_config("ttp_analyzer")['retry'].format(feedback=state.get('feedback', 'None'))
+                messages = base_messages + [AIMessage(content=state['last_response']), HumanMessage(content=retry_prompt)]
+                tokens_saved = state.get('tokens_saved', 0)
+                # 후속 턴은 이전 응답만큼 길어지므로 남은 컨텍스트 안으로 생성량을 다시 제한
+                packer = self.context_packer
+                max_tokens = packer.output_limit(sum(packer.count(m.content) for m in messages))
             else:
-                raise ValueError("No JSON found in response")
+                base_messages, tokens_saved = self._build_messages(state)
+                messages = base_messages
+                max_tokens = self.context_packer.max_output_tokens
+
+            update = {"prompt_messages": base_messages, "tokens_saved": tokens_saved}
+            if self.structured_output:
+                raw_res_text, res_dict = await self._astream_structured(messages, max_tokens)
+            else:
+                raw_res_text = await (self.llm.bind(max_tokens=max_tokens) | StrOutputParser()).ainvoke(messages)
+                res_dict = extract_json(raw_res_text)
+
+            update["last_response"] = raw_res_text
+            return {"analysis": AnalysisResult(**res_dict), **update}
 
         except Exception as e:
             logger.error(f"Analyze Node Error: {str(e)[:50]}...")
-            return {"analysis": AnalysisResult(
+            update = {"analysis": AnalysisResult(
                 is_malicious=False, tid="N/A", technique_name="Error",
                 tactic="Error", sub_tactic="N/A", confidence=0.0, reasoning=str(e)
             )}
+            # JSON 추출/파싱/스키마 검증 실패 (네트워크 오류 등은 제외)
+            if isinstance(e, ValueError):
+                update["parse_failures"] = state.get('parse_failures', 0) + 1
+            return update
+
+    async def _astream_structured(self, messages, max_tokens=None):
+        """
+        AnalysisResult JSON schema 로 디코딩을 제약하고, 객체가 닫히는 즉시 스트림을 끊어 생성을 중단
+        - 반환: (수신한 텍스트, 파싱된 dict)
+        - 제약 디코딩 결과는 항상 닫힌 객체에서 끊기므로 기존 정규식 파싱이 실패했을지는 여기서 알 수 없음
+          (효과는 python -m benchmarks.bench_graphs --graph mitre mitre_structured 로 두 모드의
+          파싱 실패/재시도 수를 비교해 측정)
+        """
+        llm = self.llm.bind(response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "AnalysisResult", "schema": AnalysisResult.model_json_schema()}
+        }, max_tokens=max_tokens or self.context_packer.max_output_tokens)
+        scanner = JsonObjectScanner()
+        obj_text = None
+        async with aclosing(llm.astream(messages)) as stream:
+            async for chunk in stream:
+                obj_text = scanner.feed(chunk.content)
+                if obj_text is not None:
+                    break
+
+        if obj_text is None:
+            raise ValueError("JSON object was not closed before the stream ended")
+        return scanner.text, json.loads(obj_text)
+
+    def _build_messages(self, state: AgentState):
+        """첫 시도용 메시지 구성: 후보를 토큰 예산에 맞춰 압축하고 (메시지, 절약 토큰 수) 반환"""
+        prompt = self.prompt
+        packer = self.context_packer
+        inputs = {"payload": state['payload'], "candidates": ""}
+
+        def count_fixed():
+            return sum(packer.count(m.content) for m in prompt.format_messages(**inputs))
+
+        # 후보를 제외한 고정부 토큰 수를 재고, 남은 예산에 맞춰 후보를 압축
+        budget = packer.candidate_budget(count_fixed())
+        if budget < packer.max_body_tokens:
+            # 페이로드가 너무 길어 컨텍스트를 넘는 경우 페이로드를 잘라 후보 헤더 자리를 확보
+            overflow = packer.max_body_tokens - budget
+            payload_tokens = packer.count(inputs['payload'])
+            keep = max(payload_tokens - overflow, packer.min_payload_tokens)
+            if keep < payload_tokens:
+                inputs['payload'] = packer.truncate(inputs['payload'], keep) + "...[truncated]"
+                budget = packer.candidate_budget(count_fixed())
+
+        inputs['candidates'], full_tokens, packed_tokens = packer.pack(state['candidates'], budget)
+        logger.debug(f"Candidate context packed: {full_tokens} -> {packed_tokens} tokens "
+                     f"({full_tokens - packed_tokens} saved)")
+        return prompt.format_messages(**inputs), full_tokens - packed_tokens
 
     async def verify(self, state: AgentState):
         res = state.get('analysis')
-        candidates = state.get('candidates', [])
+        candidate_ids = set(state.get('candidate_ids', []))
+        parent_id = res.tid.split(".")[0]
 
         # 존재 여부 검증 (Hallucination Check)
-        # - 모델이 후보군에 없는 ID를 뱉었는지 확인
-        is_id_in_candidates = any(res.tid in c for c in candidates)
+        # - 모델이 후보군에 없는 ID를 뱉었는지 확인 (T1190 이 T1190.001 에 부분 일치하지 않도록 정확히 비교)
+        is_id_in_candidates = res.tid in candidate_ids
+
+        # 폐기 여부 검증
+        # - revoke/deprecated 된 기법은 후보군에 있더라도 최종 결과로 쓰지 않음
+        is_active = self.technique_index is None or self.technique_index.is_active(res.tid)
 
         # 구체성 검증
         # - 서브 기법(.xxx)이 존재함에도 상위 기법을 선택했는지 체크
-        has_sub_technique_in_candidates = any("." in c.split("ID: ")[1].split("\n")[0] for c in candidates if res.tid.split(".")[0] in c)
-        is_specific_enough = not (has_sub_technique_in_candidates and "." not in res.tid)
+        if self.technique_index is not None:
+            sub_techniques_in_candidates = self.technique_index.children_of(parent_id) & candidate_ids
+        else:
+            sub_techniques_in_candidates = {c for c in candidate_ids if "." in c and c.split(".")[0] == parent_id}
+        is_specific_enough = not (sub_techniques_in_candidates and "." not in res.tid)
 
         # 신뢰도 및 논리 근거 검증
         is_reliable = res.confidence >= 0.85 and len(res.reasoning) > 50
 
-        if not is_reliable or not is_id_in_candidates or not is_specific_enough:
+        if not is_reliable or not is_id_in_candidates or not is_active or not is_specific_enough:
             if state.get('iteration', 0) < 3:
                 feedback = "분석 결과가 부적절합니다."
                 if not is_id_in_candidates:
                     feedback = f"ID {res.tid}는 제공된 후보군에 없습니다. KB 내에서만 선택하세요."
+                elif not is_active:
+                    feedback = f"ID {res.tid}는 폐기(revoked/deprecated)된 기법입니다. 다른 후보를 선택하세요."
                 elif not is_specific_enough:
                     feedback = "더 구체적인 서브 기법(.xxx)이 후보군에 있습니다. 다시 확인하세요."
 
-                return {"feedback": feedback, "is_final": False}
+                # 재시도는 analyze 로 바로 돌아가므로 여기서 시도 횟수를 올려 루프 상한을 보장
+                return {"feedback": feedback, "is_final": False, "verified": False,
+                        "iteration": state.get('iteration', 0) + 1}
+
+            return {"feedback": "pass", "is_final": True, "verified": False}
 
-        return {"feedback": "pass", "is_final": True}
+        return {"feedback": "pass", "is_final": True, "verified": True}
 
     def _create_graph(self):
         graph = StateGraph(AgentState)
-        graph.add_node("retrieve", self.retrieve)
-        graph.add_node("analyze", self.analyze)
-        graph.add_node("verify", self.verify)
-        graph.set_entry_point("retrieve")
+        # 노드별 실행 시간/토큰/캐시 적중/반복 횟수 계측
+        cache_keys = {"signature": ("signature_hit",), "lookup": ("cache_hit",), "retrieve": ("query_cache_hit",)}
+        for name in ("signature", "lookup", "retrieve", "analyze", "verify", "store"):
+            graph.add_node(name, graph_metrics.wrap("ttp_analyzer", name, getattr(self, name),
+                                                    hit_keys=cache_keys.get(name, ()), iteration_key="iteration"))
+        graph.set_entry_point("signature")
+
+        # 시그니처가 확신 있게 매칭되면 바로 종료, 미탐/모호한 경우만 이후 단계로 진행
+        graph.add_conditional_edges(
+            "signature",
+            lambda x: "hit" if x.get("signature_hit") else "miss",
+            {"hit": END, "miss": "lookup"}
+        )
+
+        # 템플릿 캐시 적중 시 retrieve → analyze → verify 전체를 건너뜀
+        graph.add_conditional_edges(
+            "lookup",
+            lambda x: "hit" if x.get("cache_hit") else "miss",
+            {"hit": END, "miss": "retrieve"}
+        )
         graph.add_edge("retrieve", "analyze")
         graph.add_edge("analyze", "verify")
 
         graph.add_conditional_edges(
             "verify",
             lambda x: "end" if x.get("is_final") else "retry",
-            {"retry": "analyze", "end": END}
+            {"retry": "analyze", "end": "store"}
         )
+        graph.add_edge("store", END)
         return graph.compile()
@@ -0,0 +1,133 @@
+import os
+import re
+import logging
+from urllib.parse import unquote_plus
+import numpy as np
+
+logger = logging.getLogger("TTPAnalyzer.BM25")
+
+# 경로/파일명/함수 호출처럼 구분자로 이어진 토큰(/etc/shadow, cmd.exe)은 통째로도, 조각으로도 색인
+_COMPOUND = re.compile(r"[a-z0-9_]+(?:[./\\\-][a-z0-9_]+)*")
+_WORD = re.compile(r"[a-z0-9_]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can for from has have if in into is it may of on or such that the their this "
+    "to use used using was which with".split()
+)
+
+
+def tokenize(text):
+    """소문자화 + URL 디코딩 후 복합 토큰과 구성 단어를 모두 반환"""
+    text = unquote_plus(text).lower()
+    tokens = []
+    for compound in _COMPOUND.findall(text):
+        words = _WORD.findall(compound)
+        if len(words) > 1:
+            tokens.append(compound)
+        tokens.extend(w for w in words if w not in _STOPWORDS and len(w) > 1)
+    return tokens
+
+
+class BM25Index:
+    """
+    기법 본문/탐지 가이드에 대한 BM25 역색인
+    - 포스팅은 CSR 형태의 NumPy 배열(단어별 문서 번호/빈도)로 저장하여 단일 .npz 로 영속화
+    - 질의는 질의 단어의 포스팅만 훑어 점수를 누적하므로 페이로드마다 실행해도 1ms 수준
+    """
+
+    FILE_NAME = "bm25.npz"
+
+    def __init__(self, vocab, indptr, doc_ids, tfs, doc_len, tids, texts, source_hash=None, k1=1.2, b=0.75):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.tids = tids
+        self.texts = texts
+        self.source_hash = source_hash
+        self.k1 = k1
+        self.b = b
+
+        n_docs = len(tids)
+        df = np.diff(indptr)
+        self.idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if n_docs else 1.0
+        # 문서 길이 정규화 항은 질의와 무관하므로 미리 계산
+        self.norm = (k1 * (1 - b + b * doc_len / max(avgdl, 1e-9))).astype(np.float32)
+
+    @classmethod
+    def build(cls, docs, source_hash=None):
+        """docs: VectorEngine.to_document 로 만든 Document 목록"""
+        postings = {}
+        doc_len = np.zeros(len(docs), dtype=np.float32)
+        for i, doc in enumerate(docs):
+            tokens = tokenize(doc.page_content)
+            doc_len[i] = len(tokens)
+            counts = {}
+            for t in tokens:
+                counts[t] = counts.get(t, 0) + 1
+            for t, tf in counts.items():
+                postings.setdefault(t, []).append((i, tf))
+
+        terms = sorted(postings)
+        vocab = {t: i for i, t in enumerate(terms)}
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, t in enumerate(terms):
+            indptr[i + 1] = indptr[i] + len(postings[t])
+        doc_ids = np.fromiter((d for t in terms for d, _ in postings[t]), dtype=np.int32, count=int(indptr[-1]))
+        tfs = np.fromiter((tf for t in terms for _, tf in postings[t]), dtype=np.float32, count=int(indptr[-1]))
+
+        tids = [doc.metadata['tid'] for doc in docs]
+        texts = [doc.page_content for doc in docs]
+        logger.info(f"BM25 index built: {len(docs)} documents, {len(terms)} terms")
+        return cls(vocab, indptr, doc_ids, tfs, doc_len, tids, texts, source_hash)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.FILE_NAME)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        # np.savez 는 확장자가 없으면 .npz 를 붙이므로 임시 파일명도 .npz 로 끝나게 함
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path, terms=np.array(terms, dtype=str), indptr=self.indptr, doc_ids=self.doc_ids, tfs=self.tfs,
+            doc_len=self.doc_len, tids=np.array(self.tids, dtype=str), texts=np.array(self.texts, dtype=str),
+            source_hash=np.array(self.source_hash or "", dtype=str)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory):
+        path = os.path.join(directory, cls.FILE_NAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            vocab = {t: i for i, t in enumerate(data["terms"].tolist())}
+            return cls(vocab, data["indptr"], data["doc_ids"], data["tfs"], data["doc_len"],
+                       data["tids"].tolist(), data["texts"].tolist(), str(data["source_hash"]) or None)
+
+    def search(self, query, k=20):
+        """(tid, 본문, 점수) 를 점수 내림차순으로 최대 k 개 반환 (일치하는 단어가 없는 문서는 제외)"""
+        scores = np.zeros(len(self.tids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self.vocab.get(term)
+            if i is None:
+                continue
+            start, end = self.indptr[i], self.indptr[i + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            scores[docs] += self.idf[i] * tf * (self.k1 + 1) / (tf + self.norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        top = matched[np.argsort(-scores[matched])[:k]]
+        return [(self.tids[i], self.texts[i], float(scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(*rankings, k=60):
+    """여러 순위 목록(각각 키 목록)을 RRF 점수 Σ 1/(k + rank) 로 합친 키 순서 반환"""
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
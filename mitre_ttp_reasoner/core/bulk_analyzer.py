@@ -0,0 +1,225 @@
+import re
+import json
+import asyncio
+import logging
+from collections import Counter
+from langchain_core.callbacks import get_usage_metadata_callback
+from langchain_core.output_parsers import StrOutputParser
+from pydantic import ValidationError
+from .state import AnalysisResult
+from .analyzer import load_prompt
+
+logger = logging.getLogger("TTPAnalyzer.Bulk")
+
+
+def extract_json_array(raw_text: str):
+    """응답에서 JSON 배열 구간을 찾아 파싱 ({"results": [...]} 처럼 감싼 경우도 허용)"""
+    match = re.search(r"\[.*\]", raw_text, re.DOTALL)
+    if match:
+        parsed = json.loads(match.group())
+    else:
+        obj = re.search(r"\{.*\}", raw_text, re.DOTALL)
+        if not obj:
+            raise ValueError("No JSON array found in response")
+        parsed = next((v for v in json.loads(obj.group()).values() if isinstance(v, list)), None)
+    if not isinstance(parsed, list):
+        raise ValueError("Response is not a JSON array")
+    return parsed
+
+
+def total_tokens(usage_callback):
+    """get_usage_metadata_callback 으로 모은 모델별 사용량의 (입력, 출력) 토큰 합계"""
+    usage = usage_callback.usage_metadata.values()
+    return sum(u.get("input_tokens", 0) for u in usage), sum(u.get("output_tokens", 0) for u in usage)
+
+
+class BulkAnalyzer:
+    """
+    대량 로그 분류용 다중 페이로드 분석
+    - 시그니처/템플릿 캐시/검색은 TTPAnalyzer 노드를 그대로 사용
+    - 검색된 후보 기법이 많이 겹치는 페이로드끼리 묶어, 규칙/형식 지침/공통 후보를 한 번만 보내는
+      프롬프트 하나로 index 가 붙은 AnalysisResult 배열을 받음
+    - 항목별로 스키마 검증 + verify 를 통과한 결과만 채택하고, 실패한 항목만 단일 페이로드 그래프
+      (analyze → verify 재시도 포함)로 다시 분석
+    """
+
+    def __init__(self, analyzer, group_size=4, min_overlap=0.5, max_candidates=15, max_payload_tokens=192,
+                 item_output_tokens=160, concurrency=8):
+        self.analyzer = analyzer
+        # vLLM --max-model-len 2048 기준: 항목당 출력 예약분 x 묶음 크기 + 페이로드 + 공통 후보가 들어가야 함
+        self.group_size = group_size
+        # 묶음의 후보 집합과 겹치는 비율이 이 값 이상인 페이로드만 같은 묶음에 추가
+        self.min_overlap = min_overlap
+        self.max_candidates = max_candidates
+        self.max_payload_tokens = max_payload_tokens
+        self.item_output_tokens = item_output_tokens
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.prompt = load_prompt("ttp_bulk_analyzer").partial(
+            format_instructions=analyzer.parser.get_format_instructions()
+        )
+
+        self.routes = Counter()
+        self.groups = 0
+        self.grouped_items = 0
+        self.tokens = {"triage": [0, 0], "bulk": [0, 0], "fallback": [0, 0]}
+
+    async def analyze(self, payloads):
+        """
+        페이로드 목록을 분석하여 입력 순서대로 {"analysis", "route"} 목록 반환
+        - route: signature / cache / bulk / fallback
+        """
+        results = [None] * len(payloads)
+        pending = []
+
+        # 1) 시그니처/템플릿 캐시로 끝나지 않는 페이로드만 후보 검색
+        with get_usage_metadata_callback() as usage:
+            triaged = await asyncio.gather(*(self._triage(p) for p in payloads))
+        self._add_tokens("triage", usage)
+        for i, (route, state) in enumerate(triaged):
+            if route is None:
+                pending.append((i, state))
+            else:
+                results[i] = {"analysis": state['analysis'], "route": route}
+
+        # 2) 후보가 겹치는 페이로드끼리 묶어 한 번에 분석
+        groups = self._group(pending)
+        with get_usage_metadata_callback() as usage:
+            outcomes = await asyncio.gather(*(self._analyze_group(group) for group in groups))
+        self._add_tokens("bulk", usage)
+
+        fallback = []
+        for group, accepted in zip(groups, outcomes):
+            for i, state in group:
+                if i in accepted:
+                    results[i] = {"analysis": accepted[i], "route": "bulk"}
+                else:
+                    fallback.append(i)
+
+        # 3) 검증에 실패하거나 응답에서 빠진 항목만 단일 페이로드 그래프로 재분석
+        with get_usage_metadata_callback() as usage:
+            states = await asyncio.gather(*(self._single(payloads[i]) for i in fallback))
+        self._add_tokens("fallback", usage)
+        for i, state in zip(fallback, states):
+            results[i] = {"analysis": state['analysis'], "route": "fallback"}
+
+        for res in results:
+            self.routes[res['route']] += 1
+        return results
+
+    async def _triage(self, payload):
+        state = {"payload": payload}
+        async with self.semaphore:
+            update = await self.analyzer.signature(state)
+            if update.get('signature_hit'):
+                return "signature", update
+            state.update(await self.analyzer.lookup(state))
+            if state.get('cache_hit'):
+                return "cache", state
+            state.update(await self.analyzer.retrieve(state))
+        return None, state
+
+    def _group(self, pending):
+        """후보 ID 겹침 비율 기준 탐욕적 묶음 (묶음 크기와 공통 후보 수 상한 적용)"""
+        groups = []
+        for i, state in pending:
+            ids = set(state.get('candidate_ids', []))
+            if not ids:
+                # 검색 실패 항목은 묶지 않고 단독 묶음 (verify 실패 시 단일 경로로 재시도)
+                groups.append({"items": [(i, state)], "ids": ids})
+                continue
+            best, best_overlap = None, 0.0
+            for group in groups:
+                if len(group["items"]) >= self.group_size or not group["ids"]:
+                    continue
+                overlap = len(ids & group["ids"]) / len(ids)
+                if overlap > best_overlap and len(ids | group["ids"]) <= self.max_candidates:
+                    best, best_overlap = group, overlap
+            if best is not None and best_overlap >= self.min_overlap:
+                best["items"].append((i, state))
+                best["ids"] |= ids
+            else:
+                groups.append({"items": [(i, state)], "ids": ids})
+
+        self.groups += len(groups)
+        self.grouped_items += sum(len(g["items"]) for g in groups if len(g["items"]) > 1)
+        return [g["items"] for g in groups]
+
+    def _build_messages(self, group):
+        """여러 페이로드가 공유하는 후보를 (겹치는 횟수, 검색 순위) 순으로 합쳐 토큰 예산에 맞춰 압축"""
+        packer = self.analyzer.context_packer
+        counts, texts, first_rank = Counter(), {}, {}
+        for _, state in group:
+            for rank, (tid, text) in enumerate(zip(state['candidate_ids'], state['candidates'])):
+                counts[tid] += 1
+                texts.setdefault(tid, text)
+                first_rank[tid] = min(first_rank.get(tid, rank), rank)
+        ordered = sorted(counts, key=lambda tid: (-counts[tid], first_rank[tid]))
+
+        payloads = []
+        for n, (_, state) in enumerate(group):
+            payload = state['payload']
+            if packer.count(payload) > self.max_payload_tokens:
+                payload = packer.truncate(payload, self.max_payload_tokens) + "...[truncated]"
+            payloads.append(f"[#{n}]\n{payload}")
+        inputs = {"payloads": "\n\n".join(payloads), "candidates": ""}
+
+        fixed = sum(packer.count(m.content) for m in self.prompt.format_messages(**inputs))
+        budget = packer.max_model_len - self.item_output_tokens * len(group) - fixed
+        inputs['candidates'], _, _ = packer.pack([texts[tid] for tid in ordered], budget)
+        return self.prompt.format_messages(**inputs), ordered
+
+    async def _analyze_group(self, group):
+        """묶음 분석 후 검증을 통과한 항목만 {입력 번호: AnalysisResult} 로 반환"""
+        if len(group) == 1 and not group[0][1].get('candidate_ids'):
+            return {}
+        messages, candidate_ids = self._build_messages(group)
+        try:
+            async with self.semaphore:
+                # 묶음 응답은 항목 수만큼 예약분을 잡았으므로 단일 분석의 생성 상한 대신 그만큼 허용
+                llm = self.analyzer.llm.bind(max_tokens=self.item_output_tokens * len(group))
+                raw = await (llm | StrOutputParser()).ainvoke(messages)
+            items = extract_json_array(raw)
+        except Exception as e:
+            logger.error(f"Bulk analyze error ({len(group)} payloads): {str(e)[:50]}...")
+            return {}
+
+        accepted = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            n = item.pop("index", None)
+            if not isinstance(n, int) or not 0 <= n < len(group) or group[n][0] in accepted:
+                continue
+            i, state = group[n]
+            try:
+                res = AnalysisResult(**item)
+            except ValidationError:
+                continue
+            # 모델이 본 공통 후보 기준으로 검증하고, 재시도 대신 단일 경로로 넘기도록 시도 횟수를 상한으로 둠
+            checked = await self.analyzer.verify({"analysis": res, "candidate_ids": candidate_ids, "iteration": 3})
+            if checked.get('verified'):
+                await self.analyzer.store({"verified": True, "fingerprint": state.get('fingerprint'),
+                                           "analysis": res})
+                accepted[i] = res
+        return accepted
+
+    async def _single(self, payload):
+        async with self.semaphore:
+            return await self.analyzer.workflow.ainvoke({"payload": payload})
+
+    def _add_tokens(self, phase, usage_callback):
+        prompt_tokens, completion_tokens = total_tokens(usage_callback)
+        self.tokens[phase][0] += prompt_tokens
+        self.tokens[phase][1] += completion_tokens
+
+    def stats(self):
+        payloads = sum(self.routes.values())
+        total = sum(p + c for p, c in self.tokens.values())
+        return {
+            "payloads": payloads,
+            "routes": dict(self.routes),
+            "groups": self.groups,
+            "grouped_items": self.grouped_items,
+            "tokens": {phase: {"prompt": p, "completion": c} for phase, (p, c) in self.tokens.items()},
+            "tokens_per_payload": total / payloads if payloads else 0.0
+        }
@@ -0,0 +1,129 @@
+import logging
+import threading
+
+logger = logging.getLogger("TTPAnalyzer.ContextPacker")
+
+
+class ContextPacker:
+    """
+    서빙 모델 토크나이저로 토큰 수를 세어 후보 기법을 프롬프트 예산에 맞추는 패커
+    - 후보의 헤더(서브 기법 맥락, 이름, ID, 전술)는 유지하되, 헤더만으로 예산을 넘으면 하위 후보부터 제외
+    - 설명/탐지 가이드 본문은 순위가 높은 후보부터 남은 예산만큼 잘라서 포함
+    - vLLM --max-model-len 을 넘지 않도록 출력 토큰과 재시도 후속 턴(이전 응답 + 피드백) 예약분을 제외하고 계산
+    """
+
+    BODY_MARKER = "\nDescription: "
+
+    def __init__(self, tokenizer_name, max_model_len=2048, max_output_tokens=512, max_body_tokens=160,
+                 retry_reserve_tokens=320, min_payload_tokens=64):
+        self.tokenizer_name = tokenizer_name
+        self.max_model_len = max_model_len
+        # 분석 모델 호출의 max_tokens 로도 전달되어 실제 생성량이 예약분을 넘지 않음
+        self.max_output_tokens = max_output_tokens
+        self.max_body_tokens = max_body_tokens
+        self.retry_reserve_tokens = retry_reserve_tokens
+        # 긴 페이로드를 잘라 후보 자리를 확보할 때도 남기는 최소 토큰 수
+        self.min_payload_tokens = min_payload_tokens
+
+        self._tokenizer = None
+        self._tokenizer_loaded = False
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.candidates_dropped = 0
+
+    @property
+    def tokenizer(self):
+        with self._lock:
+            if not self._tokenizer_loaded:
+                try:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+                except Exception as e:
+                    # 토크나이저를 받을 수 없는 환경에서는 글자 수 기반 근사치 사용
+                    logger.warning(f"Tokenizer unavailable, falling back to char estimate: {str(e)[:50]}...")
+                self._tokenizer_loaded = True
+        return self._tokenizer
+
+    def count(self, text):
+        if self.tokenizer is None:
+            return (len(text) + 3) // 4
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text, max_tokens):
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is None:
+            return text[:max_tokens * 4]
+        ids = self.tokenizer.encode(text, add_special_tokens=False)
+        if len(ids) <= max_tokens:
+            return text
+        return self.tokenizer.decode(ids[:max_tokens])
+
+    def candidate_budget(self, fixed_prompt_tokens):
+        """프롬프트 고정부(규칙, 형식 지침, 페이로드)를 제외하고 후보에 쓸 수 있는 토큰 수"""
+        return self.max_model_len - self.max_output_tokens - self.retry_reserve_tokens - fixed_prompt_tokens
+
+    def output_limit(self, prompt_tokens):
+        """이미 prompt_tokens 를 쓴 요청(재시도 후속 턴 등)에서 컨텍스트를 넘지 않는 생성 상한"""
+        return max(1, min(self.max_output_tokens, self.max_model_len - prompt_tokens))
+
+    def pack(self, candidates, budget):
+        """
+        후보 목록을 budget 토큰 안에 맞춘 문자열과 (원래 토큰 수, 압축 후 토큰 수) 반환
+        - 헤더만으로 budget 을 넘으면 순위가 낮은 후보부터 제외 (최상위 후보 하나는 항상 유지)
+        """
+        full_text = "\n".join(candidates)
+        full_tokens = self.count(full_text)
+        dropped = 0
+
+        if full_tokens <= budget:
+            packed, packed_tokens = full_text, full_tokens
+        else:
+            heads, bodies = [], []
+            for c in candidates:
+                head, sep, body = c.partition(self.BODY_MARKER)
+                heads.append(head)
+                bodies.append(sep.lstrip("\n") + body if sep else "")
+
+            head_tokens = [self.count(h) + 1 for h in heads]
+            while len(heads) > 1 and sum(head_tokens) > budget:
+                heads.pop()
+                bodies.pop()
+                head_tokens.pop()
+                dropped += 1
+            if dropped:
+                logger.warning(f"Candidate headers exceed budget ({budget} tokens): dropped {dropped} lowest-ranked "
+                               f"of {len(candidates)} candidates")
+
+            remaining = budget - sum(head_tokens)
+            parts = []
+            for head, body in zip(heads, bodies):
+                # 순위 순서대로 본문 예산을 배정하므로 상위 후보일수록 더 많은 설명이 남음
+                allowed = min(self.max_body_tokens, remaining)
+                trimmed = self.truncate(body, allowed) if body else ""
+                if trimmed:
+                    remaining -= self.count(trimmed)
+                    parts.append(f"{head}\n{trimmed}" + ("..." if trimmed != body else ""))
+                else:
+                    parts.append(head)
+            packed = "\n".join(parts)
+            packed_tokens = self.count(packed)
+
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += full_tokens
+            self.tokens_after += packed_tokens
+            self.candidates_dropped += dropped
+        return packed, full_tokens, packed_tokens
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "avg_tokens_saved": (self.tokens_before - self.tokens_after) / self.requests if self.requests else 0.0,
+            "candidates_dropped": self.candidates_dropped
+        }
@@ -0,0 +1,81 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger("TTPAnalyzer.EmbeddingBatcher")
+
+
+class EmbeddingBatcher:
+    """
+    동시에 들어온 쿼리 임베딩 요청을 모아 한 번의 forward pass 로 처리하는 마이크로 배처
+    - max_wait: 첫 요청 이후 추가 요청을 기다리는 최대 시간(초)
+    - max_batch_size: 한 배치의 최대 쿼리 수
+    - 임베딩 계산은 이벤트 루프를 막지 않도록 워커 스레드에서 실행
+    """
+
+    def __init__(self, embeddings, max_batch_size=32, max_wait=0.005):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue = None
+        self._worker = None
+
+        # 튜닝용 지표
+        self.batches = 0
+        self.embedded = 0
+        self.max_batch_seen = 0
+        self.total_queue_wait = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def aembed_query(self, text):
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            started = time.perf_counter()
+            texts = [text for text, _, _ in batch]
+            try:
+                vectors = await asyncio.to_thread(self.embeddings.embed_documents, texts)
+            except Exception as e:
+                logger.error(f"Embedding batch failed: {str(e)[:50]}...")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.embedded += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.total_queue_wait += sum(started - enqueued for _, _, enqueued in batch)
+
+            for (_, future, _), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "embedded": self.embedded,
+            "avg_batch_size": self.embedded / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_queue_wait_ms": self.total_queue_wait / self.embedded * 1000 if self.embedded else 0.0
+        }
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+
+logger = logging.getLogger("TTPAnalyzer.EvalCheckpoint")
+
+
+def config_hash(config: dict) -> str:
+    """평가 결과에 영향을 주는 설정(모델, 프롬프트 버전, 검색 옵션 등)의 해시"""
+    raw = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def case_key(case: dict) -> str:
+    """케이스 id, 없으면 컨텍스트+페이로드 해시"""
+    if case.get('id'):
+        return str(case['id'])
+    raw = f"{case.get('context', '')}\x00{case['payload']}"
+    return "sha256:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+class EvalCheckpoint:
+    """
+    평가 실행 체크포인트 (SQLite)
+    - (설정 해시, 케이스 id) 단위로 완료된 케이스의 요약 레코드를 저장
+    - 같은 설정으로 다시 실행하면 완료된 케이스는 건너뛰고, 저장된 레코드로 집계를 복원
+    - 설정이 바뀌면 다른 해시가 되므로 이전 결과를 재사용하지 않음
+    """
+
+    DB_PATH = "data/eval_checkpoint.sqlite3"
+
+    def __init__(self, config: dict, db_path=None):
+        self.config = config
+        self.config_hash = config_hash(config)
+        self.db_path = db_path or self.DB_PATH
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 케이스마다 커밋하므로 fsync 는 체크포인트(WAL) 시점으로 미룸 - 크래시 시 마지막 몇 건만 다시 실행
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS eval_runs ("
+            " config_hash TEXT PRIMARY KEY,"
+            " config TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS eval_results ("
+            " config_hash TEXT NOT NULL,"
+            " case_id TEXT NOT NULL,"
+            " record TEXT NOT NULL,"
+            " completed_at REAL NOT NULL,"
+            " PRIMARY KEY (config_hash, case_id))"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO eval_runs (config_hash, config, created_at) VALUES (?, ?, ?)",
+            (self.config_hash, json.dumps(config, sort_keys=True, ensure_ascii=False, default=str), time.time())
+        )
+        self._conn.commit()
+
+    def completed(self):
+        """현재 설정으로 완료된 (케이스 id, 레코드) 를 순서대로 반환 (커서 스트리밍)"""
+        cur = self._conn.execute(
+            "SELECT case_id, record FROM eval_results WHERE config_hash = ? ORDER BY completed_at",
+            (self.config_hash,)
+        )
+        for case_id, record in cur:
+            yield case_id, json.loads(record)
+
+    def record(self, case_id: str, record: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO eval_results (config_hash, case_id, record, completed_at) VALUES (?, ?, ?, ?)",
+            (self.config_hash, case_id, json.dumps(record, ensure_ascii=False), time.time())
+        )
+        self._conn.commit()
+
+    def reset(self):
+        """현재 설정의 완료 기록 삭제 (처음부터 다시 평가)"""
+        cur = self._conn.execute("DELETE FROM eval_results WHERE config_hash = ?", (self.config_hash,))
+        self._conn.commit()
+        logger.info(f"Eval checkpoint reset ({cur.rowcount} rows removed)")
+        return cur.rowcount
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,108 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import unquote_plus
+
+# 리터럴만 다른 페이로드를 같은 템플릿으로 묶기 위한 마스킹 규칙 (적용 순서가 중요)
+# - 공격 구문이 들어갈 수 있는 구간(따옴표 문자열 전체, 인코딩된 바이트열, 확장자)은 통째로 가리지 않고
+#   단일 스칼라 값(숫자, 영숫자 토큰)만 마스킹하여 정상/공격 페이로드가 같은 템플릿이 되지 않도록 함
+_VALUE = r"[\w@\-]+"
+_MASK_RULES = [
+    # 따옴표 안이 영숫자 토큰 하나뿐인 문자열 리터럴 ('alice', "name")
+    (re.compile(rf"'{_VALUE}'"), "'<STR>'"),
+    (re.compile(rf'"{_VALUE}"'), '"<STR>"'),
+    # 경로/파라미터 값의 파일명 (확장자는 유지: logo.png 와 shell.php 는 다른 템플릿)
+    (re.compile(r"(?<=[/=\\])[\w\-]+(?=\.[a-z][a-z0-9]{0,4}\b)"), "<FILE>"),
+    # 16진수 리터럴
+    (re.compile(r"\b0x[0-9a-f]+\b"), "<HEX>"),
+    # key=value 의 값이 영숫자 토큰 하나인 경우
+    (re.compile(rf"(?<==){_VALUE}(?=$|[&\s;,}}\]])"), "<VAL>"),
+    # 숫자 리터럴
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "<NUM>"),
+]
+_UNICODE_ESCAPE = re.compile(r"%u([0-9a-fA-F]{4})")
+
+
+def normalize(payload: str, max_rounds: int = 3) -> str:
+    """URL 인코딩(이중 인코딩, %uXXXX 포함)을 풀고 소문자/공백을 정규화"""
+    text = payload
+    for _ in range(max_rounds):
+        decoded = unquote_plus(_UNICODE_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)), text))
+        if decoded == text:
+            break
+        text = decoded
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def to_template(payload: str) -> str:
+    """정규화한 페이로드의 숫자/영숫자 값/파일명/16진수 리터럴을 마스킹한 템플릿 반환"""
+    template = normalize(payload)
+    for pattern, repl in _MASK_RULES:
+        template = pattern.sub(repl, template)
+    return template
+
+
+def fingerprint(payload: str) -> str:
+    """템플릿의 해시 (캐시 키로 사용)"""
+    return hashlib.sha256(to_template(payload).encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    검증(verify)을 통과한 AnalysisResult를 템플릿 단위로 저장하는 캐시
+    - ttl: 항목 유지 시간(초), None 이면 만료 없음
+    - max_items: 초과 시 가장 오래 사용되지 않은 항목부터 제거
+    - min_confidence: 이 값 미만의 판정은 저장하지 않음
+    """
+
+    def __init__(self, max_items=10_000, ttl=3600, min_confidence=0.9):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.min_confidence = min_confidence
+
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, result = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._items[key]
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        if result.confidence < self.min_confidence:
+            return False
+        with self._lock:
+            self._items[key] = (time.monotonic(), result)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "items": len(self._items)
+        }
@@ -0,0 +1,48 @@
+class JsonObjectScanner:
+    """
+    스트리밍 응답에서 첫 번째 최상위 JSON 객체가 닫히는 시점을 찾는 증분 스캐너
+    - 문자열 리터럴 안의 중괄호와 이스케이프를 구분하여 괄호 깊이를 추적
+    - 객체가 닫히면 feed() 가 객체 문자열을 반환하므로 호출 측에서 즉시 스트림을 중단할 수 있음
+    """
+
+    def __init__(self):
+        self._buf = []
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._pos = 0
+
+    def feed(self, text):
+        """텍스트 조각을 추가하고, 객체가 완성되면 그 문자열을 반환 (아니면 None)"""
+        for ch in text:
+            self._buf.append(ch)
+            pos = self._pos
+            self._pos += 1
+
+            if self._start is None:
+                if ch == "{":
+                    self._start = pos
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    return "".join(self._buf[self._start:])
+        return None
+
+    @property
+    def text(self):
+        return "".join(self._buf)
@@ -1,7 +1,9 @@
-import json
-import requests
 import os
+import json
+import hashlib
+import pickle
 import logging
+import requests
 
 logger = logging.getLogger("TTPAnalyzer.MitreLoader")
 
@@ -9,6 +11,13 @@ logger = logging.getLogger("TTPAnalyzer.MitreLoader")
 class MitreLoader:
     URL = "https://raw.githubusercontent.com/mitre/cti/master/enterprise-attack/enterprise-attack.json"
     FILE_PATH = "data/enterprise-attack.json"
+    # 원본 파일 해시를 키로 하는 정제 결과 캐시 (pickle: JSON 보다 로드가 빠르고 문자열 재파싱이 없음)
+    CACHE_PATH = "data/refined_cache.pkl"
+    # 정제 결과 형식이 바뀌면 올려서 기존 캐시를 무효화
+    CACHE_VERSION = 2
+    CHUNK_SIZE = 1 << 20
+    # (경로, mtime, 크기) → 해시: 한 프로세스에서 여러 번 호출해도 원본 파일은 한 번만 읽음
+    _hash_memo = {}
 
     @classmethod
     def download(cls):
@@ -18,57 +27,164 @@ class MitreLoader:
 
         if not os.path.exists(cls.FILE_PATH):
             logger.info("Downloading MITRE ATT&CK data...")
-            response = requests.get(cls.URL)
-            with open(cls.FILE_PATH, "w", encoding="utf-8") as f:
-                json.dump(response.json(), f)
+            # 응답을 JSON 으로 다시 직렬화하지 않고 원본 바이트를 그대로 저장
+            tmp_path = cls.FILE_PATH + ".part"
+            with requests.get(cls.URL, stream=True) as response:
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=cls.CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(tmp_path, cls.FILE_PATH)
+
+    @classmethod
+    def source_hash(cls):
+        """원본 STIX 파일의 SHA-256 (벡터 DB 동기화 여부 판단용, 파일이 그대로면 재계산하지 않음)"""
+        stat = os.stat(cls.FILE_PATH)
+        key = (os.path.abspath(cls.FILE_PATH), stat.st_mtime_ns, stat.st_size)
+        if key not in cls._hash_memo:
+            digest = hashlib.sha256()
+            with open(cls.FILE_PATH, "rb") as f:
+                for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            cls._hash_memo[key] = digest.hexdigest()
+        return cls._hash_memo[key]
 
     @classmethod
-    def load_and_refine(cls):
+    def iter_objects(cls, path=None):
+        """
+        STIX 번들의 objects 배열을 청크 단위로 읽으며 객체를 하나씩 반환
+        - 전체 파일을 json.load 로 한 번에 올리지 않으므로 메모리 사용량이 객체 하나 수준으로 유지됨
+        """
+        decoder = json.JSONDecoder()
+        with open(path or cls.FILE_PATH, "r", encoding="utf-8") as f:
+            buf = ""
+            # objects 배열 시작 위치 탐색
+            while True:
+                chunk = f.read(cls.CHUNK_SIZE)
+                if not chunk:
+                    return
+                buf += chunk
+                key = buf.find('"objects"')
+                start = buf.find("[", key) if key != -1 else -1
+                if start != -1:
+                    buf = buf[start + 1:]
+                    break
+
+            pos = 0
+            eof = False
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) and buf[pos] == "]":
+                    return
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    # 객체가 청크 경계에 걸린 경우: 소비한 부분을 버리고 다음 청크를 이어 붙임
+                    chunk = f.read(cls.CHUNK_SIZE)
+                    eof = not chunk
+                    buf = buf[pos:] + chunk
+                    pos = 0
+                    continue
+                pos = end
+                yield obj
+
+    @staticmethod
+    def _external_id(obj):
+        return next((r['external_id'] for r in obj.get('external_references', [])
+                     if r.get('source_name') == 'mitre-attack'), None)
+
+    @classmethod
+    def load_and_refine(cls, use_cache=True, source_hash=None):
         """STIX 데이터를 파싱하고 서브 기법의 맥락을 강화하여 정제"""
-        with open(cls.FILE_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        return cls.load_catalog(use_cache=use_cache, source_hash=source_hash)["techniques"]
+
+    @classmethod
+    def load_catalog(cls, use_cache=True, source_hash=None):
+        """
+        정제된 기법 목록과 revoke 된 기법 ID 목록을 함께 반환
+        - {"techniques": [...], "revoked": [...]}
+        """
+        source_hash = source_hash or cls.source_hash()
+        if use_cache:
+            cached = cls._load_cache(source_hash)
+            if cached is not None:
+                logger.info(f"Loaded {len(cached['techniques'])} refined MITRE techniques from cache.")
+                return cached
 
         parent_map = {}
-        objects = data.get('objects', [])
+        refined = []
+        revoked = []
+        pending_parent = []
 
-        for obj in objects:
-            if obj.get('type') == 'attack-pattern':
-                ext_id = next((r['external_id'] for r in obj.get('external_references', [])
-                              if r['source_name'] == 'mitre-attack'), None)
-                if ext_id and not obj.get('x_mitre_is_subtechnique', False):
-                    parent_map[ext_id] = obj.get('name')
+        # objects 를 한 번만 순회: 부모 이름은 수집하면서, 부모보다 먼저 나온 서브 기법은 마지막에 채움
+        for obj in cls.iter_objects():
+            if obj.get('type') != 'attack-pattern':
+                continue
 
-        refined = []
-        for obj in objects:
-            if obj.get('type') == 'attack-pattern' and not obj.get('revoked', False):
-                ext_id = next((r['external_id'] for r in obj.get('external_references', [])
-                              if r['source_name'] == 'mitre-attack'), "N/A")
-
-                name = obj.get('name')
-                description = obj.get('description', "")
-                is_sub = obj.get('x_mitre_is_subtechnique', False)
-
-                # 부모 기법의 이름을 맥락에 주입
-                # - 검색 쿼리에 'SQL Injection'이 포함될 경우, 관련 서브 기법이 검색될 확률을 높임
-                refined_content = f"Technique Name: {name}\n"
-
-                if is_sub and "." in ext_id:
-                    parent_id = ext_id.split(".")[0]
-                    parent_name = parent_map.get(parent_id, "Unknown Parent")
-                    refined_content = f"[Sub-technique of {parent_name}] " + refined_content
-
-                refined_content += f"ID: {ext_id}\n"
-                refined_content += f"Tactics: {', '.join([p['phase_name'] for p in obj.get('kill_chain_phases', [])])}\n"
-                refined_content += f"Description: {description[:500]}..."
-
-                refined.append({
-                    "id": ext_id,
-                    "name": name,
-                    "content": refined_content,
-                    "detection": obj.get('x_mitre_detection', "N/A"),
-                    "tactics": [p['phase_name'] for p in obj.get('kill_chain_phases', [])],
-                    "is_sub": is_sub
-                })
+            ext_id = cls._external_id(obj)
+            is_sub = obj.get('x_mitre_is_subtechnique', False)
+            if ext_id and not is_sub:
+                parent_map[ext_id] = obj.get('name')
+
+            if obj.get('revoked', False):
+                if ext_id:
+                    revoked.append(ext_id)
+                continue
+
+            ext_id = ext_id or "N/A"
+            name = obj.get('name')
+            description = obj.get('description', "")
+            tactics = [p['phase_name'] for p in obj.get('kill_chain_phases', [])]
+
+            # 부모 기법의 이름을 맥락에 주입
+            # - 검색 쿼리에 'SQL Injection'이 포함될 경우, 관련 서브 기법이 검색될 확률을 높임
+            refined_content = f"Technique Name: {name}\n"
+            refined_content += f"ID: {ext_id}\n"
+            refined_content += f"Tactics: {', '.join(tactics)}\n"
+            refined_content += f"Description: {description[:500]}..."
+
+            refined.append({
+                "id": ext_id,
+                "name": name,
+                "content": refined_content,
+                "detection": obj.get('x_mitre_detection', "N/A"),
+                "tactics": tactics,
+                "is_sub": is_sub,
+                "deprecated": obj.get('x_mitre_deprecated', False)
+            })
+            if is_sub and "." in ext_id:
+                pending_parent.append(refined[-1])
 
+        for item in pending_parent:
+            parent_name = parent_map.get(item['id'].split(".")[0], "Unknown Parent")
+            item['content'] = f"[Sub-technique of {parent_name}] " + item['content']
+
+        catalog = {"techniques": refined, "revoked": revoked}
+        cls._save_cache(source_hash, catalog)
         logger.info(f"Refined {len(refined)} MITRE techniques with sub-technique context.")
-        return refined
+        return catalog
+
+    @classmethod
+    def _load_cache(cls, source_hash):
+        if not os.path.exists(cls.CACHE_PATH):
+            return None
+        try:
+            with open(cls.CACHE_PATH, "rb") as f:
+                cache = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            logger.warning("Refined catalog cache is corrupted, rebuilding.")
+            return None
+        if cache.get("source_hash") != source_hash or cache.get("version") != cls.CACHE_VERSION:
+            return None
+        return cache["catalog"]
+
+    @classmethod
+    def _save_cache(cls, source_hash, catalog):
+        tmp_path = cls.CACHE_PATH + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": cls.CACHE_VERSION, "source_hash": source_hash, "catalog": catalog}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cls.CACHE_PATH)
@@ -0,0 +1,160 @@
+import os
+import json
+import logging
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger("TTPAnalyzer.NumpyIndex")
+
+
+class NumpyVectorStore:
+    """
+    Chroma 대체용 인메모리 벡터 인덱스
+    - L2 정규화된 임베딩 행렬을 .npy 로 저장하고 mmap 으로 열어 워커 프로세스 간 메모리 공유
+    - 문서 본문/메타데이터는 같은 순서의 사이드카 JSON 배열로 저장
+    - max_marginal_relevance_search 시그니처는 Chroma 와 동일 (TTPAnalyzer 변경 불필요)
+    - autosave=False 이면 add_documents/delete 는 메모리에서만 반영하고 save() 호출 시 한 번에 저장
+      (동기화는 배치마다 한 번만 저장하고 manifest 를 기록)
+    """
+
+    MATRIX_FILE = "embeddings.npy"
+    META_FILE = "metadata.json"
+
+    def __init__(self, matrix, documents, embedding_function, persist_directory, autosave=True):
+        self.matrix = matrix
+        self.documents = documents
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.autosave = autosave
+        self.dirty = False
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    @classmethod
+    def from_documents(cls, docs, embedding_function, persist_directory, ids=None, autosave=True):
+        store = cls(np.zeros((0, 0), dtype=np.float32), [], embedding_function, persist_directory, autosave)
+        # 새 인덱스는 기존 파일을 덮어써야 하므로 저장 대상
+        store.dirty = True
+        store.add_documents(docs, ids=ids)
+        return store
+
+    @classmethod
+    def load(cls, persist_directory, embedding_function):
+        # mmap_mode='r': 페이지 캐시를 공유하므로 여러 프로세스가 열어도 행렬은 한 번만 메모리에 올라감
+        matrix = np.load(os.path.join(persist_directory, cls.MATRIX_FILE), mmap_mode="r")
+        with open(os.path.join(persist_directory, cls.META_FILE), "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        documents = [Document(id=m.get("id"), page_content=m["page_content"], metadata=m["metadata"]) for m in entries]
+        return cls(matrix, documents, embedding_function, persist_directory)
+
+    def _update(self, matrix, documents):
+        self.matrix, self.documents = matrix, documents
+        self.dirty = True
+        if self.autosave:
+            self.save()
+
+    def save(self):
+        """임시 파일에 쓴 뒤 교체하여 중단되어도 기존 인덱스가 깨지지 않도록 저장"""
+        if not self.dirty:
+            return
+        matrix, documents = self.matrix, self.documents
+        os.makedirs(self.persist_directory, exist_ok=True)
+        matrix_path = os.path.join(self.persist_directory, self.MATRIX_FILE)
+        meta_path = os.path.join(self.persist_directory, self.META_FILE)
+
+        with open(matrix_path + ".tmp", "wb") as f:
+            np.save(f, matrix)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump([{"id": d.id, "page_content": d.page_content, "metadata": d.metadata} for d in documents],
+                      f, ensure_ascii=False)
+        os.replace(matrix_path + ".tmp", matrix_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        reloaded = self.load(self.persist_directory, self.embedding_function)
+        self.matrix, self.documents = reloaded.matrix, reloaded.documents
+        self.dirty = False
+
+    def add_documents(self, docs, ids=None):
+        """문서를 추가 (같은 id 가 이미 있으면 교체)"""
+        if not docs:
+            return []
+        ids = ids or [d.id for d in docs]
+        vectors = self._normalize(self.embedding_function.embed_documents([d.page_content for d in docs]))
+
+        replaced = set(ids)
+        keep = [i for i, d in enumerate(self.documents) if d.id not in replaced]
+        old = np.asarray(self.matrix[keep]) if keep else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+
+        new_docs = [Document(id=i, page_content=d.page_content, metadata=d.metadata) for i, d in zip(ids, docs)]
+        self._update(np.vstack([old, vectors]), [self.documents[i] for i in keep] + new_docs)
+        logger.info(f"Added {len(docs)} vectors to {self.persist_directory}")
+        return ids
+
+    def delete(self, ids):
+        removed = set(ids)
+        keep = [i for i, d in enumerate(self.documents) if d.id not in removed]
+        if len(keep) == len(self.documents):
+            return
+        self._update(np.asarray(self.matrix[keep]), [self.documents[i] for i in keep])
+
+    @staticmethod
+    def _top_k(scores, k):
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        idx = np.argpartition(-scores, k - 1)[:k]
+        return idx[np.argsort(-scores[idx])]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4):
+        """코사인 유사도 top-k (정규화된 벡터이므로 내적과 동일)"""
+        if not self.documents:
+            return []
+        scores = self.matrix @ self._normalize(embedding)
+        idx = self._top_k(scores, k)
+        return [(self.documents[i], float(scores[i])) for i in idx]
+
+    def similarity_search_with_score(self, query, k=4):
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query, k=4):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5):
+        if not self.documents or k <= 0:
+            return []
+        query = self._normalize(embedding)
+        scores = self.matrix @ query
+        fetch_idx = self._top_k(scores, fetch_k)
+
+        cand = np.asarray(self.matrix[fetch_idx])
+        relevance = scores[fetch_idx]
+        # 후보 간 유사도 행렬을 한 번에 계산해두고 선택된 항목과의 최대 유사도만 갱신
+        pairwise = cand @ cand.T
+
+        selected = [0]
+        max_sim_to_selected = pairwise[0].copy()
+        remaining = np.ones(len(fetch_idx), dtype=bool)
+        remaining[0] = False
+
+        while len(selected) < min(k, len(fetch_idx)):
+            mmr = lambda_mult * relevance - (1 - lambda_mult) * max_sim_to_selected
+            mmr[~remaining] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            remaining[best] = False
+            np.maximum(max_sim_to_selected, pairwise[best], out=max_sim_to_selected)
+
+        return [self.documents[fetch_idx[i]] for i in selected]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5):
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
+        )
@@ -0,0 +1,92 @@
+import os
+import logging
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("TTPAnalyzer.OnnxEmbeddings")
+
+# sentence-transformers 허브 저장소에 함께 배포되는 ONNX 내보내기 / 토크나이저 파일
+ONNX_FILE = "onnx/model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+INT8_FILE = "model_int8.onnx"
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    torch 없이 onnxruntime + tokenizers(Rust) 로 실행하는 sentence-transformers 임베딩
+    - all-MiniLM-L6-v2 파이프라인(Transformer → mean pooling → L2 정규화)을 그대로 재현하므로
+      기존 인덱스의 문서 벡터와 같은 공간의 쿼리 벡터를 생성
+    - quantize=True 면 fp32 모델을 동적 int8 양자화(가중치 int8, CPU 종류와 무관)하여 cache_dir 에 한 번 저장
+    - 필요 패키지: onnxruntime, tokenizers, huggingface_hub = `onnx` extra (model_dir 을 주면 허브 접근 불필요)
+    """
+
+    def __init__(self, model_name, quantize=False, model_dir=None, cache_dir="./models/onnx",
+                 max_length=256, batch_size=32, num_threads=None):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+            if model_dir is None:
+                import huggingface_hub  # noqa: F401
+        except ImportError as e:
+            raise ImportError(f"ONNX embedding backend requires the `onnx` extra ({e.name} is missing): "
+                              "`uv sync --extra onnx` or `pip install -e '.[onnx]'`") from e
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        model_path, tokenizer_path = self._resolve_files(model_name, model_dir)
+        if quantize:
+            model_path = self._quantized(model_path, os.path.join(cache_dir, model_name.replace("/", "__")))
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"ONNX embeddings loaded: {model_path} ({'int8' if quantize else 'fp32'})")
+
+    @staticmethod
+    def _resolve_files(model_name, model_dir):
+        if model_dir is not None:
+            return os.path.join(model_dir, "model.onnx"), os.path.join(model_dir, TOKENIZER_FILE)
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(model_name, ONNX_FILE), hf_hub_download(model_name, TOKENIZER_FILE)
+
+    @staticmethod
+    def _quantized(model_path, cache_dir):
+        int8_path = os.path.join(cache_dir, INT8_FILE)
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            os.makedirs(cache_dir, exist_ok=True)
+            logger.info(f"Quantizing {model_path} to int8 -> {int8_path}")
+            quantize_dynamic(model_path, int8_path + ".tmp", weight_type=QuantType.QInt8)
+            os.replace(int8_path + ".tmp", int8_path)
+        return int8_path
+
+    def _embed(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]
+        # 패딩을 제외한 토큰 평균 후 L2 정규화
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        vectors = [self._embed(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.concatenate(vectors).tolist() if vectors else []
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
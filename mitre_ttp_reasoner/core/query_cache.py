@@ -0,0 +1,133 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("TTPAnalyzer.QueryCache")
+
+
+class QueryCache:
+    """
+    검색 쿼리 재작성(LLM) 결과를 저장하는 2단 캐시
+    - 1단: 프로세스 메모리 LRU (크기 제한)
+    - 2단: SQLite 디스크 저장소 (재시작 후에도 유지, 크기 제한)
+
+    키는 (정규화된 페이로드 prefix, 모델명, 프롬프트 버전)의 해시이므로
+    프롬프트 문구나 모델이 바뀌면 자연스럽게 다른 키가 되고, invalidate()로 정리할 수 있다.
+    """
+
+    DB_PATH = "data/query_cache.sqlite3"
+
+    def __init__(self, model_name, prompt_version, db_path=None, max_memory_items=1024, max_disk_items=100_000):
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.db_path = db_path or self.DB_PATH
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_cache ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " prompt_version TEXT NOT NULL,"
+            " query TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_query_cache_lru ON query_cache (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(payload_prefix: str) -> str:
+        """대소문자와 연속 공백 차이만 있는 페이로드를 같은 키로 취급"""
+        return re.sub(r"\s+", " ", payload_prefix).strip().lower()
+
+    def make_key(self, payload_prefix: str) -> str:
+        raw = f"{self.model_name}\x00{self.prompt_version}\x00{self.normalize(payload_prefix)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, payload_prefix: str):
+        key = self.make_key(payload_prefix)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+            row = self._conn.execute("SELECT query FROM query_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE query_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._remember(key, row[0])
+            self.hits += 1
+            return row[0]
+
+    def put(self, payload_prefix: str, query: str):
+        key = self.make_key(payload_prefix)
+        with self._lock:
+            self._remember(key, query)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_cache (key, model, prompt_version, query, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, self.model_name, self.prompt_version, query, time.time())
+            )
+            # 디스크 저장소도 크기 제한: 가장 오래 사용되지 않은 항목부터 제거
+            self._conn.execute(
+                "DELETE FROM query_cache WHERE key IN ("
+                " SELECT key FROM query_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_items,)
+            )
+            self._conn.commit()
+
+    def _remember(self, key, query):
+        self._memory[key] = query
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, all_versions=False):
+        """
+        캐시 무효화
+        - 기본: 현재 모델/프롬프트 버전과 다른 항목(더 이상 쓰이지 않는 항목)만 삭제
+        - all_versions=True: 전체 삭제
+        """
+        with self._lock:
+            self._memory.clear()
+            if all_versions:
+                cur = self._conn.execute("DELETE FROM query_cache")
+            else:
+                cur = self._conn.execute(
+                    "DELETE FROM query_cache WHERE model != ? OR prompt_version != ?",
+                    (self.model_name, self.prompt_version)
+                )
+            self._conn.commit()
+            logger.info(f"Query cache invalidated ({cur.rowcount} rows removed)")
+            return cur.rowcount
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_items": len(self._memory)
+        }
+
+    def close(self):
+        self._conn.close()
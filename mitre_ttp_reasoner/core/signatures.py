@@ -0,0 +1,108 @@
+import yaml
+import logging
+from collections import deque
+from .state import AnalysisResult
+
+logger = logging.getLogger("TTPAnalyzer.Signatures")
+
+
+class AhoCorasick:
+    """여러 리터럴 패턴을 한 번의 순회로 찾는 Aho-Corasick 오토마톤 (대소문자 무시)"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+
+        for pattern in patterns:
+            self._add(pattern.lower())
+        self._build_failure_links()
+
+    def _add(self, pattern):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            node = nxt
+        self._out[node].add(pattern)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def search(self, text):
+        """text 에 등장한 패턴 집합 반환"""
+        found = set()
+        node = 0
+        for ch in text.lower():
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            if self._out[node]:
+                found |= self._out[node]
+        return found
+
+
+class SignatureMatcher:
+    """
+    명백한 페이로드를 LLM 호출 없이 판정하는 결정적 시그니처 매처
+    - 규칙은 prompts/signatures.yaml 에서 로드
+    - 모든 규칙의 패턴을 하나의 오토마톤으로 컴파일해 페이로드를 한 번만 순회
+    """
+
+    RULES_PATH = "prompts/signatures.yaml"
+
+    def __init__(self, rules=None, min_confidence=0.9):
+        self.rules = rules if rules is not None else self.load_rules()
+        self.min_confidence = min_confidence
+        self._automaton = AhoCorasick({p.lower() for r in self.rules for p in r['patterns']})
+
+    @classmethod
+    def load_rules(cls, path=None):
+        with open(path or cls.RULES_PATH, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+        rules = config.get('signatures', [])
+        logger.info(f"Loaded {len(rules)} signature rules.")
+        return rules
+
+    def match(self, payload):
+        """
+        확신할 수 있는 규칙이 정확히 하나의 TID로 모이면 AnalysisResult 반환, 아니면 None
+        (미탐 또는 서로 다른 TID가 동시에 매칭된 모호한 경우는 LLM 경로로 넘김)
+        """
+        found = self._automaton.search(payload)
+        if not found:
+            return None
+
+        matched = []
+        for rule in self.rules:
+            hits = [p for p in rule['patterns'] if p.lower() in found]
+            if len(hits) >= rule.get('min_hits', 1) and rule.get('confidence', 0.0) >= self.min_confidence:
+                matched.append((rule, hits))
+
+        if not matched or len({r['tid'] for r, _ in matched}) > 1:
+            return None
+
+        rule, hits = max(matched, key=lambda m: m[0]['confidence'])
+        return AnalysisResult(
+            is_malicious=True,
+            tid=rule['tid'],
+            technique_name=rule['technique_name'],
+            tactic=rule['tactic'],
+            sub_tactic=rule['tid'] if "." in rule['tid'] else "N/A",
+            confidence=rule['confidence'],
+            reasoning=f"Signature rule '{rule['name']}' matched patterns: {', '.join(hits)}"
+        )
@@ -0,0 +1,37 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("TTPAnalyzer.Startup")
+
+
+class StartupProfile:
+    """
+    기동 비용(임포트, 모델 로드, 인덱스 오픈 등)을 단계별로 누적 기록
+    - 지연 생성되는 객체는 최초 사용 시점에 해당 단계로 기록됨
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def report(self):
+        lines = [f"  {name:<14} {elapsed * 1000:9.1f} ms" for name, elapsed in self.phases.items()]
+        lines.append(f"  {'total':<14} {sum(self.phases.values()) * 1000:9.1f} ms")
+        return "Startup time breakdown:\n" + "\n".join(lines)
+
+
+startup_profile = StartupProfile()
@@ -1,4 +1,5 @@
 from typing import TypedDict, List, Optional
+from langchain_core.messages import BaseMessage
 from pydantic import BaseModel, Field
 
 
@@ -15,7 +16,20 @@ class AnalysisResult(BaseModel):
 class AgentState(TypedDict):
     payload: str
     candidates: List[str]
+    candidate_ids: List[str]
     analysis: Optional[AnalysisResult]
     iteration: int
     feedback: str
     is_final: bool
+    signature_hit: bool
+    fingerprint: str
+    cache_hit: bool
+    query_cache_hit: bool
+    retrieval_tier: str
+    direct_score: float
+    direct_margin: float
+    verified: bool
+    tokens_saved: int
+    prompt_messages: List[BaseMessage]
+    last_response: Optional[str]
+    parse_failures: int
@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+
+class TechniqueIndex:
+    """
+    MitreLoader 카탈로그 기반 ATT&CK 기법 인덱스
+    - TID → 기법 정보 O(1) 조회
+    - 부모 → 서브 기법 맵, 전술별 TID 집합
+    - revoke/deprecated 된 기법 식별
+    """
+
+    def __init__(self, techniques, revoked=()):
+        self.techniques = {}
+        self.children = defaultdict(set)
+        self.by_tactic = defaultdict(set)
+        self.deprecated = set()
+        self.revoked = set(revoked)
+
+        for t in techniques:
+            tid = t['id']
+            self.techniques[tid] = t
+            if t.get('is_sub') and "." in tid:
+                self.children[self.parent_of(tid)].add(tid)
+            for tactic in t.get('tactics', []):
+                self.by_tactic[tactic].add(tid)
+            if t.get('deprecated'):
+                self.deprecated.add(tid)
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        return cls(catalog["techniques"], catalog.get("revoked", ()))
+
+    @staticmethod
+    def parent_of(tid):
+        return tid.split(".")[0]
+
+    @staticmethod
+    def is_sub(tid):
+        return "." in tid
+
+    def get(self, tid):
+        return self.techniques.get(tid)
+
+    def is_active(self, tid):
+        """카탈로그에 존재하며 revoke/deprecated 되지 않은 기법인지"""
+        return tid in self.techniques and tid not in self.deprecated and tid not in self.revoked
+
+    def children_of(self, tid):
+        return self.children.get(self.parent_of(tid), set())
+
+    def tactics_of(self, tid):
+        t = self.techniques.get(tid)
+        return set(t['tactics']) if t else set()
@@ -1,30 +1,194 @@
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+import os
+import json
+import hashlib
+import logging
+import threading
 from langchain_core.documents import Document
+from .startup import startup_profile
+from .bm25_index import BM25Index
+
+logger = logging.getLogger("TTPAnalyzer.VectorEngine")
 
 
 class VectorEngine:
-    def __init__(self, db_path="./db"):
-        model_name = "sentence-transformers/all-MiniLM-L6-v2"
-        self.embeddings = HuggingFaceEmbeddings(model_name=model_name)
-        self.db_path = db_path
+    # backend 별 기본 저장 경로
+    DB_PATHS = {"chroma": "./db", "numpy": "./db_numpy"}
+    MANIFEST_FILE = "manifest.json"
+    MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+    # torch: HuggingFaceEmbeddings(fp32), onnx / onnx-int8: onnxruntime CPU 실행 (torch 임포트 없음)
+    EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+    def __init__(self, db_path=None, backend="chroma", embedding_backend="torch"):
+        if backend not in self.DB_PATHS:
+            raise ValueError(f"Unknown vector backend: {backend}")
+        if embedding_backend not in self.EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {embedding_backend}")
+        self.embedding_backend = embedding_backend
+        self._embeddings = None
+        self._embeddings_lock = threading.Lock()
+        self.backend = backend
+        self.db_path = db_path or self.DB_PATHS[backend]
+        self.manifest_path = os.path.join(self.db_path, self.MANIFEST_FILE)
+
+    @property
+    def embeddings(self):
+        """임베딩 모델은 최초 사용 시 로드 (torch 백엔드는 sentence-transformers/torch 임포트 비용 포함)"""
+        with self._embeddings_lock:
+            if self._embeddings is None:
+                with startup_profile.phase("model_load"):
+                    self._embeddings = self.load_embeddings(self.embedding_backend)
+        return self._embeddings
+
+    @classmethod
+    def load_embeddings(cls, embedding_backend):
+        # ONNX 내보내기는 같은 모델/풀링을 재현하므로 기존 DB 벡터와 호환 (재구축 불필요)
+        if embedding_backend == "torch":
+            from langchain_huggingface import HuggingFaceEmbeddings
+            return HuggingFaceEmbeddings(model_name=cls.MODEL_NAME)
+        from .onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(cls.MODEL_NAME, quantize=embedding_backend == "onnx-int8")
+
+    def exists(self):
+        return os.path.exists(self.db_path) and bool(os.listdir(self.db_path))
+
+    @staticmethod
+    def to_document(d):
+        page_text = f"{d['content']}\nDetection Guide: {d['detection']}"
+
+        return Document(
+            id=d['id'],
+            page_content=page_text,
+            metadata={
+                "tid": d['id'],
+                "tactic": str(d['tactics']),
+                "is_sub": d['is_sub']
+            }
+        )
+
+    @staticmethod
+    def content_hash(doc):
+        raw = json.dumps([doc.page_content, doc.metadata], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        os.makedirs(self.db_path, exist_ok=True)
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def is_current(self, source_hash):
+        """manifest 가 같은 원본 파일/임베딩 모델로 완전히 동기화된 상태인지 확인"""
+        manifest = self.load_manifest()
+        return (manifest is not None
+                and manifest.get("embedding_model") == self.MODEL_NAME
+                and manifest.get("source_hash") == source_hash)
 
     def build_db(self, refined_data):
-        docs = []
-        for d in refined_data:
-            page_text = f"{d['content']}\nDetection Guide: {d['detection']}"
-
-            doc = Document(
-                page_content=page_text,
-                metadata={
-                    "tid": d['id'],
-                    "tactic": str(d['tactics']),
-                    "is_sub": d['is_sub']
-                }
-            )
-            docs.append(doc)
+        docs = [self.to_document(d) for d in refined_data]
 
+        if self.backend == "numpy":
+            from .numpy_index import NumpyVectorStore
+            return NumpyVectorStore.from_documents(docs, self.embeddings, persist_directory=self.db_path)
+        from langchain_chroma import Chroma
         return Chroma.from_documents(docs, self.embeddings, persist_directory=self.db_path)
 
     def get_db(self):
-        return Chroma(persist_directory=self.db_path, embedding_function=self.embeddings)
+        # langchain_chroma / numpy 인덱스도 실제로 열 때 임포트
+        with startup_profile.phase("index_open"):
+            if self.backend == "numpy":
+                from .numpy_index import NumpyVectorStore
+                return NumpyVectorStore.load(self.db_path, self.embeddings)
+            from langchain_chroma import Chroma
+            return Chroma(persist_directory=self.db_path, embedding_function=self.embeddings)
+
+    def build_lexical_index(self, refined_data, source_hash=None):
+        """기법 본문/탐지 가이드로 BM25 역색인을 만들어 벡터 DB 디렉터리에 함께 저장"""
+        index = BM25Index.build([self.to_document(d) for d in refined_data], source_hash=source_hash)
+        index.save(self.db_path)
+        return index
+
+    def get_lexical_index(self, refined_data, source_hash=None):
+        """저장된 BM25 인덱스가 같은 원본으로 만들어졌으면 재사용, 아니면 다시 구축"""
+        with startup_profile.phase("index_open"):
+            index = BM25Index.load(self.db_path)
+        if index is None or index.source_hash != source_hash:
+            index = self.build_lexical_index(refined_data, source_hash)
+        return index
+
+    def _open_for_sync(self, reset):
+        if self.backend == "numpy":
+            from .numpy_index import NumpyVectorStore
+            if reset or not os.path.exists(os.path.join(self.db_path, NumpyVectorStore.MATRIX_FILE)):
+                return NumpyVectorStore.from_documents([], self.embeddings, persist_directory=self.db_path,
+                                                       autosave=False)
+            db = self.get_db()
+            db.autosave = False
+            return db
+
+        db = self.get_db()
+        if reset:
+            db.reset_collection()
+        return db
+
+    def sync_db(self, refined_data, source_hash=None, batch_size=64, lexical_index=None):
+        """
+        manifest(tid → 내용 해시, 임베딩 모델)와 비교해 변경분만 반영
+        - 추가/변경된 기법만 다시 임베딩, 삭제되거나 revoke 된 기법은 제거
+        - 배치마다 인덱스와 manifest 를 저장하므로 중단 후 재실행하면 남은 배치부터 이어서 진행
+        - lexical_index: 이미 로드한 BM25 인덱스 (같은 원본이면 다시 읽거나 구축하지 않음)
+        """
+        manifest = self.load_manifest()
+        # manifest 가 없거나(구버전 DB 포함) 임베딩 모델이 바뀌면 전체 재구축
+        reset = manifest is None or manifest.get("embedding_model") != self.MODEL_NAME
+        if reset:
+            manifest = {"embedding_model": self.MODEL_NAME, "source_hash": None, "techniques": {}}
+
+        db = self._open_for_sync(reset)
+        indexed = manifest["techniques"]
+
+        def checkpoint():
+            # numpy 인덱스는 메모리에만 반영되어 있으므로 먼저 저장한 뒤 manifest 기록
+            # (manifest 가 저장되지 않은 벡터를 가리키면 재실행 시 그 배치를 건너뛰게 됨)
+            if self.backend == "numpy":
+                db.save()
+            self.save_manifest(manifest)
+
+        docs = {}
+        for d in refined_data:
+            docs[d['id']] = self.to_document(d)
+        hashes = {tid: self.content_hash(doc) for tid, doc in docs.items()}
+
+        removed = [tid for tid in indexed if tid not in docs]
+        changed = [tid for tid, h in hashes.items() if indexed.get(tid) != h]
+        logger.info(f"Vector DB sync: {len(changed)} added/changed, {len(removed)} removed, "
+                    f"{len(docs) - len(changed)} unchanged")
+
+        if removed:
+            db.delete(ids=removed)
+            for tid in removed:
+                indexed.pop(tid, None)
+            checkpoint()
+
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start:start + batch_size]
+            db.add_documents([docs[tid] for tid in batch], ids=batch)
+            for tid in batch:
+                indexed[tid] = hashes[tid]
+            checkpoint()
+            logger.info(f"Embedded {min(start + batch_size, len(changed))}/{len(changed)} techniques")
+
+        # BM25 는 원본이 바뀌었을 때만 다시 구축 (임베딩 모델 변경만으로는 그대로 유효)
+        if lexical_index is None or lexical_index.source_hash != source_hash:
+            self.get_lexical_index(refined_data, source_hash)
+
+        if self.backend == "numpy":
+            db.autosave = True
+        manifest["source_hash"] = source_hash
+        checkpoint()
+        return db
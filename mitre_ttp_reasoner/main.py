@@ -1,12 +1,22 @@
+import time
+_import_started = time.perf_counter()
+
 import os
+import argparse
 import orjson
 import logging
 import asyncio
+from core.startup import startup_profile
 from core.mitre_loader import MitreLoader
 from core.vector_engine import VectorEngine
 from core.analyzer import TTPAnalyzer
+from core.technique_index import TechniqueIndex
+from llm_common.metrics import graph_metrics
+from core.eval_checkpoint import EvalCheckpoint
 from test_evaluator import evaluate_accuracy
 
+startup_profile.record("imports", time.perf_counter() - _import_started)
+
 
 # 로깅 설정
 logging.basicConfig(
@@ -26,42 +36,157 @@ def load_test_cases(filepath="tests/test_cases.json"):
         return orjson.loads(f.read())
 
 
-async def main():
+def stream_test_cases(filepath):
+    """JSONL 테스트 데이터셋을 한 줄씩 읽어 반환 (대용량 합성 코퍼스를 메모리에 올리지 않음)"""
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
+
+def add_analyzer_args(parser):
+    """분석 엔진 구성 옵션 (main / service 공통)"""
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="동시에 분석할 최대 케이스 수 (vLLM --max-num-seqs 권장)")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="케이스별 타임아웃(초)")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma",
+                        help="벡터 저장소 백엔드 (numpy: mmap 기반 인메모리 인덱스)")
+    parser.add_argument("--embedding-backend", choices=VectorEngine.EMBEDDING_BACKENDS, default="torch",
+                        help="쿼리/문서 임베딩 실행 방식 (onnx, onnx-int8: torch 없이 CPU 에서 실행, `onnx` extra 필요)")
+    parser.add_argument("--clear-query-cache", action="store_true",
+                        help="검색 쿼리 재작성 캐시를 모두 비우고 시작")
+    parser.add_argument("--structured-output", action="store_true",
+                        help="AnalysisResult JSON schema 로 디코딩을 제약하고 스트리밍 증분 파싱 사용")
+    parser.add_argument("--warmup", action="store_true",
+                        help="임베딩 모델/벡터 DB/LLM 클라이언트를 백그라운드에서 미리 로드")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="기동 시간 단계별 내역 출력 (imports, model load, index open)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="노드별 지연/토큰/캐시 적중/반복 횟수 히스토그램을 Prometheus 텍스트 형식으로 저장")
+    parser.add_argument("--trace-file", default=None,
+                        help="노드 실행을 OpenTelemetry span 형태의 JSON Lines 로 기록")
+    parser.add_argument("--adaptive-retrieval", action="store_true",
+                        help="원문 페이로드 임베딩 검색이 확실하면 LLM 쿼리 재작성을 생략하는 2단계 검색")
+    parser.add_argument("--direct-min-score", type=float, default=0.5,
+                        help="직접 검색 결과를 채택할 최소 top-1 코사인 유사도")
+    parser.add_argument("--direct-min-margin", type=float, default=0.05,
+                        help="직접 검색 결과를 채택할 최소 top-1/top-2 유사도 차이")
+    parser.add_argument("--hybrid-retrieval", action="store_true",
+                        help="원문 페이로드 BM25 어휘 검색 결과를 벡터 검색 결과와 RRF 로 결합")
+    return parser
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MITRE ATT&CK TTP Reasoner")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="완료된 케이스를 (케이스 id, 설정 해시) 단위로 SQLite 에 기록하고 재실행 시 건너뜀")
+    parser.add_argument("--checkpoint-db", default=EvalCheckpoint.DB_PATH,
+                        help="평가 체크포인트 SQLite 경로")
+    parser.add_argument("--reset-checkpoint", action="store_true",
+                        help="현재 설정의 체크포인트를 지우고 처음부터 평가")
+    parser.add_argument("--test-cases", default=None,
+                        help="평가 데이터셋 경로 (.json 목록 또는 .jsonl 스트림, 기본: 내장 예시 케이스)")
+    parser.add_argument("--report", default=None,
+                        help="케이스 결과를 완료 순서대로 추가할 JSONL 경로")
+    return add_analyzer_args(parser).parse_args()
+
+
+def build_analyzer(args):
+    """MITRE 데이터/벡터 저장소를 준비하고 TTPAnalyzer 를 구성"""
+    if args.trace_file:
+        graph_metrics.enable_spans(args.trace_file)
+
     #  데이터 준비
     MitreLoader.download()
 
     # 벡터 DB 구축
-    # - 최초 1회 실행 후 get_db로 전환
-    engine = VectorEngine()
-    db_dir = "./db"
+    # - 원본 데이터가 그대로면 get_db로 재사용, 바뀌었으면 추가/변경/삭제된 기법만 반영
+    engine = VectorEngine(backend=args.backend, embedding_backend=args.embedding_backend)
+    source_hash = MitreLoader.source_hash()
 
-    if os.path.exists(db_dir) and os.listdir(db_dir):
-        print("[*] 기존 벡터 저장소를 재사용합니다.")
-        vector_db = engine.get_db()
+    # 정제 카탈로그는 원본 해시 기준 캐시에서 로드되므로 빠름
+    catalog = MitreLoader.load_catalog(source_hash=source_hash)
+    technique_index = TechniqueIndex.from_catalog(catalog)
+
+    options = dict(technique_index=technique_index, structured_output=args.structured_output,
+                   adaptive_retrieval=args.adaptive_retrieval, direct_min_score=args.direct_min_score,
+                   direct_min_margin=args.direct_min_margin)
+    if args.hybrid_retrieval:
+        # 벡터 DB 디렉터리에 저장된 BM25 인덱스를 재사용 (원본이 바뀌었으면 다시 구축)
+        options["lexical_index"] = engine.get_lexical_index(catalog["techniques"], source_hash)
+    if engine.is_current(source_hash):
+        logger.info("[*] 기존 벡터 저장소를 재사용합니다.")
+        # 실제 검색이 필요할 때 인덱스를 열도록 지연
+        analyzer = TTPAnalyzer(db_factory=engine.get_db, **options)
     else:
-        print("[*] 신규 벡터 저장소를 구축합니다. (최초 1회 소요)")
-        refined_data = MitreLoader.load_and_refine()
-        vector_db = engine.build_db(refined_data)
+        logger.info("[*] 벡터 저장소를 동기화합니다. (변경된 기법만 임베딩)")
+        vector_db = engine.sync_db(catalog["techniques"], source_hash=source_hash,
+                                   lexical_index=options.get("lexical_index"))
+        analyzer = TTPAnalyzer(vector_db, **options)
+
+    # 모델/프롬프트가 바뀌어 더 이상 쓰이지 않는 쿼리 캐시 정리
+    analyzer.query_cache.invalidate(all_versions=args.clear_query_cache)
+    return analyzer
+
+
+def report(analyzer, args):
+    """실행 종료 시 캐시/기동/노드 지표 출력 및 저장"""
+    for name, stats in analyzer.stats().items():
+        logger.info(f"{name} stats: {stats}")
+    if args.startup_report:
+        logger.info(startup_profile.report())
+    if args.metrics_file:
+        graph_metrics.write(args.metrics_file)
+        logger.info(f"Metrics saved to {args.metrics_file}")
+    if graph_metrics.spans is not None:
+        graph_metrics.spans.flush()
+
 
-    # 분석기 초기화
-    analyzer = TTPAnalyzer(vector_db)
+async def main(args):
+    analyzer = build_analyzer(args)
     app = analyzer.workflow
 
-    # 테스트 데이터셋 정의
-    test_cases = [
-        {
-            "payload": "GET /index.php?id=1' UNION SELECT NULL, user(), database()-- HTTP/1.1",
-            "label": {"tid": "T1190", "tactic": "initial-access"}
-        },
-        {
-            "payload": "POST /upload.php HTTP/1.1\n\n<?php system($_GET['c']); ?>",
-            "label": {"tid": "T1505.003", "tactic": "persistence"}
-        }
-    ]
+    warmup_task = asyncio.create_task(asyncio.to_thread(analyzer.warmup)) if args.warmup else None
+
+    # 테스트 데이터셋 정의 (benchmarks.generate_corpus 로 만든 JSONL 은 스트리밍으로 읽음)
+    if args.test_cases and args.test_cases.endswith(".jsonl"):
+        test_cases = stream_test_cases(args.test_cases)
+    elif args.test_cases:
+        test_cases = load_test_cases(args.test_cases)
+    else:
+        test_cases = [
+            {
+                "payload": "GET /index.php?id=1' UNION SELECT NULL, user(), database()-- HTTP/1.1",
+                "label": {"tid": "T1190", "tactic": "initial-access"}
+            },
+            {
+                "payload": "POST /upload.php HTTP/1.1\n\n<?php system($_GET['c']); ?>",
+                "label": {"tid": "T1505.003", "tactic": "persistence"}
+            }
+        ]
+
+    checkpoint = None
+    if args.checkpoint:
+        # 모델/프롬프트/검색 옵션/MITRE 원본이 바뀌면 다른 해시가 되어 이전 결과를 재사용하지 않음
+        config = {**analyzer.config(), "backend": args.backend, "embedding_backend": args.embedding_backend,
+                  "source_hash": MitreLoader.source_hash()}
+        checkpoint = EvalCheckpoint(config, db_path=args.checkpoint_db)
+        if args.reset_checkpoint:
+            checkpoint.reset()
+
+    # 실행 및 평가 (중단되어도 체크포인트 DB 는 닫아 마지막 기록까지 반영)
+    try:
+        await evaluate_accuracy(app, test_cases, concurrency=args.concurrency, timeout=args.timeout,
+                                checkpoint=checkpoint, report_path=args.report)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
 
-    # 실행 및 평가
-    await evaluate_accuracy(app, test_cases)
+    if warmup_task is not None:
+        await warmup_task
+    report(analyzer, args)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,412 @@
+"""
+WAF/액세스 로그 스트림을 지속적으로 분석하는 서비스 모드
+
+    python service.py < events.jsonl                          # 표준 입력
+    python service.py --tail /var/log/waf/events.jsonl         # 파일 tail (로테이션 대응)
+    python service.py --http 127.0.0.1:8080                   # POST /events (JSONL 본문), GET /metrics
+
+- 입력 이벤트: {"id": ..., "context": ..., "payload": ...} 형식의 JSON 한 줄
+- 결과는 이벤트 하나가 끝날 때마다 --output(기본 표준 출력)에 JSONL 로 기록
+- 큐가 가득 찬 경우(--overflow): block = 입력을 멈춰 backpressure, drop = 새 이벤트 폐기,
+  spill = 디스크에 보관했다가 큐가 비면 다시 투입 (처리 완료 위치를 커밋하므로 재시작 시 남은 것만 재투입)
+- SIGINT/SIGTERM 또는 입력 종료 시 새 입력을 멈추고 큐에 남은 이벤트를 --drain-timeout 안에서 처리 후 종료
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import datetime
+from collections import deque
+from llm_common.metrics import graph_metrics
+from main import add_analyzer_args, build_analyzer, report
+from test_evaluator import build_payload
+
+logger = logging.getLogger("TTPAnalyzer.Service")
+
+
+class SpillBuffer:
+    """
+    큐에 들어가지 못한 이벤트를 JSONL 파일에 덧붙이고, 읽은 위치부터 다시 꺼냄
+    - 다시 꺼낸 이벤트의 처리가 끝나면 ack() 로 커밋 위치를 옮겨 <path>.offset 에 기록
+    - 재시작 시 커밋 위치 이후만 다시 투입하므로 이미 처리한 이벤트는 두 번 분석하지 않음
+      (중단 시점에 처리 중이던 이벤트만 다시 분석될 수 있음)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = path + ".offset"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = open(path, "ab")
+        self._committed = self._load_offset()
+        self._offset = self._committed
+        # 다시 꺼냈지만 아직 커밋되지 않은 이벤트의 끝 위치 (읽은 순서) / 순서와 다르게 먼저 끝난 것
+        self._outstanding = deque()
+        self._acked = set()
+        # 이전 실행에서 처리하지 못하고 남은 이벤트도 다시 투입 대상
+        with open(path, "rb") as f:
+            f.seek(self._committed)
+            self.pending = sum(1 for _ in f)
+
+    def _load_offset(self):
+        try:
+            with open(self.offset_path, "r", encoding="utf-8") as f:
+                offset = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+        # 파일이 외부에서 비워졌으면 처음부터
+        return offset if offset <= os.path.getsize(self.path) else 0
+
+    def _save_offset(self):
+        tmp_path = self.offset_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(self._committed))
+        os.replace(tmp_path, self.offset_path)
+
+    def append(self, line):
+        self._writer.write((line.rstrip("\n") + "\n").encode("utf-8"))
+        self._writer.flush()
+        self.pending += 1
+
+    def read(self, limit):
+        """아직 다시 투입하지 않은 이벤트를 최대 limit 개 (줄, 끝 위치) 로 반환"""
+        lines = []
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            while len(lines) < limit:
+                line = f.readline()
+                if not line:
+                    break
+                self._offset = f.tell()
+                self._outstanding.append(self._offset)
+                lines.append((line.decode("utf-8"), self._offset))
+        self.pending -= len(lines)
+        return lines
+
+    def ack(self, end):
+        """다시 꺼낸 이벤트 처리 완료: 앞선 이벤트가 모두 끝난 구간까지 커밋 위치를 옮김"""
+        self._acked.add(end)
+        committed = self._committed
+        while self._outstanding and self._outstanding[0] in self._acked:
+            committed = self._outstanding.popleft()
+            self._acked.discard(committed)
+        if committed == self._committed:
+            return
+        self._committed = committed
+        if not self.pending and not self._outstanding:
+            # 모두 처리했으면 파일을 비워 무한히 커지지 않게 함
+            self._writer.truncate(0)
+            self._writer.seek(0)
+            self._committed = self._offset = 0
+        self._save_offset()
+
+    def close(self):
+        self._writer.close()
+
+
+class IngestService:
+    """
+    bounded 큐 기반 스트리밍 분석 서비스
+    - 입력 소스는 submit() 으로 이벤트 줄을 넣고, 워커는 TTPAnalyzer.workflow 로 처리 후 즉시 결과를 기록
+    """
+
+    def __init__(self, app, output, concurrency=8, queue_size=1000, overflow="block", spill_path=None,
+                 timeout=None):
+        if overflow not in ("block", "drop", "spill"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.app = app
+        self.output = output
+        self.concurrency = max(1, concurrency)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflow = overflow
+        self.spill = SpillBuffer(spill_path or "data/spill.jsonl") if overflow == "spill" else None
+        self.timeout = timeout
+        self.stopping = asyncio.Event()
+
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.invalid = 0
+
+    async def submit(self, line):
+        """이벤트 한 줄 투입 (수락 시 True, 폐기 시 False)"""
+        line = line.strip()
+        if not line:
+            return True
+        self.received += 1
+        if self.overflow == "block":
+            await self.queue.put((line, None))
+            return True
+        try:
+            self.queue.put_nowait((line, None))
+            return True
+        except asyncio.QueueFull:
+            if self.overflow == "spill":
+                self.spill.append(line)
+                self.spilled += 1
+                return True
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Queue full, dropping events (dropped so far: {self.dropped})")
+            return False
+
+    async def _refill(self):
+        """큐에 여유가 생기면 디스크에 보관한 이벤트를 다시 투입"""
+        low_water = max(1, self.queue.maxsize // 2)
+        while True:
+            if self.spill.pending and self.queue.qsize() < low_water:
+                for item in self.spill.read(self.queue.maxsize - self.queue.qsize()):
+                    self.queue.put_nowait(item)
+            else:
+                await asyncio.sleep(0.1)
+
+    async def _worker(self):
+        while True:
+            # spill_end: spill 파일에서 다시 꺼낸 이벤트의 끝 위치 (처리 후 커밋)
+            line, spill_end = await self.queue.get()
+            try:
+                await self._process(line)
+                if spill_end is not None:
+                    self.spill.ack(spill_end)
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, line):
+        try:
+            event = json.loads(line)
+            payload = build_payload(event)
+        except (ValueError, KeyError, TypeError) as e:
+            self.invalid += 1
+            self._write({"error": f"invalid event: {e}", "raw": line[:200]})
+            return
+
+        started = time.perf_counter()
+        record = {"id": event.get("id"), "received_at": datetime.datetime.now().isoformat(timespec="milliseconds")}
+        try:
+            with graph_metrics.trace("ttp_analysis", case_id=event.get("id", "N/A")):
+                final_state = await asyncio.wait_for(self.app.ainvoke({"payload": payload}), timeout=self.timeout)
+            record.update({
+                "analysis": final_state['analysis'].model_dump(),
+                "signature_hit": final_state.get('signature_hit', False),
+                "cache_hit": final_state.get('cache_hit', False),
+                "verified": final_state.get('verified', False),
+                "iterations": final_state.get('iteration', 0)
+            })
+            self.processed += 1
+        except Exception as e:
+            # 타임아웃/LLM 오류가 나도 서비스는 계속 동작
+            record["error"] = f"{type(e).__name__}: {e}"
+            self.failed += 1
+        record["latency_sec"] = round(time.perf_counter() - started, 4)
+        self._write(record)
+
+    def _write(self, record):
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    async def run(self, source, drain_timeout=30.0):
+        """입력 소스가 끝나거나 stop() 이 호출될 때까지 실행 후 큐를 비우고 종료"""
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        refill = asyncio.create_task(self._refill()) if self.spill else None
+        source_task = asyncio.create_task(source(self))
+        stop_task = asyncio.create_task(self.stopping.wait())
+
+        await asyncio.wait({source_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+        # 새 입력을 멈추고 남은 이벤트 처리 (spill 은 큐가 비는 대로 계속 재투입)
+        source_task.cancel()
+        logger.info(f"Draining {self.queue.qsize()} queued events"
+                    + (f" (+{self.spill.pending} spilled)" if self.spill else ""))
+        try:
+            await asyncio.wait_for(self._drain(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain timed out after {drain_timeout}s, {self.queue.qsize()} events left unprocessed")
+
+        self.stopping.set()
+        for task in [*workers, refill, stop_task]:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*workers, *(t for t in (refill, stop_task, source_task) if t), return_exceptions=True)
+        if self.spill:
+            if self.spill.pending:
+                logger.warning(f"{self.spill.pending} events remain in {self.spill.path}")
+            self.spill.close()
+        logger.info(f"Service stopped: {self.stats()}")
+
+    async def _drain(self):
+        while True:
+            await self.queue.join()
+            if not self.spill or not self.spill.pending:
+                return
+            await asyncio.sleep(0.1)
+
+    def stop(self):
+        self.stopping.set()
+
+    def stats(self):
+        return {
+            "received": self.received, "processed": self.processed, "failed": self.failed,
+            "invalid": self.invalid, "dropped": self.dropped, "spilled": self.spilled,
+            "queued": self.queue.qsize()
+        }
+
+
+async def stdin_source(service):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=2 ** 20)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except ValueError:
+        # 일반 파일 리다이렉트(< events.jsonl)는 파이프로 등록할 수 없으므로 스레드에서 한 줄씩 읽음
+        # (이벤트 루프를 막지 않아야 워커가 입력과 함께 큐를 비움)
+        while line := await loop.run_in_executor(None, sys.stdin.readline):
+            await service.submit(line)
+        return
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        await service.submit(line.decode("utf-8"))
+
+
+def tail_source(path, from_start=False, poll_interval=0.2):
+    """파일 끝에 추가되는 줄을 계속 읽음 (truncate/로테이션 시 처음부터 다시 읽음)"""
+    async def source(service):
+        while not os.path.exists(path):
+            await asyncio.sleep(poll_interval)
+        f = open(path, "r", encoding="utf-8")
+        try:
+            if not from_start:
+                f.seek(0, os.SEEK_END)
+            inode = os.fstat(f.fileno()).st_ino
+            partial = ""
+            while True:
+                line = f.readline()
+                if line:
+                    # 기록 중인 줄은 개행이 올 때까지 모아둠
+                    partial += line
+                    if partial.endswith("\n"):
+                        await service.submit(partial)
+                        partial = ""
+                    continue
+                await asyncio.sleep(poll_interval)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_ino != inode or stat.st_size < f.tell():
+                    f.close()
+                    f = open(path, "r", encoding="utf-8")
+                    inode = os.fstat(f.fileno()).st_ino
+                    partial = ""
+        finally:
+            f.close()
+    return source
+
+
+def http_source(host, port):
+    """
+    POST /events 로 JSONL 본문을 받는 최소 HTTP 엔드포인트
+    - block 정책에서는 큐에 들어갈 때까지 응답을 미뤄 클라이언트에 backpressure 전달
+    - GET /metrics: Prometheus 지표, GET /healthz: 서비스 상태
+    """
+    async def handle(reader, writer, service):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                header = await reader.readline()
+                if header in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = header.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            method, path, *_ = request_line.decode("latin-1").split()
+
+            if method == "POST" and path == "/events":
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                accepted = rejected = 0
+                for line in body.decode("utf-8").splitlines():
+                    if not line.strip():
+                        continue
+                    if await service.submit(line):
+                        accepted += 1
+                    else:
+                        rejected += 1
+                status = "202 Accepted" if not rejected else "503 Service Unavailable"
+                content, content_type = json.dumps({"accepted": accepted, "dropped": rejected}), "application/json"
+            elif method == "GET" and path == "/metrics":
+                status, content, content_type = "200 OK", graph_metrics.render(), "text/plain; version=0.0.4"
+            elif method == "GET" and path == "/healthz":
+                status, content, content_type = "200 OK", json.dumps(service.stats()), "application/json"
+            else:
+                status, content, content_type = "404 Not Found", "", "text/plain"
+
+            data = content.encode("utf-8")
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+            await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.debug(f"Bad HTTP request: {e}")
+        finally:
+            writer.close()
+
+    async def source(service):
+        server = await asyncio.start_server(lambda r, w: handle(r, w, service), host, port)
+        logger.info(f"Listening on http://{host}:{port}/events")
+        async with server:
+            await server.serve_forever()
+    return source
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MITRE ATT&CK TTP Reasoner - streaming service mode")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--tail", metavar="PATH", help="JSONL 파일 끝에 추가되는 이벤트를 계속 읽음")
+    source.add_argument("--http", metavar="HOST:PORT", help="POST /events 로 이벤트 수신")
+    parser.add_argument("--from-start", action="store_true", help="--tail 시 파일 처음부터 읽음")
+    parser.add_argument("--output", default="-", help="결과 JSONL 경로 (기본: 표준 출력)")
+    parser.add_argument("--queue-size", type=int, default=1000, help="대기 큐 최대 길이")
+    parser.add_argument("--overflow", choices=["block", "drop", "spill"], default="block",
+                        help="큐가 가득 찼을 때 정책")
+    parser.add_argument("--spill-path", default="data/spill.jsonl", help="spill 정책에서 사용할 파일")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="종료 시 남은 이벤트 처리 대기 시간(초)")
+    add_analyzer_args(parser)
+    parser.set_defaults(concurrency=8)
+    return parser.parse_args()
+
+
+async def main(args):
+    analyzer = build_analyzer(args)
+    if args.warmup:
+        await asyncio.to_thread(analyzer.warmup)
+
+    if args.tail:
+        source = tail_source(args.tail, from_start=args.from_start)
+    elif args.http:
+        host, _, port = args.http.rpartition(":")
+        source = http_source(host or "127.0.0.1", int(port))
+    else:
+        source = stdin_source
+
+    output = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    service = IngestService(analyzer.workflow, output, concurrency=args.concurrency, queue_size=args.queue_size,
+                            overflow=args.overflow, spill_path=args.spill_path, timeout=args.timeout)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, service.stop)
+
+    try:
+        await service.run(source, drain_timeout=args.drain_timeout)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        report(analyzer, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
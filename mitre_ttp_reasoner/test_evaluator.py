@@ -1,50 +1,251 @@
 import json
+import math
+import time
+import asyncio
 import logging
 import datetime
+from collections import Counter
 from tqdm.asyncio import tqdm
+from core.state import AnalysisResult
+from llm_common.metrics import graph_metrics
+from core.eval_checkpoint import case_key
 
 logger = logging.getLogger("TTPAnalyzer.Evaluator")
 
 
-async def evaluate_accuracy(analyzer_app, test_set):
-    stats = {"total": len(test_set), "correct_id": 0, "correct_tactic": 0}
-    # 파일 저장용
-    full_results = []
+def percentile(values, q):
+    """정렬된 지연 시간 목록에서 nearest-rank 방식으로 백분위 값을 계산"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
 
-    logger.info(f"Engine Started: Processing {len(test_set)} samples")
-    pbar = tqdm(test_set, desc="Analyzing TTP")
 
-    async for case in pbar:
-        # 모델에 전달할 통합 페이로드 구성 (Context + Payload)
-        combined_payload = f"[Context]\n{case.get('context', 'N/A')}\n\n[Payload]\n{case['payload']}"
-        final_state = await analyzer_app.ainvoke({"payload": combined_payload})
-        res = final_state['analysis']
+def build_payload(case):
+    # 모델에 전달할 통합 페이로드 구성 (Context + Payload)
+    return f"[Context]\n{case.get('context', 'N/A')}\n\n[Payload]\n{case['payload']}"
 
-        # 결과 데이터 수집 (JSON 저장용)
-        full_results.append({
-            "payload": case['payload'],
-            "predicted": res.model_dump(),
-            "label": case['label']
-        })
 
-        # 터미널에는 핵심 로그만 간결하게 출력
-        status = "MATCH" if res.tid == case['label']['tid'] else "MISMATCH"
-        pbar.write(f"[{status}] ID: {res.tid} | Conf: {res.confidence:.2f}")
+class EvalStats:
+    """
+    케이스가 끝날 때마다 갱신하는 정확도/재시도/판정 경로 집계와 TID 혼동 행렬
+    - 체크포인트에서 복원한 레코드도 같은 add() 로 누적하므로 재실행 후에도 전체 집계가 유지됨
+    """
 
-        if res.tid == case['label']['tid']:
-            stats["correct_id"] += 1
+    def __init__(self):
+        self.total = 0
+        self.correct_id = 0
+        self.correct_tactic = 0
+        self.retries = 0
+        self.parse_failures = 0
+        # 타임아웃/예외로 끝나지 못한 케이스 수
+        self.errors = 0
+        self.latencies = []
+        # 판정 경로(시그니처/템플릿 캐시/직접 검색/쿼리 재작성)별 정확도 (2단계 검색 임계값 조정용)
+        self.tiers = {}
+        # 정답 TID → 예측 TID 별 건수
+        self.confusion = {}
 
-        if res.tactic == case['label']['tactic']:
-            stats["correct_tactic"] += 1
+    def add(self, record):
+        label, predicted = record['label'], record['predicted']
+        if label.get('is_malicious') is False:
+            # 정상 트래픽 라벨은 TID 대신 악성 아님 판정 여부로 채점 (타임아웃/오류 결과는 제외)
+            matched = not predicted['is_malicious'] and predicted['tactic'] != "Error"
+        else:
+            matched = predicted['tid'] == label['tid']
+        self.total += 1
+        self.correct_id += int(matched)
+        self.correct_tactic += int(predicted['tactic'] == label['tactic'])
+        # 재시도/파싱 실패 집계 (retrieve 에서 1, verify 재시도마다 1 씩 증가)
+        self.retries += record['retries']
+        self.parse_failures += record['parse_failures']
+        self.errors += int(bool(record.get('error')))
+        self.latencies.append(record['latency_sec'])
 
-    # 별도 JSON 파일로 결과 저장
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_filename = f"report_{timestamp}.json"
-    with open(report_filename, "w", encoding="utf-8") as f:
-        json.dump(full_results, f, indent=2, ensure_ascii=False)
+        tier_stats = self.tiers.setdefault(record['retrieval_tier'], {"cases": 0, "correct_id": 0})
+        tier_stats["cases"] += 1
+        tier_stats["correct_id"] += int(matched)
+        self.confusion.setdefault(label['tid'], Counter())[predicted['tid']] += 1
+        return matched
 
-    accuracy = stats['correct_id'] / stats['total'] if stats['total'] > 0 else 0
-    tactic_accuracy = stats['correct_tactic'] / stats['total'] if stats['total'] > 0 else 0
+    def top_confusions(self, n=10):
+        """가장 많이 틀린 (정답, 예측) 쌍"""
+        pairs = ((count, label, pred) for label, row in self.confusion.items()
+                 for pred, count in row.items() if pred != label)
+        return sorted(pairs, reverse=True)[:n]
 
-    logger.info(f"Report saved to {report_filename}")
-    logger.info(f"Final Accuracy - TID: {accuracy:.2%}, Tactic: {tactic_accuracy:.2%}")
+    def summary(self):
+        return {
+            "total": self.total,
+            "accuracy": self.correct_id / self.total if self.total else 0,
+            "tactic_accuracy": self.correct_tactic / self.total if self.total else 0,
+            "latency_p50": percentile(self.latencies, 50),
+            "latency_p95": percentile(self.latencies, 95),
+            "retries": self.retries,
+            "parse_failures": self.parse_failures,
+            "errors": self.errors,
+            "tiers": self.tiers,
+            "confusion": {label: dict(row) for label, row in self.confusion.items()}
+        }
+
+
+def error_result(technique_name, reasoning):
+    """타임아웃/예외로 분석이 끝나지 못한 케이스의 결과 (tactic "Error" 로 정답 처리되지 않음)"""
+    return AnalysisResult(
+        is_malicious=False, tid="N/A", technique_name=technique_name,
+        tactic="Error", sub_tactic="N/A", confidence=0.0, reasoning=reasoning
+    )
+
+
+async def run_case(analyzer_app, case, semaphore, timeout=None):
+    """
+    세마포어로 동시 요청 수를 제한하며 단일 케이스를 실행하고 (결과, 지연 시간, 최종 상태, 오류)를 반환
+    - 오류: 타임아웃이면 "timeout", 예외면 예외 이름, 정상 종료면 None
+    """
+    async with semaphore:
+        started = time.perf_counter()
+        final_state = {}
+        error = None
+        try:
+            # 케이스 단위 루트 span 아래에 노드 span 이 묶임 (span 기록이 꺼져 있으면 비용 없음)
+            with graph_metrics.trace("ttp_analysis", case_id=case.get('id', 'N/A')):
+                final_state = await asyncio.wait_for(
+                    analyzer_app.ainvoke({"payload": build_payload(case)}),
+                    timeout=timeout
+                )
+            res = final_state['analysis']
+        except asyncio.TimeoutError:
+            # 멈춘 요청 하나가 전체 배치를 붙잡지 않도록 타임아웃 결과로 대체
+            logger.error(f"Case timed out after {timeout}s: {case.get('id', 'N/A')}")
+            error = "timeout"
+            res = error_result("Timeout", f"Analysis exceeded {timeout}s timeout")
+        except Exception as e:
+            # LLM HTTP 오류/파싱/검증 예외도 케이스 하나의 오류로 기록하고 평가는 계속 진행
+            logger.error(f"Case failed: {case.get('id', 'N/A')} ({type(e).__name__}: {str(e)[:50]}...)")
+            error = type(e).__name__
+            res = error_result("Error", f"{type(e).__name__}: {str(e)[:200]}")
+        return res, time.perf_counter() - started, final_state, error
+
+
+def build_record(case_id, case, res, elapsed, final_state, error=None):
+    """리포트 한 줄 (체크포인트에는 집계에 필요한 필드만 저장)"""
+    tier = final_state.get('retrieval_tier') or (
+        "signature" if final_state.get('signature_hit') else "cache" if final_state.get('cache_hit') else "none"
+    )
+    return {
+        "id": case_id,
+        "payload": case['payload'],
+        "predicted": res.model_dump(),
+        "label": case['label'],
+        "latency_sec": round(elapsed, 4),
+        "retrieval_tier": tier,
+        "direct_score": final_state.get('direct_score'),
+        "direct_margin": final_state.get('direct_margin'),
+        "retries": max(0, final_state.get('iteration', 1) - 1),
+        "parse_failures": final_state.get('parse_failures', 0),
+        "error": error
+    }
+
+
+def checkpoint_record(record):
+    return {
+        "predicted": {k: record['predicted'][k] for k in ("tid", "tactic", "is_malicious")},
+        "label": {k: record['label'][k] for k in ("tid", "tactic", "is_malicious") if k in record['label']},
+        **{k: record[k] for k in ("latency_sec", "retrieval_tier", "retries", "parse_failures", "error")}
+    }
+
+
+async def evaluate_accuracy(analyzer_app, test_set, concurrency=1, timeout=None, checkpoint=None, report_path=None):
+    """
+    테스트셋을 평가합니다.
+
+    test_set: 케이스 목록 또는 이터레이터 (한 번에 concurrency 개만 꺼내므로 스트리밍 입력 가능)
+    concurrency: 동시에 처리할 최대 케이스 수 (vLLM --max-num-seqs 에 맞추면 배치 슬롯을 채울 수 있음)
+    timeout: 케이스별 타임아웃(초), None 이면 무제한
+    checkpoint: EvalCheckpoint - 같은 설정으로 이미 끝난 케이스는 건너뛰고 저장된 결과로 집계를 복원
+    report_path: 결과를 완료 순서대로 한 줄씩 추가하는 JSONL 파일
+                 (기본: 체크포인트가 있으면 report_<설정 해시>.jsonl 에 이어 쓰기, 없으면 report_<timestamp>.jsonl)
+    """
+    stats = EvalStats()
+    done = set()
+    if checkpoint is not None:
+        for case_id, record in checkpoint.completed():
+            done.add(case_id)
+            stats.add(record)
+        if done:
+            logger.info(f"Resuming from checkpoint {checkpoint.config_hash}: {len(done)} cases already done")
+
+    if report_path is None:
+        suffix = checkpoint.config_hash if checkpoint is not None else datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_path = f"report_{suffix}.jsonl"
+
+    total = len(test_set) if hasattr(test_set, "__len__") else None
+    logger.info(f"Engine Started: Processing {total if total is not None else 'streamed'} samples "
+                f"(concurrency={concurrency})")
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    pbar = tqdm(total=total, desc="Analyzing TTP")
+    cases = iter(test_set)
+    skipped = 0
+    executed = 0
+
+    # 케이스 전체를 태스크로 만들지 않고 concurrency 개의 워커가 입력을 순서대로 꺼내 처리
+    async def worker(report):
+        nonlocal skipped, executed
+        for case in cases:
+            case_id = case_key(case)
+            if case_id in done:
+                skipped += 1
+                pbar.update(1)
+                continue
+            done.add(case_id)
+
+            res, elapsed, final_state, error = await run_case(analyzer_app, case, semaphore, timeout)
+            record = build_record(case_id, case, res, elapsed, final_state, error)
+            matched = stats.add(record)
+            executed += 1
+
+            # 리포트를 먼저 쓰고 체크포인트를 기록 (그 사이에 중단되면 재실행 시 해당 케이스만 한 줄 중복)
+            report.write(json.dumps(record, ensure_ascii=False) + "\n")
+            report.flush()
+            if checkpoint is not None:
+                checkpoint.record(case_id, checkpoint_record(record))
+
+            # 터미널에는 핵심 로그만 간결하게 출력
+            status = "ERROR" if error else "MATCH" if matched else "MISMATCH"
+            pbar.write(f"[{status}] ID: {res.tid} | Conf: {res.confidence:.2f} | {elapsed:.2f}s")
+            pbar.update(1)
+
+    wall_started = time.perf_counter()
+    try:
+        with open(report_path, "a", encoding="utf-8") as report:
+            await asyncio.gather(*(worker(report) for _ in range(max(1, concurrency))))
+    finally:
+        pbar.close()
+    wall_elapsed = time.perf_counter() - wall_started
+
+    summary = stats.summary()
+    summary["throughput"] = executed / wall_elapsed if wall_elapsed > 0 else 0
+    summary["executed"] = executed
+    summary["skipped"] = skipped
+    summary["report"] = report_path
+
+    # 집계/혼동 행렬은 JSONL 옆에 별도 요약 파일로 저장
+    summary_path = report_path.rsplit(".", 1)[0] + "_summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    logger.info(f"Report saved to {report_path} (summary: {summary_path})")
+    logger.info(f"Final Accuracy - TID: {summary['accuracy']:.2%}, Tactic: {summary['tactic_accuracy']:.2%} "
+                f"({stats.total} cases, {skipped} skipped from checkpoint)")
+    logger.info(f"Throughput: {summary['throughput']:.2f} cases/sec | "
+                f"Latency p50: {summary['latency_p50']:.2f}s, p95: {summary['latency_p95']:.2f}s")
+    logger.info(f"Retries: {stats.retries} | Parse failures: {stats.parse_failures} | "
+                f"Errors: {stats.errors}")
+    for tier, tier_stats in sorted(stats.tiers.items()):
+        logger.info(f"Tier {tier}: {tier_stats['cases']} cases, "
+                    f"TID accuracy {tier_stats['correct_id'] / tier_stats['cases']:.2%}")
+    for count, label, pred in stats.top_confusions(5):
+        logger.info(f"Confusion: {label} -> {pred} ({count})")
+
+    return summary
@@ -0,0 +1,41 @@
+"""
+후보 컨텍스트 패커 예산 테스트 (토크나이저 없이 글자 수 근사치로 계산)
+
+    cd mitre_ttp_reasoner
+    python -m pytest tests/test_context_packer.py
+"""
+import pytest
+from core.context_packer import ContextPacker
+
+
+@pytest.fixture
+def packer():
+    packer = ContextPacker("unused", max_model_len=2048, max_output_tokens=512)
+    # 허브에서 토크나이저를 받지 않도록 근사치 모드로 고정
+    packer._tokenizer_loaded = True
+    return packer
+
+
+def candidate(i, head_chars=40, body_chars=400):
+    return f"T{1000 + i} {'h' * head_chars}\nDescription: {'b' * body_chars}"
+
+
+def test_bodies_are_trimmed_within_budget(packer):
+    packed, full_tokens, packed_tokens = packer.pack([candidate(i) for i in range(5)], 300)
+    assert full_tokens > 300
+    assert packed_tokens <= 300
+    assert all(f"T{1000 + i}" in packed for i in range(5))
+
+
+def test_lowest_ranked_dropped_when_heads_exceed_budget(packer):
+    candidates = [candidate(i, head_chars=400) for i in range(10)]
+    packed, _, packed_tokens = packer.pack(candidates, 300)
+    assert packed_tokens <= 300
+    assert "T1000" in packed and "T1009" not in packed
+    assert packer.stats()["candidates_dropped"] > 0
+
+
+def test_output_limit_fits_remaining_context(packer):
+    assert packer.output_limit(100) == 512
+    assert packer.output_limit(1900) == 148
+    assert packer.output_limit(4000) == 1
@@ -0,0 +1,51 @@
+"""
+템플릿 지문 회귀 테스트
+
+    cd mitre_ttp_reasoner
+    python -m pytest tests/test_fingerprint.py
+"""
+import pytest
+from urllib.parse import quote
+from core.fingerprint import fingerprint, to_template
+
+
+def percent_encode(text):
+    return "".join(f"%{b:02x}" for b in text.encode("utf-8"))
+
+
+# 캐시된 정상 판정이 공격 페이로드에 재사용되면 미탐이 되므로 반드시 다른 지문이어야 하는 쌍
+BENIGN_ATTACK_PAIRS = [
+    ("GET /search?q='hello world'", "GET /search?q=' UNION SELECT password FROM users --'"),
+    (f"GET /search?q={percent_encode('hello')}", f"GET /search?q={percent_encode('<script>')}"),
+    ('{"name":"alice"}', '{"name":"<script>alert(1)</script>"}'),
+    ("GET /static/logo.png", "GET /static/shell.php"),
+    ("GET /download.php?file=report.pdf", "GET /download.php?file=../../../../etc/passwd"),
+    ("GET /api/v1/items?id=42", "GET /api/v1/items?id=42' OR '1'='1"),
+]
+
+# 리터럴만 다른 페이로드는 같은 템플릿으로 묶여야 캐시가 의미가 있음
+SAME_TEMPLATE_PAIRS = [
+    ("GET /api/v1/items?id=1 UNION SELECT NULL--", "GET /api/v1/items?id=42 UNION SELECT NULL--"),
+    ("GET /search?q=alpha&page=2", "GET /search?q=invoice&page=17"),
+    ('{"name":"alice","limit":5}', '{"name":"bob","limit":20}'),
+    ("GET /static/logo.png", "GET /static/banner.png"),
+    ("x=0x41414141", "x=0xdeadbeef"),
+    # 인코딩/대소문자만 다른 같은 공격 구문
+    ("id=1' union select user()--", "id=1%27%20UNION%20SELECT%20user()--"),
+    ("id=1' union select user()--", quote(quote("id=1' union select user()--", safe="="), safe="=")),
+    ("id=1' union select user()--", "id=1%u0027 union select user()--"),
+]
+
+
+@pytest.mark.parametrize("benign, attack", BENIGN_ATTACK_PAIRS)
+def test_benign_and_attack_payloads_differ(benign, attack):
+    assert fingerprint(benign) != fingerprint(attack), (to_template(benign), to_template(attack))
+
+
+@pytest.mark.parametrize("first, second", SAME_TEMPLATE_PAIRS)
+def test_literal_variants_share_template(first, second):
+    assert fingerprint(first) == fingerprint(second), (to_template(first), to_template(second))
+
+
+def test_extension_is_kept():
+    assert to_template("GET /uploads/avatar.php") == "get /uploads/<FILE>.php"
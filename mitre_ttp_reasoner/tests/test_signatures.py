@@ -0,0 +1,51 @@
+"""
+시그니처 fast path 회귀 테스트 (LLM 을 건너뛰므로 정상 트래픽이 매칭되면 안 됨)
+
+    cd mitre_ttp_reasoner
+    python -m pytest tests/test_signatures.py
+"""
+import os
+import pytest
+from core.signatures import SignatureMatcher
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), "..", "prompts", "signatures.yaml")
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return SignatureMatcher(SignatureMatcher.load_rules(RULES_PATH))
+
+
+POSITIVE = [
+    ("id=1' UNION SELECT NULL, username, password FROM administrators--", "T1190"),
+    ("id=1' UNION SELECT user(), database()-- HTTP/1.1", "T1190"),
+    ("id=1 AND SLEEP(5)--", "T1190"),
+    ("q=test' OR '1'='1'--", "T1190"),
+    ("<?php system($_REQUEST['cmd']); ?>", "T1505.003"),
+    ("file=../../../../../../etc/shadow", "T1083"),
+    ("path=..%2f..%2f..%2fetc%2fpasswd", "T1083"),
+    ("file=..\\..\\..\\windows\\win.ini", "T1083"),
+]
+
+NEGATIVE = [
+    # multipart 경계 문자열의 "--" 와 본문의 sleep(
+    "POST /upload HTTP/1.1\nContent-Type: multipart/form-data; boundary=----x\n\n------x\n"
+    "Content-Disposition: form-data; name=\"script\"\n\nawait sleep(1);\n------x--",
+    # 경로 정규화용 ../ 한 번과 민감 파일처럼 보이는 이름
+    "GET /docs/../images/a.png?file=/etc/passwd.txt",
+    # 주석 구분선과 -- 옵션
+    "GET /help?topic=cli--verbose&sep=----------",
+    "q=how to use ../ in relative imports&page=2",
+    "GET /static/../../assets/app.js",
+]
+
+
+@pytest.mark.parametrize("payload, tid", POSITIVE)
+def test_textbook_payloads_match(matcher, payload, tid):
+    res = matcher.match(payload)
+    assert res is not None and res.tid == tid
+
+
+@pytest.mark.parametrize("payload", NEGATIVE)
+def test_benign_payloads_do_not_match(matcher, payload):
+    assert matcher.match(payload) is None
@@ -1,13 +1,22 @@
 from langgraph.graph import StateGraph, START, END
-from state import GraphState
+from langgraph.types import Send
+from state import GraphState, TopicState, TopicOutput
+from llm_common.metrics import graph_metrics
 from nodes import (
     load_document,
     extract_toc,
     generate_draft,
     generate_demo_ideas,
-    aggregate_post
+    aggregate_post,
+    agenerate_draft,
+    agenerate_demo_ideas,
+    emit_post,
+    collect_posts
 )
 
+# Default number of topic pipelines allowed to run at once in the parallel graph
+DEFAULT_MAX_CONCURRENCY = 4
+
 
 def should_continue(state: GraphState):
     """
@@ -22,18 +31,93 @@ def should_continue(state: GraphState):
         return "end"
 
 
-def get_graph():
+def fan_out_topics(state: GraphState):
+    """
+    Conditional edge for the parallel graph: one Send per TOC item, each running its own
+    draft -> demo ideas pipeline on a private TopicState.
+    """
+    sends = [
+        Send("generate_post", {
+            "document_content": state["document_content"],
+            "section_index": state.get("section_index", []),
+            "section_vectors": state.get("section_vectors"),
+            "series_toc": state["series_toc"],
+            "current_index": index,
+            "post_results": []
+        })
+        for index in range(len(state["series_toc"]))
+    ]
+    return sends or "collect_posts"
+
+
+def get_topic_graph():
+    """
+    Constructs the per-topic pipeline (draft -> demo ideas -> emit) used as the map step.
+    """
+    workflow = StateGraph(TopicState, output_schema=TopicOutput)
+
+    nodes = {
+        "generate_draft": agenerate_draft,
+        "generate_demo_ideas": agenerate_demo_ideas,
+        "emit_post": emit_post,
+    }
+    for name, fn in nodes.items():
+        workflow.add_node(name, graph_metrics.wrap("techpost_rfc", name, fn, iteration_key="current_index"))
+
+    workflow.add_edge(START, "generate_draft")
+    workflow.add_edge("generate_draft", "generate_demo_ideas")
+    workflow.add_edge("generate_demo_ideas", "emit_post")
+    workflow.add_edge("emit_post", END)
+
+    return workflow.compile()
+
+
+def get_parallel_graph(max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Constructs the map-reduce variant: topics are fanned out with Send and run concurrently
+    (at most max_concurrency at a time), then collect_posts restores TOC order.
+    Must be run with ainvoke/astream since the topic nodes are async.
+    """
+    workflow = StateGraph(GraphState)
+
+    nodes = {
+        "load_document": load_document,
+        "extract_toc": extract_toc,
+        "collect_posts": collect_posts,
+    }
+    for name, fn in nodes.items():
+        workflow.add_node(name, graph_metrics.wrap("techpost_rfc", name, fn, iteration_key="current_index"))
+    workflow.add_node("generate_post", get_topic_graph())
+
+    workflow.add_edge(START, "load_document")
+    workflow.add_edge("load_document", "extract_toc")
+    workflow.add_conditional_edges("extract_toc", fan_out_topics, ["generate_post", "collect_posts"])
+    workflow.add_edge("generate_post", "collect_posts")
+    workflow.add_edge("collect_posts", END)
+
+    return workflow.compile().with_config(max_concurrency=max_concurrency)
+
+
+def get_graph(parallel=False, max_concurrency=DEFAULT_MAX_CONCURRENCY):
     """
     Constructs and compiles the LangGraph.
+    With parallel=True, returns the map-reduce graph from get_parallel_graph instead.
     """
+    if parallel:
+        return get_parallel_graph(max_concurrency)
+
     workflow = StateGraph(GraphState)
 
-    # Add Nodes
-    workflow.add_node("load_document", load_document)
-    workflow.add_node("extract_toc", extract_toc)
-    workflow.add_node("generate_draft", generate_draft)
-    workflow.add_node("generate_demo_ideas", generate_demo_ideas)
-    workflow.add_node("aggregate_post", aggregate_post)
+    # Add Nodes (instrumented: wall time, tokens and the current_index loop counter per node)
+    nodes = {
+        "load_document": load_document,
+        "extract_toc": extract_toc,
+        "generate_draft": generate_draft,
+        "generate_demo_ideas": generate_demo_ideas,
+        "aggregate_post": aggregate_post,
+    }
+    for name, fn in nodes.items():
+        workflow.add_node(name, graph_metrics.wrap("techpost_rfc", name, fn, iteration_key="current_index"))
 
     # Add Edges
     workflow.add_edge(START, "load_document")
@@ -1,26 +1,78 @@
 import os
+from functools import lru_cache
+
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain_core.language_models.chat_models import BaseChatModel
 
+from llm_common.client import get_chat_model, get_http_clients
+
 load_dotenv()
 
-def get_llm(model_type: str, model_name: str) -> BaseChatModel:
+# OpenAI-compatible endpoints per provider (override with LLM_BASE_URL)
+PROVIDER_BASE_URLS = {
+    "vllm": "http://localhost:8000/v1",
+    "ollama": "http://localhost:11434/v1",
+    "openai": "https://api.openai.com/v1",
+}
+DEFAULT_MODEL_TYPE = os.getenv("LLM_MODEL_TYPE", "vllm")
+DEFAULT_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "Qwen/Qwen2.5-14B-Instruct-AWQ")
+# Optional embedding model served on an OpenAI-compatible endpoint (section lookup fallback)
+DEFAULT_EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL_NAME")
+
+
+def _api_key(model_type: str) -> str:
+    return os.getenv("OPENAI_API_KEY", "dummy") if model_type == "openai" else "dummy"
+
+
+def get_llm(model_type: str = DEFAULT_MODEL_TYPE, model_name: str = DEFAULT_MODEL_NAME) -> BaseChatModel:
     """
-    Factory function to get the LLM instance.
+    Factory function to get the (shared) LLM instance.
+
+    Resolves the provider endpoint and hands off to llm_common.client.get_chat_model, which
+    caches instances and routes them through pooled keep-alive HTTP clients, the process-wide
+    adaptive concurrency limiter (LLM_MAX_CONCURRENCY) and the per-node token metrics.
 
     Args:
-        model_type: "openai" or "ollama" (can be extended).
-        model_name: The specific model name (e.g., "gpt-4o", "gpt-3.5-turbo").
+        model_type: "vllm", "ollama" or "openai" (all served through the OpenAI-compatible API).
+        model_name: The model name as served by that endpoint.
 
     Returns:
         A BaseChatModel instance.
     """
-    return ChatOpenAI(
-        model="Qwen/Qwen2.5-14B-Instruct-AWQ",
-        base_url="http://localhost:8000/v1",
-        api_key="dummy",
-        temperature=0,
-        # 서버 응답 대기 시간 설정
-        timeout=120
+    if model_type not in PROVIDER_BASE_URLS:
+        raise ValueError(f"Unsupported model_type: {model_type}")
+    base_url = os.getenv("LLM_BASE_URL", PROVIDER_BASE_URLS[model_type])
+    # 서버 응답 대기 시간 설정
+    return get_chat_model(model_name, base_url=base_url, timeout=120, api_key=_api_key(model_type))
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(model_name: str = DEFAULT_EMBEDDING_MODEL):
+    """
+    Factory function to get the (shared) embeddings client used to locate document sections.
+
+    Uses EMBEDDING_BASE_URL (or LLM_BASE_URL / the default provider URL) and the same pooled
+    HTTP clients as the chat model.
+
+    Args:
+        model_name: The embedding model name as served by that endpoint (EMBEDDING_MODEL_NAME).
+
+    Returns:
+        An OpenAIEmbeddings instance, or None when no embedding model is configured.
+    """
+    if not model_name:
+        return None
+    from langchain_openai import OpenAIEmbeddings
+
+    base_url = os.getenv("EMBEDDING_BASE_URL", os.getenv("LLM_BASE_URL", PROVIDER_BASE_URLS[DEFAULT_MODEL_TYPE]))
+    http_client, http_async_client = get_http_clients(base_url, 60)
+    return OpenAIEmbeddings(
+        model=model_name,
+        base_url=base_url,
+        api_key=_api_key(DEFAULT_MODEL_TYPE),
+        # Self-hosted servers take raw text; tiktoken pre-tokenization only applies to OpenAI models
+        check_embedding_ctx_length=False,
+        max_retries=0,
+        http_client=http_client,
+        http_async_client=http_async_client,
     )
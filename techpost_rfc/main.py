@@ -1,9 +1,11 @@
 import os
 import sys
+import asyncio
 import argparse
 import logging
-from graph import get_graph
+from graph import get_graph, DEFAULT_MAX_CONCURRENCY
 from state import GraphState
+from llm_common.metrics import graph_metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -12,6 +14,12 @@ logger = logging.getLogger("techpost_rfc")
 def main():
     parser = argparse.ArgumentParser(description="techpost_rfc: Convert technical docs to blog posts.")
     parser.add_argument("file_path", nargs="?", help="Path to the technical document.")
+    parser.add_argument("--metrics-file", help="Write per-node histograms in Prometheus text format to this file.")
+    parser.add_argument("--trace-file", help="Write OpenTelemetry-style node spans as JSON Lines to this file.")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Generate all topics concurrently (map-reduce) instead of one after another.")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="Maximum number of topics generated at once with --parallel.")
     args = parser.parse_args()
     
     file_path = args.file_path
@@ -23,10 +31,13 @@ def main():
         logger.error(f"Error: File not found at {file_path}")
         sys.exit(1)
         
+    if args.trace_file:
+        graph_metrics.enable_spans(args.trace_file)
+
     logger.info(f"Processing document: {file_path}")
     logger.info("Initializing workflow...")
     
-    app = get_graph()
+    app = get_graph(parallel=args.parallel, max_concurrency=args.max_concurrency)
     
     initial_state = {
         "document_metadata": {"file_path": file_path},
@@ -41,7 +52,18 @@ def main():
     final_state = None
     logger.info("Starting workflow execution...")
     
-    final_state = app.invoke(initial_state)
+    with graph_metrics.trace("techpost_rfc", file_path=file_path):
+        if args.parallel:
+            # Topic nodes are async in the parallel graph
+            final_state = asyncio.run(app.ainvoke(initial_state))
+        else:
+            final_state = app.invoke(initial_state)
+
+    if args.metrics_file:
+        graph_metrics.write(args.metrics_file)
+        logger.info(f"Metrics saved to {args.metrics_file}")
+    if graph_metrics.spans is not None:
+        graph_metrics.spans.flush()
     
     generated_posts = final_state.get("generated_posts", [])
     logger.info(f"Successfully generated {len(generated_posts)} posts.")
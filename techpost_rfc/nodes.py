@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 from langchain_community.document_loaders import UnstructuredMarkdownLoader, PyPDFLoader, TextLoader
 from langchain_core.messages import SystemMessage, HumanMessage
@@ -8,8 +9,9 @@ from datetime import datetime
 from typing import List
 from pydantic import BaseModel
 
-from state import GraphState, TOCItem, GeneratedPost
-from llm import get_llm
+from state import GraphState, TopicState, TopicOutput, TOCItem, GeneratedPost
+from llm import get_llm, get_embeddings
+from sections import build_section_index, embed_sections, select_context
 
 logger = logging.getLogger(__name__)
 
@@ -45,10 +47,44 @@ def load_document(state: GraphState) -> GraphState:
 
     docs = loader.load()
     content = "\n\n".join([d.page_content for d in docs])
-    
-    logger.info(f"Document loaded successfully. Length: {len(content)} chars.")
-    
-    return {"document_content": content}
+
+    # Page boundaries (and the PDF outline, if any) let the section index map bookmarks to text offsets
+    page_offsets, outline = None, None
+    if ext == ".pdf":
+        page_offsets, offset = [], 0
+        for d in docs:
+            page_offsets.append(offset)
+            offset += len(d.page_content) + 2
+        outline = _pdf_outline(file_path)
+    section_index = build_section_index(content, page_offsets=page_offsets, outline=outline)
+    # Embedded once here (if an embedding model is configured) and carried in state to every topic
+    section_vectors = embed_sections(content, section_index, get_embeddings())
+    
+    logger.info(f"Document loaded successfully. Length: {len(content)} chars, {len(section_index)} sections.")
+    
+    return {"document_content": content, "section_index": section_index, "section_vectors": section_vectors}
+
+
+def _pdf_outline(file_path):
+    """
+    Flattens the PDF outline (bookmarks) into (title, page_number, level) tuples.
+    Returns an empty list when the PDF has no outline or it cannot be read.
+    """
+    try:
+        from pypdf import PdfReader
+        reader = PdfReader(file_path)
+
+        def walk(items, level):
+            for item in items:
+                if isinstance(item, list):
+                    yield from walk(item, level + 1)
+                else:
+                    yield item.title, reader.get_destination_page_number(item), level
+
+        return list(walk(reader.outline, 1))
+    except Exception as e:
+        logger.warning(f"PDF outline unavailable: {str(e)[:50]}...")
+        return []
 
 
 # --- Node: extract_toc ---
@@ -67,8 +103,8 @@ def extract_toc(state: GraphState) -> GraphState:
     """
     logger.info("Extracting Table of Contents (TOC)...")
     
-    # Use ollama by default as requested by user context
-    llm = get_llm(model_type="ollama", model_name="qwen2.5-coder-14b-instruct") 
+    # Shared client configured via LLM_MODEL_TYPE / LLM_MODEL_NAME (defaults to the local vLLM server)
+    llm = get_llm()
     
     parser = JsonOutputParser(pydantic_object=TOCContainer)
     
@@ -108,23 +144,26 @@ def extract_toc(state: GraphState) -> GraphState:
 
 
 # --- Node: generate_draft ---
-def generate_draft(state: GraphState) -> GraphState:
+def _draft_request(state: GraphState):
     """
-    Generates a blog post draft for the current topic.
+    Builds the draft chain and its inputs for the current topic (shared by the sync and async nodes).
     """
     current_index = state["current_index"]
     toc_item = state["series_toc"][current_index]
     
-    # We might want to retrieve relevant chunks here if the document is huge, 
-    # but for MVP we putting the whole content in context (up to limit).
-    # Ideally, we should use RAG or just the relevant sections if we had parsed them.
-    # For now, let's just pass the whole document content (truncated if needed).
+    # Only the sections referenced by the TOC item go into the prompt (within the token budget),
+    # instead of re-sending the head of the document for every topic.
+    document_content, context_info = select_context(
+        state["document_content"], state.get("section_index") or [], toc_item, embeddings=get_embeddings(),
+        section_vectors=state.get("section_vectors")
+    )
+    logger.info(f"Draft context: {context_info['tokens']} tokens from {len(context_info['sections'])} sections "
+                f"({', '.join(context_info['sections'][:5])})")
     
-    llm = get_llm(model_type="ollama", model_name="qwen2.5-coder-14b-instruct")
+    llm = get_llm()
     
     logger.info(f"Generating draft for topic: {toc_item['topic']}")
 
-    # Rest of the function...
     template = """당신은 전문 기술 블로거입니다. 
     다음 문서를 바탕으로, 아래 주제에 대한 블로그 포스트 초안을 작성해 주세요.
     
@@ -144,37 +183,46 @@ def generate_draft(state: GraphState) -> GraphState:
     prompt = ChatPromptTemplate.from_template(template)
     chain = prompt | llm
     
-    response = chain.invoke({
+    return chain, {
         "topic": toc_item["topic"],
         "summary": toc_item["summary"],
         "relevant_sections": ", ".join(toc_item["relevant_sections"]),
-        "document_content": state["document_content"][:50000] # Simple truncation
-    })
-    
-    # We store the draft temporarily in the state or pass it to the next node?
-    # The graph definition says generate_draft -> generate_demo_ideas -> aggregate_post.
-    # So we can just return it to update the state, but we need a place to hold it temporarily.
-    # Let's add a temporary key to the state or just update 'generated_posts' partially?
-    # Better to have a 'current_draft' key in state, but GraphState definition needs to support it.
-    # AGENTS.md says "Agent C Output: 임시 변수 current_draft 반환".
-    # So we should add 'current_draft' to GraphState or just return it as a dict and let LangGraph merge it.
-    # LangGraph merges outputs into state. So if we return {"current_draft": ...}, it will be in state.
-    # But we need to declare it in GraphState if we use TypedDict.
-    # Let's assume we can add it or we should update GraphState.
+        "document_content": document_content
+    }
+
+
+def generate_draft(state: GraphState) -> GraphState:
+    """
+    Generates a blog post draft for the current topic.
+    """
+    chain, inputs = _draft_request(state)
+    response = chain.invoke(inputs)
     
+    # LangGraph merges node outputs into the state, so the draft is handed to
+    # generate_demo_ideas through the temporary 'current_draft' key declared in GraphState.
+    return {"current_draft": response.content}
+
+
+async def agenerate_draft(state: GraphState) -> GraphState:
+    """
+    Async variant of generate_draft used by the parallel (map-reduce) graph.
+    """
+    # Section selection may call the embedding endpoint synchronously, so keep it off the event loop
+    chain, inputs = await asyncio.to_thread(_draft_request, state)
+    response = await chain.ainvoke(inputs)
     return {"current_draft": response.content}
 
 
 # --- Node: generate_demo_ideas ---
-def generate_demo_ideas(state: GraphState) -> GraphState:
+def _demo_request(state: GraphState):
     """
-    Generates demo ideas based on the draft and topic.
+    Builds the demo-ideas chain and its inputs for the current topic (shared by the sync and async nodes).
     """
     current_index = state["current_index"]
     toc_item = state["series_toc"][current_index]
     current_draft = state.get("current_draft", "")
     
-    llm = get_llm(model_type="ollama", model_name="qwen2.5-coder-14b-instruct")
+    llm = get_llm()
     
     logger.info(f"Generating demo ideas for topic: {toc_item['topic']}")
     
@@ -195,14 +243,31 @@ def generate_demo_ideas(state: GraphState) -> GraphState:
     prompt = ChatPromptTemplate.from_template(template)
     chain = prompt | llm
     
-    response = chain.invoke({
+    return chain, {
         "topic": toc_item["topic"],
         "current_draft": current_draft
-    })
+    }
+
+
+def generate_demo_ideas(state: GraphState) -> GraphState:
+    """
+    Generates demo ideas based on the draft and topic.
+    """
+    chain, inputs = _demo_request(state)
+    response = chain.invoke(inputs)
     
     return {"current_demo_ideas": response.content}
 
 
+async def agenerate_demo_ideas(state: GraphState) -> GraphState:
+    """
+    Async variant of generate_demo_ideas used by the parallel (map-reduce) graph.
+    """
+    chain, inputs = _demo_request(state)
+    response = await chain.ainvoke(inputs)
+    return {"current_demo_ideas": response.content}
+
+
 # --- Node: aggregate_post ---
 def aggregate_post(state: GraphState) -> GraphState:
     """
@@ -237,3 +302,33 @@ def aggregate_post(state: GraphState) -> GraphState:
         "current_draft": None,
         "current_demo_ideas": None
     }
+
+
+# --- Parallel (map-reduce) nodes ---
+def emit_post(state: TopicState) -> TopicOutput:
+    """
+    Emits the finished post of one topic pipeline, tagged with its TOC index for the reducer.
+    """
+    current_index = state["current_index"]
+    toc_item = state["series_toc"][current_index]
+    
+    logger.info(f"Finished post {current_index + 1}/{len(state['series_toc'])}: {toc_item['topic']}")
+    
+    return {"post_results": [{
+        "index": current_index,
+        "title": toc_item["topic"],
+        "draft": state.get("current_draft", ""),
+        "demo_ideas": state.get("current_demo_ideas", "")
+    }]}
+
+
+def collect_posts(state: GraphState) -> GraphState:
+    """
+    Merges the posts produced by the parallel topic pipelines back into TOC order.
+    """
+    ordered = sorted(state.get("post_results", []), key=lambda post: post["index"])
+    generated_posts = [{k: v for k, v in post.items() if k != "index"} for post in ordered]
+    
+    logger.info(f"Collected {len(generated_posts)}/{len(state['series_toc'])} posts.")
+    
+    return {"generated_posts": generated_posts, "current_index": len(state["series_toc"])}
@@ -0,0 +1,250 @@
+import os
+import re
+import math
+import logging
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the document context of a single draft prompt
+DRAFT_CONTEXT_TOKENS = int(os.getenv("DRAFT_CONTEXT_TOKENS", "4000"))
+# Size of the pseudo-sections used when a document has no recognizable structure
+CHUNK_CHARS = 4000
+FUZZY_MIN_RATIO = 0.6
+
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+# RFC-style headings start at column 0 ("3.2.  Message Format", "Appendix A.  Examples");
+# indented lines and dot-leader lines ("3.2. Message Format ....... 12") are table-of-contents entries
+NUMBERED_HEADING = re.compile(r"^(\d+(?:\.\d+)*|Appendix [A-Z](?:\.\d+)*)\.?[ \t]+([A-Z][^\n]{0,100})$")
+TOC_LEADER = re.compile(r"\.{3,}\s*\d+\s*$")
+SECTION_NUMBER = re.compile(r"(?:section|sec\.|§)\s*(\d+(?:\.\d+)*)|^\s*(\d+(?:\.\d+)*)\b|(appendix\s+[a-z](?:\.\d+)*)",
+                            re.IGNORECASE)
+WORD = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, falling back to char estimate: {str(e)[:50]}...")
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    return len(encoding.encode(text, disallowed_special=())) if encoding else (len(text) + 3) // 4
+
+
+def truncate_tokens(text, max_tokens):
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    ids = encoding.encode(text, disallowed_special=())
+    return text if len(ids) <= max_tokens else encoding.decode(ids[:max_tokens])
+
+
+def parse_number(text):
+    """Section number referenced by a heading or a TOC reference ("Section 3.2" -> "3.2"), or None."""
+    match = SECTION_NUMBER.search(text)
+    if not match:
+        return None
+    return next(g for g in match.groups() if g).lower()
+
+
+def normalize_title(text):
+    return " ".join(WORD.findall(text.lower()))
+
+
+def _finish(sections, length):
+    """A section ends where the next section of the same or a higher level starts (so it includes its subsections)."""
+    for i, section in enumerate(sections):
+        section["end"] = next((s["start"] for s in sections[i + 1:] if s["level"] <= section["level"]), length)
+    return sections
+
+
+def _heading_sections(content):
+    """Markdown headings (outside code fences), or RFC-style numbered headings when there are none."""
+    markdown, numbered = [], []
+    offset = 0
+    in_fence = False
+    for line in content.splitlines(keepends=True):
+        stripped = line.rstrip("\r\n")
+        if stripped.lstrip().startswith(("```", "~~~")):
+            in_fence = not in_fence
+        elif not in_fence:
+            match = MARKDOWN_HEADING.match(stripped)
+            if match:
+                title = match.group(2)
+                markdown.append({"number": parse_number(title), "title": title,
+                                 "level": len(match.group(1)), "start": offset})
+            else:
+                match = NUMBERED_HEADING.match(stripped)
+                if match and not TOC_LEADER.search(stripped):
+                    number = match.group(1).lower()
+                    numbered.append({"number": number, "title": f"{match.group(1)} {match.group(2).strip()}",
+                                     "level": number.count(".") + 1, "start": offset})
+        offset += len(line)
+    return markdown or numbered
+
+
+def build_section_index(content, page_offsets=None, outline=None):
+    """
+    Builds the section index of a document as a list of
+    {"number", "title", "level", "start", "end"} dicts (character offsets into content).
+
+    Args:
+        content: The full document text.
+        page_offsets: Start offset of every page (PDF), used for outline entries and as a fallback.
+        outline: PDF outline entries as (title, page_number, level) tuples.
+    """
+    sections = []
+    if outline and page_offsets:
+        sections = [{"number": parse_number(title), "title": title, "level": level,
+                     "start": page_offsets[min(page, len(page_offsets) - 1)]}
+                    for title, page, level in outline]
+        sections.sort(key=lambda s: s["start"])
+    if not sections:
+        sections = _heading_sections(content)
+    if not sections and page_offsets:
+        sections = [{"number": None, "title": f"Page {i + 1}", "level": 1, "start": start}
+                    for i, start in enumerate(page_offsets)]
+    if not sections:
+        sections = [{"number": None, "title": f"Part {i + 1}", "level": 1, "start": start}
+                    for i, start in enumerate(range(0, len(content), CHUNK_CHARS))]
+    return _finish(sections, len(content))
+
+
+def match_reference(sections, reference):
+    """
+    Finds the section a TOC reference points at: exact section number first (walking up to the
+    parent number if the exact one is missing), then fuzzy title matching. Returns an index or None.
+    """
+    number = parse_number(reference)
+    if number:
+        numbered = {s["number"]: i for i, s in enumerate(sections) if s["number"]}
+        parts = number.split(".")
+        while parts:
+            candidate = ".".join(parts)
+            if candidate in numbered:
+                return numbered[candidate]
+            parts.pop()
+
+    target = normalize_title(reference)
+    if not target:
+        return None
+    best, best_ratio = None, FUZZY_MIN_RATIO
+    for i, section in enumerate(sections):
+        # Different explicit numbers never match, however similar the titles look ("Section 1" vs "Section 11")
+        if number and section["number"] and section["number"] != number:
+            continue
+        title = normalize_title(section["title"])
+        ratio = 0.9 if title and (target in title or title in target) else SequenceMatcher(None, target, title).ratio()
+        if ratio > best_ratio:
+            best, best_ratio = i, ratio
+    return best
+
+
+def _tfidf(texts):
+    """Lexical TF-IDF vectors, used when no embedding model is configured."""
+    docs = [Counter(WORD.findall(t.lower())) for t in texts]
+    df = Counter(term for doc in docs for term in doc)
+    vectors = []
+    for doc in docs:
+        vec = {t: (1 + math.log(tf)) * math.log((1 + len(docs)) / (1 + df[t])) for t, tf in doc.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        vectors.append({t: v / norm for t, v in vec.items()})
+    return vectors
+
+
+def _section_texts(content, sections):
+    # Title plus the opening of the body is enough to place a section and keeps embedding requests small
+    return [f"{s['title']}\n{content[s['start']:min(s['end'], s['start'] + 1500)]}" for s in sections]
+
+
+def embed_sections(content, sections, embeddings):
+    """
+    Embeds every section once per document (load_document), so the topics drafted from it,
+    sequentially or in parallel, only embed their own query. Returns None if embedding fails.
+    """
+    if embeddings is None or not sections:
+        return None
+    try:
+        return embeddings.embed_documents(_section_texts(content, sections))
+    except Exception as e:
+        logger.warning(f"Section embedding failed, using TF-IDF: {str(e)[:50]}...")
+        return None
+
+
+def rank_sections(content, sections, query, embeddings=None, section_vectors=None):
+    """
+    Section indices ordered by similarity to the query (embedding model if given, TF-IDF otherwise).
+    section_vectors are the embed_sections() vectors of these sections; computed here when missing.
+    """
+    texts = _section_texts(content, sections)
+    if embeddings is not None:
+        try:
+            vectors = section_vectors if section_vectors is not None else embeddings.embed_documents(texts)
+            q = embeddings.embed_query(query)
+            q_norm = math.sqrt(sum(x * x for x in q)) or 1.0
+            scores = [sum(a * b for a, b in zip(q, v)) / (q_norm * (math.sqrt(sum(x * x for x in v)) or 1.0))
+                      for v in vectors]
+            return sorted(range(len(sections)), key=lambda i: -scores[i])
+        except Exception as e:
+            logger.warning(f"Embedding fallback failed, using TF-IDF: {str(e)[:50]}...")
+    *tfidf_vectors, query_vector = _tfidf(texts + [query])
+    scores = [sum(w * vec.get(t, 0.0) for t, w in query_vector.items()) for vec in tfidf_vectors]
+    return [i for i in sorted(range(len(sections)), key=lambda i: -scores[i]) if scores[i] > 0]
+
+
+def select_context(content, sections, toc_item, token_budget=DRAFT_CONTEXT_TOKENS, embeddings=None,
+                   section_vectors=None):
+    """
+    Returns (context, info): the slices of the document relevant to a TOC item, within token_budget.
+
+    relevant_sections references are resolved by section number / fuzzy title; references that
+    match nothing fall back to similarity search over the sections. Slices keep the reference order
+    and are trimmed to the remaining budget.
+    """
+    if not sections:
+        return truncate_tokens(content, token_budget), {"sections": [], "tokens": min(count_tokens(content), token_budget)}
+
+    chosen, unmatched = [], []
+    for reference in toc_item.get("relevant_sections", []):
+        index = match_reference(sections, reference)
+        if index is None:
+            unmatched.append(reference)
+        elif index not in chosen:
+            chosen.append(index)
+
+    if unmatched or not chosen:
+        query = "\n".join([toc_item.get("topic", ""), toc_item.get("summary", "")] + unmatched)
+        ranked = [i for i in rank_sections(content, sections, query, embeddings, section_vectors) if i not in chosen]
+        chosen.extend(ranked[:max(1, len(unmatched))])
+
+    # A section already includes its subsections, so drop chosen sections nested in another chosen one
+    def nested(i):
+        start, end = sections[i]["start"], sections[i]["end"]
+        return any(j != i and sections[j]["start"] <= start and end <= sections[j]["end"]
+                   and (sections[j]["start"], sections[j]["end"]) != (start, end) for j in chosen)
+    chosen = [i for i in chosen if not nested(i)]
+
+    parts, used = [], 0
+    for i in chosen:
+        remaining = token_budget - used
+        if remaining <= 0:
+            break
+        text = content[sections[i]["start"]:sections[i]["end"]].strip()
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            text = truncate_tokens(text, remaining) + "\n...[truncated]"
+            tokens = remaining
+        parts.append(text)
+        used += tokens
+
+    if not parts:
+        return truncate_tokens(content, token_budget), {"sections": [], "tokens": min(count_tokens(content), token_budget)}
+    return "\n\n".join(parts), {"sections": [sections[i]["title"] for i in chosen][:len(parts)], "tokens": used}
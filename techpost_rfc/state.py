@@ -1,4 +1,5 @@
-from typing import TypedDict, List, Dict, Any, Optional
+import operator
+from typing import Annotated, TypedDict, List, Dict, Any, Optional
 from pydantic import BaseModel, Field
 
 class TOCItem(BaseModel):
@@ -20,14 +21,40 @@ class GraphState(TypedDict):
     Attributes:
         document_content: The full text content of the loaded document.
         document_metadata: Metadata associated with the document.
+        section_index: Sections of the document ({"number", "title", "level", "start", "end"} offsets).
+        section_vectors: Embeddings of the sections (None without an embedding model), computed once per document.
         series_toc: List of TOC items for the blog series.
         current_index: The index of the current topic being processed.
         generated_posts: List of generated blog posts.
+        post_results: Posts emitted by the parallel topic pipelines (appended in completion order).
     """
     document_content: str
     document_metadata: Dict[str, Any]
+    section_index: List[dict]
+    section_vectors: Optional[List[List[float]]]
     series_toc: List[dict] # Storing as dicts for easier serialization, or List[TOCItem]
     current_index: int
     generated_posts: List[dict] # Storing as dicts or List[GeneratedPost]
     current_draft: Optional[str]
     current_demo_ideas: Optional[str]
+    post_results: Annotated[List[dict], operator.add]
+
+
+class TopicState(TypedDict):
+    """
+    State of a single topic pipeline (draft -> demo ideas) in the parallel graph.
+    The topic is selected by current_index, so the sequential nodes can be reused as-is.
+    """
+    document_content: str
+    section_index: List[dict]
+    section_vectors: Optional[List[List[float]]]
+    series_toc: List[dict]
+    current_index: int
+    current_draft: Optional[str]
+    current_demo_ideas: Optional[str]
+    post_results: Annotated[List[dict], operator.add]
+
+
+class TopicOutput(TypedDict):
+    """Only the emitted post flows back to the parent graph from a topic pipeline."""
+    post_results: Annotated[List[dict], operator.add]